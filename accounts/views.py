@@ -10,8 +10,10 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.views import LoginView, LogoutView
 from django import forms
+from django.core.exceptions import ValidationError
 
 from content.models import UserProfile
+from content.uploads import validate_image_upload
 from core.utils import record_user_activity
 
 
@@ -136,12 +138,19 @@ def profile_view(request):
             user_profile.location = request.POST.get('location', '')
             user_profile.website = request.POST.get('website', '')
             
-            # 处理头像上传
+            # 处理头像上传（先校验大小和像素数）
+            avatar_error = None
             if 'avatar' in request.FILES:
-                user_profile.avatar = request.FILES['avatar']
+                try:
+                    user_profile.avatar = validate_image_upload(request.FILES['avatar'])
+                except ValidationError as e:
+                    avatar_error = e.messages[0]
             
             user_profile.save()
-            messages.success(request, '资料更新成功！')
+            if avatar_error:
+                messages.error(request, f'头像未更新：{avatar_error}')
+            else:
+                messages.success(request, '资料更新成功！')
             return redirect('accounts:profile')
     
     context = {
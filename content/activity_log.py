@@ -0,0 +1,192 @@
+"""
+用户活动异步批量写入
+
+record_user_activity() 只把活动放入进程内的有界队列，由后台线程每累计 ACTIVITY_LOG_BATCH_SIZE 条
+或每隔 ACTIVITY_LOG_FLUSH_INTERVAL 秒用一次 bulk_create 写入，请求中不再执行 INSERT。
+队列满时按 ACTIVITY_LOG_OVERFLOW 处理：'drop' 直接丢弃并计数，'block' 最多等待
+ACTIVITY_LOG_BLOCK_TIMEOUT 秒后再丢弃。进程退出时写入剩余的活动。
+数据库暂时不可用（连接断开、数据库被锁）时重试一次，仍失败则把这批活动放回队列，下一轮再写；
+其他错误逐条写入，只丢弃写不进去的活动。
+
+在事务中调用时直接写入：后台线程使用另一个连接，看不到未提交的数据。
+"""
+import atexit
+import queue
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import InterfaceError, OperationalError, close_old_connections, connection
+from django.utils import timezone
+
+from .models import CreativeContent, UserActivity
+
+
+OVERFLOW_DROP = 'drop'
+OVERFLOW_BLOCK = 'block'
+
+DESCRIPTION_MAX_LENGTH = UserActivity._meta.get_field('description').max_length
+
+# 重试或稍后再写可能成功的错误
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class ActivityWriter:
+    """用户活动的有界队列和后台批量写入线程"""
+
+    def __init__(self, max_queue_size=10000, batch_size=200, flush_interval=2.0,
+                 overflow=OVERFLOW_DROP, block_timeout=0.05):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._flush_lock = threading.Lock()
+        self._worker_lock = threading.Lock()
+        self._worker = None
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+
+    def put(self, activity):
+        """放入一条活动（UserActivity 实例，未保存），队列满时按溢出策略处理，返回是否入队"""
+        self._ensure_worker()
+        try:
+            if self.overflow == OVERFLOW_BLOCK:
+                self._queue.put(activity, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(activity)
+        except queue.Full:
+            self._count(dropped=1)
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _count(self, written=0, dropped=0):
+        with self._stats_lock:
+            self.written += written
+            self.dropped += dropped
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(target=self._run, name='activity-writer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        # 活动留在队列中直到写入，flush() 随时可以取走全部未写入的活动
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self.pending():
+                self.flush()
+                close_old_connections()
+
+    def flush(self):
+        """立即写入队列中的全部活动（进程退出或测试时调用），返回写入条数"""
+        # 取出和写入都在锁内，退出时的 flush 会等待后台线程正在写的批次
+        with self._flush_lock:
+            written = 0
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return written
+                try:
+                    written += self._write(batch)
+                except TRANSIENT_ERRORS as e:
+                    print(f"用户活动写入错误（稍后重试）: {e}")
+                    self._requeue(batch)
+                    return written
+
+    def stop(self):
+        """停止后台线程并写入剩余活动"""
+        self._stopping.set()
+        self._wakeup.set()
+        return self.flush()
+
+    def _requeue(self, batch):
+        """把没写入的活动放回队列，放不下的丢弃"""
+        for activity in batch:
+            try:
+                self._queue.put_nowait(activity)
+            except queue.Full:
+                self._count(dropped=1)
+
+    def _write(self, batch):
+        """写入一批活动，暂时性错误重试一次后抛出，其他错误改为逐条写入"""
+        try:
+            return self._insert(batch)
+        except TRANSIENT_ERRORS:
+            # 丢弃可能已失效的连接后重试
+            close_old_connections()
+            return self._insert(batch)
+        except Exception as e:
+            print(f"用户活动写入错误: {e}")
+            return sum(self._insert_one(activity) for activity in batch)
+
+    def _insert_one(self, activity):
+        try:
+            return self._insert([activity])
+        except Exception as e:
+            print(f"用户活动写入错误: {e}")
+            self._count(dropped=1)
+            return 0
+
+    def _insert(self, batch):
+        """批量写入；已删除的用户的活动丢弃，已删除的内容置空"""
+        user_ids = set(User.objects.filter(
+            pk__in={activity.user_id for activity in batch}
+        ).values_list('pk', flat=True))
+        content_ids = set(CreativeContent.objects.filter(
+            pk__in={activity.content_id for activity in batch if activity.content_id}
+        ).order_by().values_list('pk', flat=True))
+        rows = []
+        for activity in batch:
+            if activity.user_id not in user_ids:
+                continue
+            if activity.content_id and activity.content_id not in content_ids:
+                activity.content_id = None
+            rows.append(activity)
+        UserActivity.objects.bulk_create(rows, batch_size=self.batch_size)
+        self._count(written=len(rows), dropped=len(batch) - len(rows))
+        return len(rows)
+
+
+activity_writer = ActivityWriter(
+    max_queue_size=getattr(settings, 'ACTIVITY_LOG_QUEUE_SIZE', 10000),
+    batch_size=getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 200),
+    flush_interval=getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 2.0),
+    overflow=getattr(settings, 'ACTIVITY_LOG_OVERFLOW', OVERFLOW_DROP),
+    block_timeout=getattr(settings, 'ACTIVITY_LOG_BLOCK_TIMEOUT', 0.05),
+)
+atexit.register(activity_writer.stop)
+
+
+def record_user_activity(user, action, content=None, description='', ip_address=None):
+    """记录用户活动（未登录用户忽略）"""
+    if not user.is_authenticated:
+        return
+    activity = UserActivity(
+        user_id=user.pk,
+        action=action,
+        content_id=content.pk if content is not None else None,
+        description=description[:DESCRIPTION_MAX_LENGTH],
+        ip_address=ip_address,
+        created_at=timezone.now(),
+    )
+    if connection.in_atomic_block or not getattr(settings, 'ACTIVITY_LOG_ASYNC', True):
+        activity.save()
+    else:
+        activity_writer.put(activity)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Tag, CreativeContent, Rating, Comment, Like, Favorite, 
-    UserProfile, UserActivity
+    UserProfile, UserActivity, AuthorStats
 )
 
 
@@ -92,3 +92,13 @@ class UserActivityAdmin(admin.ModelAdmin):
 admin.site.site_header = '创意内容管理平台'
 admin.site.site_title = '管理后台'
 admin.site.index_title = '欢迎使用创意内容管理平台'
+
+
+@admin.register(AuthorStats)
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'content_count', 'views_count', 'likes_count', 'favorites_count', 'comments_count']
+    search_fields = ['user__username']
+    readonly_fields = [field.name for field in AuthorStats._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False  # 由信号处理器和 rebuild_author_stats 命令维护
@@ -0,0 +1,212 @@
+"""
+矩阵分解推荐（隐式反馈 ALS）
+
+把点赞、收藏、评分合并为 用户×内容 的交互强度矩阵：
+点赞 +1，收藏 +2，评分按 (分数 - 3) 计入，即 4、5 分为正反馈，1、2 分为负反馈。
+强度为正的位置偏好为 1，为负的位置偏好为 0，置信度均为 1 + alpha·|强度|
+（Hu, Koren & Volinsky 的隐式反馈 ALS）。
+
+训练结果以 .npy 文件保存，Web 进程用 np.load(mmap_mode='r') 打开，
+多个进程通过页缓存共享同一份数据；给用户打分只需一次矩阵向量乘法加 Top-K 选择。
+"""
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from .models import CreativeContent, Favorite, Like, Rating
+
+
+MODEL_DIRNAME = 'als'
+
+LIKE_STRENGTH = 1.0
+FAVORITE_STRENGTH = 2.0
+NEUTRAL_SCORE = 3
+
+DEFAULT_FACTORS = 32
+DEFAULT_ITERATIONS = 15
+DEFAULT_REGULARIZATION = 0.1
+DEFAULT_ALPHA = 10.0
+
+
+def get_model_dir():
+    """ALS 模型文件所在目录"""
+    return os.path.join(settings.RECOMMENDER_DATA_DIR, MODEL_DIRNAME)
+
+
+def load_interaction_matrix():
+    """
+    从数据库读取交互强度矩阵，返回 (matrix, seen, user_ids, content_ids)
+
+    matrix 为 CSR 稀疏矩阵，行列分别按 user_ids、content_ids（升序）排列，
+    只包含公开内容。seen 为同样形状的 0/1 矩阵，标记所有交互过的位置：
+    强度求和后为 0 的交互（如 3 分评分、点赞加 2 分评分）不在 matrix 中，但推荐时仍需排除。
+    """
+    public_ids = CreativeContent.objects.filter(privacy='public').values_list('id', flat=True)
+    parts = [
+        (Like.objects.filter(content_id__in=public_ids).values_list('user_id', 'content_id'),
+         lambda rows: np.full(len(rows), LIKE_STRENGTH)),
+        (Favorite.objects.filter(content_id__in=public_ids).values_list('user_id', 'content_id'),
+         lambda rows: np.full(len(rows), FAVORITE_STRENGTH)),
+    ]
+
+    users, contents, strengths = [], [], []
+    for queryset, strength in parts:
+        rows = np.array(list(queryset), dtype=np.int64).reshape(-1, 2)
+        users.append(rows[:, 0])
+        contents.append(rows[:, 1])
+        strengths.append(strength(rows))
+
+    rows = np.array(
+        list(Rating.objects.filter(content_id__in=public_ids).values_list('user_id', 'content_id', 'score')),
+        dtype=np.int64
+    ).reshape(-1, 3)
+    users.append(rows[:, 0])
+    contents.append(rows[:, 1])
+    strengths.append((rows[:, 2] - NEUTRAL_SCORE).astype(np.float64))
+
+    users = np.concatenate(users)
+    contents = np.concatenate(contents)
+    strengths = np.concatenate(strengths)
+
+    user_ids, user_pos = np.unique(users, return_inverse=True)
+    content_ids, content_pos = np.unique(contents, return_inverse=True)
+    # 重复的 (用户, 内容) 在转换为 CSR 时自动求和
+    shape = (len(user_ids), len(content_ids))
+    matrix = sparse.csr_matrix((strengths, (user_pos, content_pos)), shape=shape)
+    matrix.eliminate_zeros()
+    seen = sparse.csr_matrix((np.ones(len(users), dtype=np.int8), (user_pos, content_pos)), shape=shape)
+    seen.data[:] = 1
+    return matrix, seen, user_ids, content_ids
+
+
+def _least_squares(strengths, fixed, regularization, alpha):
+    """固定一侧因子，逐行求解另一侧因子"""
+    n_factors = fixed.shape[1]
+    solved = np.zeros((strengths.shape[0], n_factors))
+    gram = fixed.T @ fixed
+    ridge = regularization * np.eye(n_factors)
+
+    for row in range(strengths.shape[0]):
+        start, end = strengths.indptr[row], strengths.indptr[row + 1]
+        if start == end:
+            continue
+        columns = strengths.indices[start:end]
+        values = strengths.data[start:end]
+        confidence = alpha * np.abs(values)  # c - 1
+        factors = fixed[columns]
+
+        # (YᵀY + Yᵤᵀ(Cᵤ - I)Yᵤ + λI) x = YᵤᵀCᵤp(u)
+        a = gram + (factors.T * confidence) @ factors + ridge
+        b = factors.T @ ((1 + confidence) * (values > 0))
+        solved[row] = np.linalg.solve(a, b)
+    return solved
+
+
+def train_als(matrix, factors=DEFAULT_FACTORS, iterations=DEFAULT_ITERATIONS,
+              regularization=DEFAULT_REGULARIZATION, alpha=DEFAULT_ALPHA, seed=0):
+    """交替最小二乘训练，返回 (user_factors, item_factors)"""
+    rng = np.random.default_rng(seed)
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    matrix_t = matrix.T.tocsr()
+
+    user_factors = rng.normal(scale=0.01, size=(matrix.shape[0], factors))
+    item_factors = rng.normal(scale=0.01, size=(matrix.shape[1], factors))
+    for _ in range(iterations):
+        user_factors = _least_squares(matrix, item_factors, regularization, alpha)
+        item_factors = _least_squares(matrix_t, user_factors, regularization, alpha)
+    return user_factors, item_factors
+
+
+def save_model(user_ids, content_ids, user_factors, item_factors, seen, model_dir=None):
+    """保存模型（先写临时文件再替换，避免读到写了一半的文件）"""
+    model_dir = model_dir or get_model_dir()
+    os.makedirs(model_dir, exist_ok=True)
+
+    seen = sparse.csr_matrix(seen)
+    arrays = {
+        'user_factors': np.ascontiguousarray(user_factors, dtype=np.float32),
+        'item_factors': np.ascontiguousarray(item_factors, dtype=np.float32),
+        # 用户已交互的内容（CSR），推荐时排除
+        'seen_indptr': seen.indptr.astype(np.int64),
+        'seen_indices': seen.indices.astype(np.int32),
+        'content_ids': np.asarray(content_ids, dtype=np.int64),
+        'user_ids': np.asarray(user_ids, dtype=np.int64),
+    }
+    # user_ids 最后写入，它的修改时间代表整个模型的版本
+    for name, array in arrays.items():
+        path = os.path.join(model_dir, f'{name}.npy')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+
+class ALSModel:
+    """只读的 ALS 模型（因子矩阵为内存映射）"""
+
+    def __init__(self, user_ids, content_ids, user_factors, item_factors, seen_indptr, seen_indices):
+        self.user_ids = user_ids
+        self.content_ids = content_ids
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.seen_indptr = seen_indptr
+        self.seen_indices = seen_indices
+
+    @classmethod
+    def load(cls, model_dir=None):
+        model_dir = model_dir or get_model_dir()
+
+        def load(name):
+            return np.load(os.path.join(model_dir, f'{name}.npy'), mmap_mode='r')
+
+        return cls(
+            load('user_ids'), load('content_ids'), load('user_factors'),
+            load('item_factors'), load('seen_indptr'), load('seen_indices'),
+        )
+
+    def __contains__(self, user_id):
+        return self._position(user_id) is not None
+
+    def _position(self, user_id):
+        i = int(np.searchsorted(self.user_ids, user_id))
+        if i < len(self.user_ids) and self.user_ids[i] == user_id:
+            return i
+        return None
+
+    def recommend(self, user_id, limit=10):
+        """返回 [(content_id, score), ...]，按得分降序；未收录的用户返回空列表"""
+        u = self._position(user_id)
+        if u is None:
+            return []
+
+        scores = self.item_factors @ self.user_factors[u]
+        scores[self.seen_indices[self.seen_indptr[u]:self.seen_indptr[u + 1]]] = -np.inf
+        k = min(limit, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.content_ids[i]), float(scores[i])) for i in top]
+
+
+_model_lock = threading.Lock()
+_model_cache = {'mtime': None, 'model': None}
+
+
+def get_als_model():
+    """获取当前进程的模型（模型文件更新后自动重新加载），不存在时返回 None"""
+    path = os.path.join(get_model_dir(), 'user_ids.npy')
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _model_lock:
+        if _model_cache['mtime'] != mtime:
+            _model_cache['model'] = ALSModel.load()
+            _model_cache['mtime'] = mtime
+        return _model_cache['model']
@@ -0,0 +1,381 @@
+"""
+内容向量的近似最近邻（ANN）检索
+
+随机超平面 LSH：每个哈希表用 n_bits 个随机超平面把向量映射为一个桶，
+查询时只对同桶（及翻转少量低置信位得到的相邻桶）的候选做精确余弦重排。
+超平面由特征下标哈希得到，无需在内存中保存 2^18 维的投影矩阵。
+
+召回率/延迟的调节：
+- n_tables 越多，召回越高，内存和查询耗时增加；
+- n_bits 越多，桶越小，候选越少，查询越快但召回下降；
+- n_probes 为每个表额外探测的相邻桶数（多探针 LSH），不需要重建索引。
+
+build_content_ann 命令离线构建全部公开内容的索引，以 .npy 数组保存到磁盘，
+Web 进程内存映射加载（文件更新后自动重新加载）。构建之后的变化由增量部分补上：
+向量在构建之后更新过的公开内容放入内存中的小索引，已删除、不再公开或向量已更新的内容
+在查询时从磁盘索引的候选中去掉。向量更新、隐私变化和内容删除会更新缓存中的版本号，
+各进程在下次查询时（最迟 CONTENT_ANN_DELTA_TTL 秒后）重新加载增量部分。
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from scipy import sparse
+
+from .vectorizer import N_FEATURES, get_content_vectors
+
+
+INDEX_DIRNAME = 'content_ann'
+DELTA_STAMP_KEY = 'content_ann_delta_stamp'
+DEFAULT_DELTA_TTL = 300
+
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _splitmix64(x):
+    """向量化的 splitmix64 哈希（uint64 溢出按模运算）"""
+    with np.errstate(over='ignore'):
+        x = (x + np.uint64(0x9E3779B97F4A7C15)) & _MASK64
+        x = ((x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)) & _MASK64
+        x = ((x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)) & _MASK64
+        return x ^ (x >> np.uint64(31))
+
+
+class RandomHyperplaneLSH:
+    """支持增量插入/删除的随机超平面 LSH 索引"""
+
+    def __init__(self, n_tables=8, n_bits=12, seed=0):
+        if n_bits > 62:
+            raise ValueError('n_bits 不能超过 62')
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.seed = np.uint64(seed)
+        self.tables = [dict() for _ in range(n_tables)]
+        self.vectors = {}   # id -> (indices, values)，用于精确重排
+        self.keys = {}      # id -> 每个表中的桶键
+        self._powers = (1 << np.arange(n_bits, dtype=np.int64))
+
+    @property
+    def n_planes(self):
+        return self.n_tables * self.n_bits
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def __contains__(self, item_id):
+        return item_id in self.vectors
+
+    def _plane_signs(self, feature_indices):
+        """特征下标 -> 在所有超平面上的 ±1 分量，形状 (len(features), n_planes)"""
+        features = np.asarray(feature_indices, dtype=np.uint64)[:, None]
+        planes = np.arange(self.n_planes, dtype=np.uint64)[None, :]
+        with np.errstate(over='ignore'):
+            h = _splitmix64(features * np.uint64(0x100000001B3) ^ (planes + self.seed * np.uint64(0x9E3779B1)))
+        return np.where(h >> np.uint64(63), 1.0, -1.0).astype(np.float32)
+
+    def project(self, matrix):
+        """把稀疏矩阵投影到所有超平面上，返回 (n, n_tables, n_bits)"""
+        matrix = sparse.csr_matrix(matrix)
+        used, remapped = np.unique(matrix.indices, return_inverse=True)
+        compact = sparse.csr_matrix(
+            (matrix.data.astype(np.float32), remapped.reshape(-1), matrix.indptr),
+            shape=(matrix.shape[0], len(used))
+        )
+        projection = compact @ self._plane_signs(used)
+        return np.asarray(projection).reshape(-1, self.n_tables, self.n_bits)
+
+    def _bucket_keys(self, projection):
+        return ((projection > 0).astype(np.int64) * self._powers).sum(axis=2)
+
+    def add(self, ids, matrix):
+        """插入（或替换）向量，matrix 每行需已 L2 归一化"""
+        matrix = sparse.csr_matrix(matrix)
+        if matrix.shape[0] == 0:
+            return
+        keys = self._bucket_keys(self.project(matrix))
+        for row, item_id in enumerate(ids):
+            item_id = int(item_id)
+            if item_id in self.vectors:
+                self.remove([item_id])
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            self.vectors[item_id] = (
+                matrix.indices[start:end].astype(np.int32),
+                matrix.data[start:end].astype(np.float32),
+            )
+            self.keys[item_id] = keys[row]
+            for table, key in zip(self.tables, keys[row]):
+                table.setdefault(int(key), set()).add(item_id)
+
+    def remove(self, ids):
+        """删除向量（例如内容被删除或改为私有）"""
+        for item_id in ids:
+            item_id = int(item_id)
+            keys = self.keys.pop(item_id, None)
+            if keys is None:
+                continue
+            self.vectors.pop(item_id, None)
+            for table, key in zip(self.tables, keys):
+                bucket = table.get(int(key))
+                if bucket is not None:
+                    bucket.discard(item_id)
+                    if not bucket:
+                        del table[int(key)]
+
+    def candidates(self, vector, n_probes=0):
+        """收集候选ID：每个表的主桶，以及翻转 n_probes 个最不确定位得到的相邻桶"""
+        projection = self.project(vector)[0]
+        keys = self._bucket_keys(projection[None])[0]
+        uncertain = np.argsort(np.abs(projection), axis=1)[:, :n_probes]
+
+        found = set()
+        for t, table in enumerate(self.tables):
+            key = int(keys[t])
+            found.update(table.get(key, ()))
+            for bit in uncertain[t]:
+                found.update(table.get(key ^ (1 << int(bit)), ()))
+        return found
+
+    def query(self, vector, k=10, n_probes=0, exclude=()):
+        """返回 [(id, cosine), ...]，vector 为 1×F 的归一化稀疏向量"""
+        vector = sparse.csr_matrix(vector)
+        found = [i for i in self.candidates(vector, n_probes) if i not in exclude]
+        if not found:
+            return []
+
+        indptr, indices, values = [0], [], []
+        for item_id in found:
+            row_indices, row_values = self.vectors[item_id]
+            indices.append(row_indices)
+            values.append(row_values)
+            indptr.append(indptr[-1] + len(row_indices))
+        candidates = sparse.csr_matrix(
+            (np.concatenate(values), np.concatenate(indices), indptr),
+            shape=(len(found), vector.shape[1])
+        )
+        scores = (candidates @ vector.T).toarray().ravel()
+
+        k = min(k, len(found))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(found[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def get_ann_params():
+    return {
+        'n_tables': getattr(settings, 'CONTENT_ANN_TABLES', 8),
+        'n_bits': getattr(settings, 'CONTENT_ANN_BITS', 12),
+    }
+
+
+def get_index_dir():
+    """ANN 索引所在目录"""
+    return os.path.join(settings.RECOMMENDER_DATA_DIR, INDEX_DIRNAME)
+
+
+def build_ann_index(n_tables=None, n_bits=None, seed=0):
+    """用所有公开内容的向量构建索引"""
+    params = get_ann_params()
+    index = RandomHyperplaneLSH(
+        n_tables=n_tables or params['n_tables'],
+        n_bits=n_bits or params['n_bits'],
+        seed=seed,
+    )
+    matrix, content_ids = get_content_vectors()
+    index.add(content_ids, matrix)
+    return index
+
+
+def save_ann_index(index, index_dir=None, built_at=None):
+    """保存索引（先写临时文件再替换，避免读到写了一半的文件）；built_at 为读取向量前的时间"""
+    index_dir = index_dir or get_index_dir()
+    os.makedirs(index_dir, exist_ok=True)
+
+    content_ids = np.array(sorted(index.vectors), dtype=np.int64)
+    keys = np.array([index.keys[cid] for cid in content_ids], dtype=np.int64).reshape(-1, index.n_tables)
+    # 每个表按桶键排序，查询时二分查找桶的范围
+    order = np.argsort(keys, axis=0, kind='stable')
+    rows = [index.vectors[cid] for cid in content_ids]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(indices) for indices, values in rows])
+    built_at_us = int(built_at.timestamp() * 1_000_000) if built_at else 0
+    arrays = {
+        'params': np.array([index.n_tables, index.n_bits, int(index.seed), built_at_us], dtype=np.int64),
+        'bucket_keys': np.take_along_axis(keys, order, axis=0).T.copy(),
+        'bucket_positions': order.T.astype(np.int32),
+        'indptr': indptr,
+        'indices': np.concatenate([indices for indices, values in rows] or [np.zeros(0, np.int32)]),
+        'data': np.concatenate([values for indices, values in rows] or [np.zeros(0, np.float32)]),
+        'content_ids': content_ids,
+    }
+    # content_ids 最后写入，它的修改时间代表整个索引的版本
+    for name, array in arrays.items():
+        path = os.path.join(index_dir, f'{name}.npy')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    return len(content_ids)
+
+
+class ContentANNIndex:
+    """只读的 LSH 索引（由 save_ann_index 写出的数组），加上构建之后的增量部分"""
+
+    def __init__(self, lsh, content_ids, bucket_keys, bucket_positions, matrix, built_at=None):
+        self.lsh = lsh
+        self.content_ids = content_ids
+        self.bucket_keys = bucket_keys
+        self.bucket_positions = bucket_positions
+        self.matrix = matrix
+        self.built_at = built_at
+        # (构建之后更新过向量的公开内容的小索引, 磁盘索引中不再使用的内容ID)，整体替换
+        self.delta = (self._empty_lsh(), frozenset())
+
+    @classmethod
+    def load(cls, index_dir=None):
+        index_dir = index_dir or get_index_dir()
+
+        def load(name):
+            return np.load(os.path.join(index_dir, f'{name}.npy'), mmap_mode='r')
+
+        params = [int(value) for value in load('params')]
+        n_tables, n_bits, seed = params[:3]
+        built_at_us = params[3] if len(params) > 3 else 0
+        content_ids = load('content_ids')
+        matrix = sparse.csr_matrix(
+            (load('data'), load('indices'), load('indptr')),
+            shape=(len(content_ids), N_FEATURES)
+        )
+        return cls(
+            RandomHyperplaneLSH(n_tables=n_tables, n_bits=n_bits, seed=seed),
+            content_ids, load('bucket_keys'), load('bucket_positions'), matrix,
+            built_at=datetime.fromtimestamp(built_at_us / 1_000_000, tz=timezone.utc) if built_at_us else None,
+        )
+
+    def _empty_lsh(self):
+        return RandomHyperplaneLSH(n_tables=self.lsh.n_tables, n_bits=self.lsh.n_bits, seed=int(self.lsh.seed))
+
+    def load_delta(self):
+        """从数据库读取构建之后的变化（查询公开内容的ID和新向量）"""
+        from .models import ContentVector, CreativeContent
+
+        changed_ids = []
+        if self.built_at is not None:
+            changed_ids = list(ContentVector.objects.filter(
+                updated_at__gte=self.built_at
+            ).values_list('content_id', flat=True))
+        added = self._empty_lsh()
+        if changed_ids:
+            matrix, content_ids = get_content_vectors(changed_ids)
+            added.add(content_ids, matrix)
+
+        public_ids = np.fromiter(
+            CreativeContent.objects.filter(privacy='public').values_list('pk', flat=True), dtype=np.int64
+        )
+        removed = set(np.setdiff1d(self.content_ids, public_ids).tolist())
+        self.delta = (added, frozenset(removed.union(changed_ids)))
+
+    def __len__(self):
+        added, removed = self.delta
+        return len(self.content_ids) - int(np.isin(self.content_ids, list(removed)).sum()) + len(added)
+
+    def __contains__(self, content_id):
+        added, removed = self.delta
+        return content_id in added or (content_id not in removed and self._position(content_id) is not None)
+
+    def _position(self, content_id):
+        i = int(np.searchsorted(self.content_ids, content_id))
+        if i < len(self.content_ids) and self.content_ids[i] == content_id:
+            return i
+        return None
+
+    def vector(self, content_id):
+        """已收录内容的向量（1×F），未收录时返回 None"""
+        added, removed = self.delta
+        if content_id in added:
+            row_indices, row_values = added.vectors[content_id]
+            return sparse.csr_matrix((row_values, row_indices, [0, len(row_indices)]), shape=(1, N_FEATURES))
+        i = self._position(content_id)
+        return None if i is None or content_id in removed else self.matrix[i]
+
+    def candidates(self, vector, n_probes=0):
+        """候选内容在磁盘索引中的位置：每个表的主桶和 n_probes 个相邻桶"""
+        projection = self.lsh.project(vector)[0]
+        keys = self.lsh._bucket_keys(projection[None])[0]
+        uncertain = np.argsort(np.abs(projection), axis=1)[:, :n_probes]
+
+        found = set()
+        for t in range(self.lsh.n_tables):
+            key = int(keys[t])
+            for probe in [key] + [key ^ (1 << int(bit)) for bit in uncertain[t]]:
+                start = np.searchsorted(self.bucket_keys[t], probe, side='left')
+                end = np.searchsorted(self.bucket_keys[t], probe, side='right')
+                found.update(self.bucket_positions[t][start:end].tolist())
+        return found
+
+    def query(self, vector, k=10, n_probes=0, exclude=()):
+        """返回 [(content_id, cosine), ...]，vector 为 1×F 的归一化稀疏向量"""
+        vector = sparse.csr_matrix(vector)
+        added, removed = self.delta
+        results = added.query(vector, k, n_probes, exclude) if len(added) else []
+
+        found = [
+            i for i in self.candidates(vector, n_probes)
+            if int(self.content_ids[i]) not in exclude and int(self.content_ids[i]) not in removed
+        ]
+        if found:
+            scores = (self.matrix[found] @ vector.T).toarray().ravel()
+            top_k = min(k, len(found))
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            results.extend((int(self.content_ids[found[i]]), float(scores[i])) for i in top if scores[i] > 0)
+        return sorted(results, key=lambda item: -item[1])[:k]
+
+
+def bump_ann_delta_stamp():
+    """内容向量、隐私设置变化或内容删除，让各进程在下次查询时重新加载增量部分"""
+    cache.set(DELTA_STAMP_KEY, time.time_ns(), timeout=None)
+
+
+_index_lock = threading.Lock()
+_index_cache = {'mtime': None, 'index': None, 'delta_stamp': None, 'delta_loaded_at': 0.0}
+
+
+def get_ann_index():
+    """获取当前进程的索引（索引文件更新后重新加载，增量部分按版本号和时限重新加载），不存在时返回 None"""
+    path = os.path.join(get_index_dir(), 'content_ids.npy')
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    stamp = cache.get(DELTA_STAMP_KEY, 0)
+    ttl = getattr(settings, 'CONTENT_ANN_DELTA_TTL', DEFAULT_DELTA_TTL)
+    with _index_lock:
+        if _index_cache['mtime'] != mtime:
+            _index_cache['index'] = ContentANNIndex.load()
+            _index_cache['mtime'] = mtime
+            _index_cache['delta_stamp'] = None
+        if (_index_cache['delta_stamp'] != stamp
+                or time.monotonic() - _index_cache['delta_loaded_at'] >= ttl):
+            _index_cache['index'].load_delta()
+            _index_cache['delta_stamp'] = stamp
+            _index_cache['delta_loaded_at'] = time.monotonic()
+        return _index_cache['index']
+
+
+def query_similar_content_ids(content_id, limit=4):
+    """基于 ANN 查询相似内容ID，未收录的内容读取数据库中的向量，索引不存在时返回空列表"""
+    index = get_ann_index()
+    if index is None:
+        return []
+    vector = index.vector(content_id)
+    if vector is None:
+        vector, content_ids = get_content_vectors([content_id])
+        if not content_ids:
+            return []
+    n_probes = getattr(settings, 'CONTENT_ANN_PROBES', 2)
+    return [cid for cid, score in index.query(vector, limit, n_probes, exclude={content_id})]
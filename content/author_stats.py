@@ -0,0 +1,117 @@
+"""
+作者统计
+
+AuthorStats 每个作者一行，保存其全部内容的篇数、浏览量、点赞、收藏、评论和评分汇总，
+以及公开内容的篇数、浏览量、点赞、收藏（他人查看个人主页时使用）。
+内容的统计字段由信号处理器增量维护时，同一处理器再用一条 UPDATE 增减作者的对应字段；
+浏览量写缓冲写回时按作者合并成一条 UPDATE。页面只需按主键读取一行。
+rebuild_author_stats() 根据内容的统计字段重建全部作者统计（上线回填或校正偏差）。
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, Exists, F, PositiveBigIntegerField, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Greatest
+
+from .models import AuthorStats, CreativeContent
+
+
+# 与 CreativeContent 同名、按作者求和的统计字段
+SUMMED_FIELDS = ['views_count', 'likes_count', 'favorites_count', 'comments_count', 'rating_sum', 'rating_count']
+# 另有 public_ 前缀版本（只计公开内容）的字段
+PUBLIC_FIELDS = ['content_count', 'views_count', 'likes_count', 'favorites_count']
+
+
+def _added(field, delta):
+    """字段加上增量（不会减到负数）"""
+    return Greatest(F(field) + delta, Value(0))
+
+
+def ensure_author_stats(user_id):
+    """确保作者有统计行"""
+    AuthorStats.objects.bulk_create([AuthorStats(user_id=user_id)], ignore_conflicts=True)
+
+
+def get_author_stats(user):
+    """读取作者统计，没有内容的用户返回全为 0 的统计（不保存）"""
+    return AuthorStats.objects.filter(user=user).first() or AuthorStats(user=user)
+
+
+def adjust_author_stats(content_id, **deltas):
+    """按内容所属的作者增减统计字段，公开内容同时计入 public_ 字段，单条 UPDATE"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    content = CreativeContent.objects.filter(pk=content_id)
+    is_public = Exists(content.filter(privacy='public'))
+    changes = {}
+    for field, delta in deltas.items():
+        changes[field] = _added(field, delta)
+        if field in PUBLIC_FIELDS:
+            changes[f'public_{field}'] = _added(f'public_{field}', Case(
+                When(is_public, then=delta), default=Value(0), output_field=PositiveBigIntegerField()
+            ))
+    return AuthorStats.objects.filter(user_id=Subquery(content.values('author_id'))).update(**changes)
+
+
+def move_public_stats(content_id, sign):
+    """内容公开（sign=1）或取消公开（sign=-1）后，把它的统计计入或移出作者的 public_ 字段"""
+    content = CreativeContent.objects.filter(pk=content_id)
+    changes = {'public_content_count': _added('public_content_count', sign)}
+    for field in PUBLIC_FIELDS[1:]:
+        changes[f'public_{field}'] = _added(f'public_{field}', Subquery(content.values(field)) * sign)
+    return AuthorStats.objects.filter(user_id=Subquery(content.values('author_id'))).update(**changes)
+
+
+def _per_author(counts):
+    return Case(
+        *[When(user_id=user_id, then=Value(count)) for user_id, count in counts.items()],
+        default=Value(0),
+        output_field=PositiveBigIntegerField(),
+    )
+
+
+def add_author_views(pending):
+    """把一批浏览数 {内容ID: 次数} 计入作者统计，一次查询读取作者，一条 UPDATE 写入"""
+    totals, public = Counter(), Counter()
+    rows = CreativeContent.objects.filter(pk__in=list(pending)).values_list('pk', 'author_id', 'privacy')
+    for content_id, author_id, privacy in rows:
+        totals[author_id] += pending[content_id]
+        if privacy == 'public':
+            public[author_id] += pending[content_id]
+    if not totals:
+        return 0
+    return AuthorStats.objects.filter(user_id__in=list(totals)).update(
+        views_count=F('views_count') + _per_author(totals),
+        public_views_count=F('public_views_count') + _per_author(public),
+    )
+
+
+def compute_author_stats():
+    """按作者分组汇总内容的统计字段，一次查询，返回 {作者ID: {字段: 数值}}"""
+    public = Q(privacy='public')
+    # 聚合别名不能与内容的字段同名，加 total_ 前缀
+    rows = CreativeContent.objects.values('author_id').annotate(
+        total_content_count=Count('pk'),
+        total_public_content_count=Count('pk', filter=public),
+        **{f'total_{field}': Sum(field) for field in SUMMED_FIELDS},
+        **{f'total_public_{field}': Sum(field, filter=public) for field in PUBLIC_FIELDS[1:]},
+    ).order_by()
+    return {
+        row.pop('author_id'): {alias[len('total_'):]: value or 0 for alias, value in row.items()}
+        for row in rows
+    }
+
+
+def rebuild_author_stats(batch_size=500):
+    """根据内容的统计字段重建所有作者统计，返回写入的行数"""
+    stats = compute_author_stats()
+    with transaction.atomic():
+        AuthorStats.objects.all().delete()
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=user_id, **values) for user_id, values in stats.items()],
+            batch_size=batch_size
+        )
+    return len(stats)
@@ -0,0 +1,281 @@
+"""
+限时混合推荐
+
+协同过滤（或矩阵分解）与基于标签的推荐在线程池中并行执行，
+分别受单阶段时限和总时限约束：超时的阶段被放弃，已完成阶段的结果按顺序合并，
+剩余名额总是用缓存的热门列表补足（一次查询）。
+已开始执行的阶段无法取消，因此每个阶段同时在执行的任务数有上限，
+达到上限时本次请求跳过该阶段，慢阶段不会占满线程池。
+协同过滤阶段只使用已加载的共享引擎，引擎未就绪时在后台加载，本次返回空结果。
+
+每次请求各阶段的状态和耗时写入日志（logger 名为 content.budget，超时、跳过和错误同样写入该日志），
+并累计到进程内统计中，可通过 get_stage_statistics() 读取。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+
+from .models import CreativeContent, Favorite, Like, Rating
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STAGE_TIMEOUTS = {
+    'collaborative': 0.3,
+    'als': 0.1,
+    'content_based': 0.3,
+}
+DEFAULT_TOTAL_TIMEOUT = 0.5
+DEFAULT_STAGE_MAX_IN_FLIGHT = 2
+
+POPULAR_CACHE_KEY = 'recommendation_popular_ids'
+POPULAR_LIST_SIZE = 200
+
+# 阶段状态
+STATUS_OK = 'ok'
+STATUS_TIMEOUT = 'timeout'
+STATUS_ERROR = 'error'
+STATUS_SKIPPED = 'skipped'
+
+
+def get_popular_content_ids():
+    """热门内容ID列表（缓存 RECOMMENDATION_POPULAR_TTL 秒，所有用户共用）"""
+    content_ids = cache.get(POPULAR_CACHE_KEY)
+    if content_ids is None:
+        content_ids = list(CreativeContent.objects.filter(
+            privacy='public'
+        ).order_by('-hot_score', '-created_at').values_list('id', flat=True)[:POPULAR_LIST_SIZE])
+        cache.set(POPULAR_CACHE_KEY, content_ids, getattr(settings, 'RECOMMENDATION_POPULAR_TTL', 300))
+    return content_ids
+
+
+def get_popular_fill(user, exclude_ids, limit):
+    """从热门列表中取用户未交互、未推荐过的内容（一次查询）"""
+    if limit <= 0:
+        return []
+    candidate_ids = [cid for cid in get_popular_content_ids() if cid not in exclude_ids]
+    contents = CreativeContent.objects.filter(
+        id__in=candidate_ids,
+        privacy='public'
+    ).exclude(
+        author=user
+    ).exclude(
+        id__in=Like.objects.filter(user=user).values('content_id')
+    ).exclude(
+        id__in=Favorite.objects.filter(user=user).values('content_id')
+    ).exclude(
+        id__in=Rating.objects.filter(user=user).values('content_id')
+    ).in_bulk()
+    return [contents[cid] for cid in candidate_ids if cid in contents][:limit]
+
+
+class StageStatistics:
+    """各阶段的累计调用次数、超时/错误次数和耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, name, status, seconds):
+        with self._lock:
+            stats = self._stages.setdefault(name, {
+                'calls': 0, 'timeouts': 0, 'errors': 0, 'skipped': 0,
+                'total_seconds': 0.0, 'max_seconds': 0.0,
+            })
+            stats['calls'] += 1
+            if status == STATUS_TIMEOUT:
+                stats['timeouts'] += 1
+            elif status == STATUS_ERROR:
+                stats['errors'] += 1
+            elif status == STATUS_SKIPPED:
+                stats['skipped'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stages.items()}
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+
+stage_statistics = StageStatistics()
+
+
+def get_stage_statistics():
+    """当前进程各阶段的累计统计"""
+    return stage_statistics.snapshot()
+
+
+_executor_lock = threading.Lock()
+_executor = None
+
+
+def get_executor():
+    """推荐阶段共用的线程池（按需创建）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RECOMMENDATION_WORKER_THREADS', 4),
+                thread_name_prefix='recommendation',
+            )
+        return _executor
+
+
+class StageSlots:
+    """各阶段同时在执行（已提交、未结束）的任务数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def acquire(self, name, limit):
+        """未达到上限时占用一个名额，返回是否成功"""
+        with self._lock:
+            if self._in_flight.get(name, 0) >= limit:
+                return False
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+            return True
+
+    def release(self, name):
+        with self._lock:
+            self._in_flight[name] -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._in_flight)
+
+
+stage_slots = StageSlots()
+
+
+def _run_stage(function, *args):
+    """在线程池中执行阶段函数，结束后按 CONN_MAX_AGE 释放本线程的数据库连接"""
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
+
+
+def get_loaded_collaborative_recommendations(user, limit=10):
+    """协同过滤阶段：不在请求中加载评分矩阵，共享引擎未就绪时返回空列表"""
+    from .collaborative import get_collaborative_engine
+    from .utils import get_collaborative_filtering_recommendations
+
+    if not Rating.objects.filter(user=user).exists():
+        return []
+    engine = get_collaborative_engine(block=False)
+    if engine is None:
+        return []
+    return get_collaborative_filtering_recommendations(user, limit, engine=engine)
+
+
+def get_budgeted_recommendations(user, limit=10, strategy=None):
+    """
+    限时混合推荐，返回 (recommendations, report)
+
+    recommendations 为 [(content, reason), ...]；
+    report 为 {阶段名: {'status', 'seconds', 'count'}}，另含 'total_seconds'。
+    """
+    from .utils import (
+        REASON_ALS, REASON_COLLABORATIVE, REASON_CONTENT_BASED, REASON_POPULAR, STRATEGY_ALS,
+        STRATEGY_HYBRID, get_als_recommendations, get_content_based_recommendations
+    )
+
+    strategy = strategy or getattr(settings, 'RECOMMENDATION_STRATEGY', STRATEGY_HYBRID)
+    if strategy == STRATEGY_ALS:
+        first_stage = ('als', get_als_recommendations, limit, REASON_ALS)
+    else:
+        first_stage = ('collaborative', get_loaded_collaborative_recommendations, limit // 2, REASON_COLLABORATIVE)
+    stages = [first_stage, ('content_based', get_content_based_recommendations, limit, REASON_CONTENT_BASED)]
+
+    stage_timeouts = {**DEFAULT_STAGE_TIMEOUTS, **getattr(settings, 'RECOMMENDATION_STAGE_TIMEOUTS', {})}
+    total_timeout = getattr(settings, 'RECOMMENDATION_TOTAL_TIMEOUT', DEFAULT_TOTAL_TIMEOUT)
+    max_in_flight = getattr(settings, 'RECOMMENDATION_STAGE_MAX_IN_FLIGHT', DEFAULT_STAGE_MAX_IN_FLIGHT)
+    started = time.monotonic()
+    deadline = started + total_timeout
+
+    # 事务中的写入对其他连接不可见，此时在当前线程中依次执行（仍受总时限约束）
+    inline = connection.in_atomic_block
+    futures = {}
+    if not inline:
+        executor = get_executor()
+        for name, function, stage_limit, reason in stages:
+            if not stage_slots.acquire(name, max_in_flight):
+                logger.warning('推荐阶段 %s 已有 %d 个任务在执行，跳过', name, max_in_flight)
+                continue
+            futures[name] = executor.submit(_run_stage, function, user, stage_limit)
+            # 任务结束（或提交后被取消）时归还名额
+            futures[name].add_done_callback(lambda future, name=name: stage_slots.release(name))
+
+    report = {}
+    recommendations = []
+    for name, function, stage_limit, reason in stages:
+        stage_deadline = min(started + stage_timeouts.get(name, total_timeout), deadline)
+        stage_started = time.monotonic()
+        contents = []
+        try:
+            if inline:
+                if stage_started >= deadline:
+                    status = STATUS_SKIPPED
+                else:
+                    contents = function(user, stage_limit)
+                    status = STATUS_OK
+            elif name not in futures:
+                status = STATUS_SKIPPED
+            else:
+                contents = futures[name].result(timeout=max(stage_deadline - stage_started, 0))
+                status = STATUS_OK
+        except FutureTimeoutError:
+            # 还没开始执行的任务可以取消；已在执行的任务会继续占用名额直到结束
+            futures[name].cancel()
+            logger.warning('推荐阶段 %s 超时', name)
+            status = STATUS_TIMEOUT
+        except Exception:
+            logger.exception('推荐阶段 %s 错误', name)
+            status = STATUS_ERROR
+
+        # 并行执行时，阶段耗时从提交时算起
+        seconds = time.monotonic() - (stage_started if inline else started)
+        report[name] = {'status': status, 'seconds': seconds, 'count': len(contents)}
+        recommendations.extend((content, reason) for content in contents)
+
+    # 去重并限制数量，剩余名额用热门内容补足
+    seen_ids = set()
+    unique_recommendations = []
+    for content, reason in recommendations:
+        if content.id not in seen_ids and len(unique_recommendations) < limit:
+            seen_ids.add(content.id)
+            unique_recommendations.append((content, reason))
+
+    popular_started = time.monotonic()
+    try:
+        popular = get_popular_fill(user, seen_ids, limit - len(unique_recommendations))
+        status = STATUS_OK
+    except Exception:
+        logger.exception('热门内容补充错误')
+        popular = []
+        status = STATUS_ERROR
+    report['popular'] = {'status': status, 'seconds': time.monotonic() - popular_started, 'count': len(popular)}
+    unique_recommendations.extend((content, REASON_POPULAR) for content in popular)
+
+    report['total_seconds'] = time.monotonic() - started
+    for name, stage in report.items():
+        if name != 'total_seconds':
+            stage_statistics.record(name, stage['status'], stage['seconds'])
+    logger.info(
+        '推荐用户 %s 耗时 %.3fs：%s', user.id, report['total_seconds'],
+        '，'.join(
+            f"{name} {stage['status']} {stage['seconds']:.3f}s/{stage['count']}条"
+            for name, stage in report.items() if name != 'total_seconds'
+        )
+    )
+    return unique_recommendations, report
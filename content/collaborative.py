@@ -0,0 +1,214 @@
+"""
+基于稀疏矩阵的协同过滤引擎
+
+一次性把全部 Rating 读入 用户×内容 的 CSR 稀疏矩阵，
+用矩阵运算计算"共同评分内容上的皮尔逊相关系数"，
+结果与 utils.calculate_user_similarity 逐对计算的结果一致。
+
+在线请求通过 get_collaborative_engine() 使用进程内共享的引擎：评分变化时更新
+Django 缓存中的版本号，版本号变化或超过 COLLABORATIVE_ENGINE_TTL 秒后在后台线程
+重新加载，加载期间继续使用旧引擎。
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from scipy import sparse
+
+from .models import CreativeContent, Rating
+
+
+# 与原有逐用户实现保持一致的参数
+MIN_COMMON_RATINGS = 2      # 至少有2个共同评分
+SIMILARITY_THRESHOLD = 0.3  # 相似度阈值
+TOP_SIMILAR_USERS = 5       # 取前5个相似用户
+HIGH_SCORE = 4              # 高分评价
+
+
+class CollaborativeFilteringEngine:
+    """协同过滤引擎（用户×内容稀疏评分矩阵）"""
+
+    def __init__(self, user_ids, content_ids, ratings_matrix, public_content_ids=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.content_ids = np.asarray(content_ids, dtype=np.int64)
+        self.user_index = {int(uid): i for i, uid in enumerate(self.user_ids)}
+
+        # R: 评分矩阵，B: 是否评分的0/1矩阵，R2: 评分平方
+        self.R = sparse.csr_matrix(ratings_matrix, dtype=np.float64)
+        self.B = self.R.copy()
+        self.B.data = np.ones_like(self.B.data)
+        self.R2 = self.R.multiply(self.R).tocsr()
+
+        # 候选内容必须公开
+        if public_content_ids is None:
+            self.public_mask = np.ones(len(self.content_ids), dtype=bool)
+        else:
+            self.public_mask = np.isin(self.content_ids, list(public_content_ids))
+
+    @classmethod
+    def from_database(cls):
+        """从数据库加载全部评分（只执行两次查询）"""
+        rows = np.array(
+            list(Rating.objects.values_list('user_id', 'content_id', 'score')),
+            dtype=np.int64
+        ).reshape(-1, 3)
+
+        user_ids, user_pos = np.unique(rows[:, 0], return_inverse=True)
+        content_ids, content_pos = np.unique(rows[:, 1], return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (rows[:, 2].astype(np.float64), (user_pos, content_pos)),
+            shape=(len(user_ids), len(content_ids))
+        )
+
+        public_ids = CreativeContent.objects.filter(
+            privacy='public'
+        ).values_list('id', flat=True)
+        return cls(user_ids, content_ids, matrix, public_content_ids=public_ids)
+
+    def similarities(self, user_ids):
+        """
+        计算给定用户与所有用户的皮尔逊相似度
+
+        对每一对用户 (u, v)，只在共同评分的内容上计算，
+        均值也取共同评分内容上的均值。返回 (len(user_ids), n_users) 的稠密矩阵，
+        共同评分不足或方差为0的位置为0。
+        """
+        rows = [self.user_index[int(uid)] for uid in user_ids]
+        R_u, B_u, R2_u = self.R[rows], self.B[rows], self.R2[rows]
+        BT, RT, R2T = self.B.T, self.R.T, self.R2.T
+
+        n = (B_u @ BT).toarray()        # 共同评分数
+        sum_u = (R_u @ BT).toarray()    # u 在共同内容上的评分和
+        sum_v = (B_u @ RT).toarray()    # v 在共同内容上的评分和
+        sq_u = (R2_u @ BT).toarray()
+        sq_v = (B_u @ R2T).toarray()
+        dot = (R_u @ RT).toarray()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = dot - sum_u * sum_v / n
+            var_u = sq_u - sum_u ** 2 / n
+            var_v = sq_v - sum_v ** 2 / n
+            denominator = np.sqrt(var_u * var_v)
+            similarity = cov / denominator
+
+        valid = (n >= MIN_COMMON_RATINGS) & (var_u > 1e-9) & (var_v > 1e-9)
+        similarity = np.where(valid, similarity, 0.0)
+        similarity[np.arange(len(rows)), rows] = 0.0  # 排除自身
+        return similarity
+
+    def similar_users(self, user_id, similarity_row=None):
+        """返回相似用户 [(user_id, similarity), ...]，按相似度降序"""
+        if similarity_row is None:
+            similarity_row = self.similarities([user_id])[0]
+        candidates = np.flatnonzero(similarity_row > SIMILARITY_THRESHOLD)
+        # 稳定排序：相似度相同时按用户ID升序，与逐用户遍历的顺序一致
+        order = candidates[np.argsort(-similarity_row[candidates], kind='stable')]
+        return [(int(self.user_ids[i]), float(similarity_row[i])) for i in order]
+
+    def recommend(self, user_id, limit=10, similarity_row=None):
+        """为单个用户推荐，返回 [(content_id, score), ...]"""
+        if int(user_id) not in self.user_index:
+            return []
+
+        row = self.user_index[int(user_id)]
+        rated = self.B[row].indices
+        neighbours = self.similar_users(user_id, similarity_row)[:TOP_SIMILAR_USERS]
+
+        seen = set(int(i) for i in rated)
+        recommendations = []
+        for neighbour_id, similarity in neighbours:
+            start, end = self.R.indptr[self.user_index[neighbour_id]:self.user_index[neighbour_id] + 2]
+            items = self.R.indices[start:end]
+            scores = self.R.data[start:end]
+            keep = (scores >= HIGH_SCORE) & self.public_mask[items]
+            # 同一相似用户的内容先按创建时间倒序（即内容默认排序）
+            picked = [
+                (int(item), similarity * score)
+                for item, score in zip(items[keep], scores[keep])
+                if int(item) not in seen
+            ]
+            picked.sort(key=lambda x: -self.content_ids[x[0]])
+            for item, score in picked:
+                seen.add(item)
+                recommendations.append((int(self.content_ids[item]), score))
+
+        recommendations.sort(key=lambda x: x[1], reverse=True)
+        return recommendations[:limit]
+
+    def recommend_batch(self, user_ids, limit=10, chunk_size=256):
+        """批量推荐，返回 {user_id: [(content_id, score), ...]}"""
+        known = [uid for uid in user_ids if int(uid) in self.user_index]
+        results = {int(uid): [] for uid in user_ids}
+
+        for start in range(0, len(known), chunk_size):
+            chunk = known[start:start + chunk_size]
+            similarity = self.similarities(chunk)
+            for i, uid in enumerate(chunk):
+                results[int(uid)] = self.recommend(uid, limit, similarity_row=similarity[i])
+        return results
+
+
+ENGINE_STAMP_KEY = 'collaborative_engine_stamp'
+DEFAULT_ENGINE_TTL = 600
+
+_engine_lock = threading.Lock()  # 同一进程同时只有一个线程加载引擎
+_engine_cache = {'engine': None, 'stamp': None, 'loaded_at': 0.0}
+
+
+def bump_engine_stamp():
+    """评分发生变化，让各进程的引擎在下次使用时重新加载"""
+    cache.set(ENGINE_STAMP_KEY, time.time_ns(), timeout=None)
+
+
+def _is_fresh(stamp):
+    ttl = getattr(settings, 'COLLABORATIVE_ENGINE_TTL', DEFAULT_ENGINE_TTL)
+    return (_engine_cache['engine'] is not None and _engine_cache['stamp'] == stamp
+            and time.monotonic() - _engine_cache['loaded_at'] < ttl)
+
+
+def _load_engine(stamp):
+    # 先记下版本号再读取评分，读取期间的新评分会让下次检查时再加载一次
+    engine = CollaborativeFilteringEngine.from_database()
+    _engine_cache.update(engine=engine, stamp=stamp, loaded_at=time.monotonic())
+    return engine
+
+
+def _load_in_background(stamp):
+    if not _engine_lock.acquire(blocking=False):
+        return  # 已有线程在加载
+
+    def load():
+        try:
+            _load_engine(stamp)
+        except Exception as e:
+            print(f"协同过滤引擎加载错误: {e}")
+        finally:
+            close_old_connections()
+            _engine_lock.release()
+
+    threading.Thread(target=load, name='collaborative-engine', daemon=True).start()
+
+
+def get_collaborative_engine(block=True):
+    """
+    当前进程共享的协同过滤引擎
+
+    需要重新加载时，已有旧引擎则在后台加载并先返回旧引擎；还没有引擎时，
+    block 为 True 在当前线程加载，否则只启动后台加载并返回 None。
+    事务中读到的评分可能包含未提交的数据，此时单独加载一个不共享的引擎。
+    """
+    if connection.in_atomic_block:
+        return CollaborativeFilteringEngine.from_database()
+    stamp = cache.get(ENGINE_STAMP_KEY, 0)
+    if _is_fresh(stamp):
+        return _engine_cache['engine']
+    if block and _engine_cache['engine'] is None:
+        with _engine_lock:
+            if not _is_fresh(stamp):
+                _load_engine(stamp)
+            return _engine_cache['engine']
+    _load_in_background(stamp)
+    return _engine_cache['engine']
@@ -0,0 +1,78 @@
+"""
+统计字段校正
+
+点赞数、评论数、收藏数以及评分汇总（总和、人数、各星级数量）由信号处理器增量维护，
+批量导入、直接改库或异常中断都可能让它们与实际数据产生偏差。
+reconcile_counters 先读出各内容当前的统计值，再对每个被计数的模型执行一次分组查询，
+有偏差的内容用条件 UPDATE 写入：只有统计值仍等于读出的值时才更新，
+期间发生的点赞、评论等增量更新不会被覆盖（该内容留到下次校正）。
+校正的差值在同一事务中计入对应作者的统计。
+"""
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .author_stats import SUMMED_FIELDS, adjust_author_stats
+from .models import Comment, CreativeContent, Favorite, Like, Rating
+
+
+# 统计字段 -> (被统计的模型, 聚合表达式)
+COUNTERS = {
+    'likes_count': (Like, Count('pk')),
+    'comments_count': (Comment, Count('pk')),
+    'favorites_count': (Favorite, Count('pk')),
+    'rating_sum': (Rating, Sum('score')),
+    'rating_count': (Rating, Count('pk')),
+    **{
+        f'rating_{score}_count': (Rating, Count('pk', filter=Q(score=score)))
+        for score in range(1, 6)
+    },
+}
+
+
+def compute_counters(fields):
+    """按内容分组计算统计字段的实际值，同一模型的字段合并为一次查询"""
+    by_model = {}
+    for field in fields:
+        model, aggregate = COUNTERS[field]
+        by_model.setdefault(model, {})[field] = aggregate
+
+    actual = {}
+    for model, aggregates in by_model.items():
+        rows = model.objects.values('content_id').annotate(**aggregates)
+        for field in aggregates:
+            actual[field] = {}
+        for row in rows:
+            for field in aggregates:
+                actual[field][row['content_id']] = row[field] or 0
+    return actual
+
+
+def reconcile_counters(fields=None, dry_run=False):
+    """校正统计字段，返回 {字段: 校正的内容数}"""
+    fields = list(fields or COUNTERS)
+    # 先读当前值再计算实际值：之后发生的增量更新会让条件 UPDATE 不生效，不会被覆盖
+    observed = list(CreativeContent.objects.values('pk', *fields).iterator())
+    actual = compute_counters(fields)
+
+    fixed = {field: 0 for field in fields}
+    for row in observed:
+        drifted = {
+            field: actual[field].get(row['pk'], 0)
+            for field in fields if row[field] != actual[field].get(row['pk'], 0)
+        }
+        if not drifted:
+            continue
+        if not dry_run:
+            with transaction.atomic():
+                updated = CreativeContent.objects.filter(
+                    pk=row['pk'], **{field: row[field] for field in drifted}
+                ).update(**drifted)
+                if not updated:
+                    continue
+                # 条件 UPDATE 不触发信号，把差值计入该内容的作者
+                adjust_author_stats(row['pk'], **{
+                    field: value - row[field] for field, value in drifted.items() if field in SUMMED_FIELDS
+                })
+        for field in drifted:
+            fixed[field] += 1
+    return fixed
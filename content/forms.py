@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column, Field
 from .models import CreativeContent, Comment, Rating, Tag, UserProfile
+from .uploads import BoundedImageField
 
 
 class CreativeContentForm(forms.ModelForm):
@@ -17,6 +18,7 @@ class CreativeContentForm(forms.ModelForm):
     class Meta:
         model = CreativeContent
         fields = ['title', 'content', 'summary', 'privacy', 'cover_image']
+        field_classes = {'cover_image': BoundedImageField}
         widgets = {
             'title': forms.TextInput(attrs={'placeholder': '给你的创意起个好标题'}),
             'content': forms.Textarea(attrs={'rows': 10, 'placeholder': '在这里分享你的创意内容...'}),
@@ -112,6 +114,7 @@ class UserProfileForm(forms.ModelForm):
     class Meta:
         model = UserProfile
         fields = ['bio', 'avatar', 'website', 'location', 'birth_date']
+        field_classes = {'avatar': BoundedImageField}
         widgets = {
             'bio': forms.Textarea(attrs={'rows': 4, 'placeholder': '介绍一下你自己...'}),
             'website': forms.URLInput(attrs={'placeholder': 'https://your-website.com'}),
@@ -157,6 +160,7 @@ class SearchForm(forms.Form):
             ('views_count', '最多浏览'),
             ('likes_count', '最多点赞'),
             ('favorites_count', '最多收藏'),
+            ('rating', '评分最高'),
         ],
         initial='created_at',
         widget=forms.Select(attrs={'class': 'form-select'})
@@ -0,0 +1,188 @@
+"""
+封面图衍生图
+
+原图保持不变，按固定宽度生成缩略图（列表卡片）和中图（详情页），
+文件名取原图内容的 SHA-256，相同的图片只生成一次；同时计算列表页使用的占位图。
+生成工作在后台线程或 generate_cover_derivatives 命令中执行，不在 save() 中进行。
+封面更换、删除或内容删除后，不再被任何内容引用的旧衍生图随即删除。
+"""
+import hashlib
+import io
+import queue
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from .models import CreativeContent, UserProfile
+from .placeholders import compute_placeholder, update_placeholder
+from .uploads import open_bounded_image, resize_to_width
+
+
+# 衍生图字段 -> 最大宽度（像素）
+COVER_DERIVATIVES = {
+    'cover_thumbnail': 400,
+    'cover_medium': 960,
+}
+DERIVATIVE_DIR = 'covers/derived'
+JPEG_QUALITY = 85
+
+
+def file_sha256(field_file, chunk_size=64 * 1024):
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        field_file.seek(0)
+        for chunk in field_file.chunks(chunk_size):
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def render_derivative(image, width):
+    """按宽度等比缩放（不放大），返回 (bytes, 扩展名)"""
+    image = resize_to_width(image, width)
+
+    output = io.BytesIO()
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image.convert('RGBA').save(output, format='PNG', optimize=True)
+        return output.getvalue(), 'png'
+    image.convert('RGB').save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return output.getvalue(), 'jpg'
+
+
+def delete_unreferenced_derivatives(names):
+    """删除不再被任何内容引用的衍生图，返回删除的文件数"""
+    names = {name for name in names if name}
+    if not names:
+        return 0
+    referenced = set()
+    for field in COVER_DERIVATIVES:
+        referenced.update(
+            CreativeContent.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True)
+        )
+    deleted = 0
+    for name in names - referenced:
+        if default_storage.exists(name):
+            default_storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def prune_derivatives():
+    """删除衍生图目录中没有内容引用的文件（清理早期遗留），返回删除的文件数"""
+    referenced = set()
+    for field in COVER_DERIVATIVES:
+        referenced.update(CreativeContent.objects.exclude(**{field: ''}).values_list(field, flat=True))
+    deleted = 0
+    try:
+        shards, _ = default_storage.listdir(DERIVATIVE_DIR)
+    except OSError:
+        return 0
+    for shard in shards:
+        for filename in default_storage.listdir(f'{DERIVATIVE_DIR}/{shard}')[1]:
+            name = f'{DERIVATIVE_DIR}/{shard}/{filename}'
+            if name not in referenced:
+                default_storage.delete(name)
+                deleted += 1
+    return deleted
+
+
+def generate_cover_derivatives(content, force=False):
+    """为内容的封面生成衍生图并写回数据库，返回是否生成了新文件"""
+    old_names = [getattr(content, field).name for field in COVER_DERIVATIVES]
+    if not content.cover_image:
+        if content.cover_hash or content.cover_thumbnail or content.cover_medium or content.cover_placeholder:
+            CreativeContent.objects.filter(pk=content.pk).update(
+                cover_hash='', cover_thumbnail='', cover_medium='', cover_placeholder=''
+            )
+            for field in COVER_DERIVATIVES:
+                setattr(content, field, '')
+            delete_unreferenced_derivatives(old_names)
+        return False
+
+    digest = file_sha256(content.cover_image)
+    if not force and digest == content.cover_hash and content.cover_placeholder and all(
+        getattr(content, field) and default_storage.exists(getattr(content, field).name)
+        for field in COVER_DERIVATIVES
+    ):
+        return False
+
+    # 只按最大的衍生图宽度解码，JPEG 大图在解码阶段即缩小
+    image = open_bounded_image(content.cover_image, max(COVER_DERIVATIVES.values()))
+
+    names = {}
+    for field, width in COVER_DERIVATIVES.items():
+        data, ext = render_derivative(image, width)
+        name = f'{DERIVATIVE_DIR}/{digest[:2]}/{digest}_{width}.{ext}'
+        if force and default_storage.exists(name):
+            default_storage.delete(name)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(data))
+        names[field] = name
+
+    placeholder = compute_placeholder(image)
+
+    # 直接 UPDATE，不触发 save() 和信号
+    CreativeContent.objects.filter(pk=content.pk).update(cover_hash=digest, cover_placeholder=placeholder, **names)
+    for field, name in names.items():
+        setattr(content, field, name)
+    content.cover_hash = digest
+    content.cover_placeholder = placeholder
+    delete_unreferenced_derivatives(set(old_names) - set(names.values()))
+    return True
+
+
+# 后台生成队列：每个进程一个工作线程，按需启动；队列元素为 (处理函数, 对象ID)
+_queue = queue.Queue()
+_worker_lock = threading.Lock()
+_worker = None
+
+
+def _generate_for_content(content_id):
+    content = CreativeContent.objects.filter(pk=content_id).first()
+    if content is not None:
+        generate_cover_derivatives(content)
+
+
+def _generate_for_profile(profile_id):
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if profile is not None:
+        update_placeholder(profile, force=True)
+
+
+def _work():
+    while True:
+        task, object_id = _queue.get()
+        try:
+            task(object_id)
+        except Exception as e:
+            print(f"图片后台处理错误: {e}")
+        finally:
+            close_old_connections()
+            _queue.task_done()
+
+
+def _enqueue(task, object_id):
+    """加入后台队列（COVER_DERIVATIVES_ASYNC 为 False 时交给管理命令处理）"""
+    if not getattr(settings, 'COVER_DERIVATIVES_ASYNC', True):
+        return
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='cover-derivatives', daemon=True)
+            _worker.start()
+    _queue.put((task, object_id))
+
+
+def enqueue_cover_derivatives(content_id):
+    """后台生成封面衍生图和占位图"""
+    _enqueue(_generate_for_content, content_id)
+
+
+def enqueue_avatar_placeholder(profile_id):
+    """后台计算头像占位图"""
+    _enqueue(_generate_for_profile, profile_id)
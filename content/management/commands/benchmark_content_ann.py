@@ -0,0 +1,109 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from content.ann import RandomHyperplaneLSH
+from content.utils import get_content_similarity_matrix
+from content.vectorizer import embed_missing_contents, get_content_vectors
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def recall_at_k(found, expected):
+    if not expected:
+        return None
+    return len(set(found) & set(expected)) / len(expected)
+
+
+class Command(BaseCommand):
+    help = '评估 LSH 近似最近邻的 recall@k 与查询延迟（对照 get_content_similarity_matrix 的精确结果）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', type=parse_int_list, default=[4, 8, 16], help='哈希表数量，逗号分隔')
+        parser.add_argument('--bits', type=parse_int_list, default=[8, 12, 16], help='每个表的位数，逗号分隔')
+        parser.add_argument('--probes', type=parse_int_list, default=[0, 2], help='每个表的额外探测桶数，逗号分隔')
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--queries', type=int, default=200, help='抽样查询数量')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        k = options['k']
+        embed_missing_contents()
+        matrix, content_ids = get_content_vectors()
+        if len(content_ids) <= k:
+            self.stdout.write(self.style.WARNING(f'公开内容不足 {k + 1} 个，无法评估'))
+            return
+
+        # 精确结果一：get_content_similarity_matrix（TF-IDF 重新拟合，作为线上相似度的基准）
+        started = time.monotonic()
+        similarity_dict, _ = get_content_similarity_matrix()
+        baseline_seconds = time.monotonic() - started
+
+        rng = np.random.default_rng(options['seed'])
+        sample = rng.choice(len(content_ids), size=min(options['queries'], len(content_ids)), replace=False)
+
+        baseline_truth = {}
+        for i in sample:
+            content_id = content_ids[i]
+            ranked = sorted(similarity_dict.get(content_id, {}).items(), key=lambda x: -x[1])
+            baseline_truth[content_id] = [cid for cid, score in ranked[:k] if score > 0]
+
+        # 精确结果二：同一向量空间内的暴力搜索，用于区分 LSH 误差与向量化方式的差异
+        started = time.monotonic()
+        vector_truth = {}
+        for i in sample:
+            scores = (matrix @ matrix[i].T).toarray().ravel()
+            scores[i] = -np.inf
+            top = np.argsort(-scores, kind='stable')[:k]
+            vector_truth[content_ids[i]] = [content_ids[j] for j in top if scores[j] > 0]
+        brute_ms = (time.monotonic() - started) * 1000 / len(sample)
+
+        self.stdout.write(
+            f'内容数 {len(content_ids)}，查询数 {len(sample)}，'
+            f'get_content_similarity_matrix 耗时 {baseline_seconds:.2f} 秒，'
+            f'暴力搜索 {brute_ms:.2f} ms/次'
+        )
+        self.stdout.write(
+            f'{"tables":>6} {"bits":>5} {"probes":>6} {"build(s)":>9} '
+            f'{"ms/query":>9} {"candidates":>10} {"recall@{}".format(k):>10} {"recall_vec":>10}'
+        )
+
+        for n_tables in options['tables']:
+            for n_bits in options['bits']:
+                started = time.monotonic()
+                index = RandomHyperplaneLSH(n_tables=n_tables, n_bits=n_bits, seed=options['seed'])
+                index.add(content_ids, matrix)
+                build_seconds = time.monotonic() - started
+
+                for n_probes in options['probes']:
+                    results = {}
+                    started = time.monotonic()
+                    for i in sample:
+                        content_id = content_ids[i]
+                        results[content_id] = [
+                            cid for cid, score in
+                            index.query(matrix[i], k, n_probes, exclude={content_id})
+                        ]
+                    query_ms = (time.monotonic() - started) * 1000 / len(sample)
+
+                    candidate_counts = [len(index.candidates(matrix[i], n_probes)) for i in sample]
+                    baseline_recalls = [
+                        recall_at_k(found, baseline_truth[cid]) for cid, found in results.items()
+                    ]
+                    vector_recalls = [
+                        recall_at_k(found, vector_truth[cid]) for cid, found in results.items()
+                    ]
+
+                    self.stdout.write(
+                        f'{n_tables:>6} {n_bits:>5} {n_probes:>6} {build_seconds:>9.2f} '
+                        f'{query_ms:>9.2f} {np.mean(candidate_counts):>10.1f} '
+                        f'{self._mean(baseline_recalls):>10.3f} {self._mean(vector_recalls):>10.3f}'
+                    )
+
+    @staticmethod
+    def _mean(values):
+        values = [v for v in values if v is not None]
+        return float(np.mean(values)) if values else float('nan')
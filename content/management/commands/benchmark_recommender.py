@@ -0,0 +1,234 @@
+import json
+import platform
+import time
+
+import django
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from content.author_stats import rebuild_author_stats
+from content.counters import reconcile_counters
+from content.models import CreativeContent, Favorite, Like, Rating, Tag
+from content.preferences import rebuild_tag_preferences
+from content.utils import (
+    get_collaborative_filtering_recommendations, get_content_based_recommendations,
+    get_content_similarity_matrix, get_recommendations_for_user, get_user_preferences,
+    update_hot_scores
+)
+
+
+# 预设规模
+SCALES = {
+    'small': {'users': 200, 'posts': 1000, 'tags': 50, 'ratings': 2000, 'likes': 4000, 'favorites': 1000},
+    'medium': {'users': 1000, 'posts': 5000, 'tags': 200, 'ratings': 10000, 'likes': 20000, 'favorites': 5000},
+    'large': {'users': 5000, 'posts': 20000, 'tags': 500, 'ratings': 50000, 'likes': 100000, 'favorites': 25000},
+}
+COUNT_NAMES = ['users', 'posts', 'tags', 'ratings', 'likes', 'favorites']
+
+# 被测函数：(名称, 调用方式, 是否按用户调用)
+BENCHMARKS = [
+    ('get_user_preferences', get_user_preferences, True),
+    ('get_collaborative_filtering_recommendations', get_collaborative_filtering_recommendations, True),
+    ('get_content_based_recommendations', get_content_based_recommendations, True),
+    ('get_content_similarity_matrix', get_content_similarity_matrix, False),
+    ('get_recommendations_for_user', get_recommendations_for_user, True),
+]
+
+# 评分分布偏向高分，与真实站点接近
+SCORE_PROBABILITIES = [0.05, 0.10, 0.20, 0.35, 0.30]
+PUBLIC_RATIO = 0.9
+PREFIX = 'bench'
+
+
+def zipf_weights(n, exponent, rng):
+    """幂律分布的抽样概率（随机打乱，避免 ID 越小越热门）"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def sample_pairs(rng, count, user_p, item_p, max_rounds=20):
+    """按两侧的幂律分布抽取不重复的 (用户, 内容) 下标对"""
+    n_users, n_items = len(user_p), len(item_p)
+    count = min(count, n_users * n_items)
+    keys = np.empty(0, dtype=np.int64)
+    for _ in range(max_rounds):
+        if len(keys) >= count:
+            break
+        need = (count - len(keys)) * 2
+        users = rng.choice(n_users, need, p=user_p)
+        items = rng.choice(n_items, need, p=item_p)
+        keys = np.unique(np.concatenate([keys, users * n_items + items]))
+    keys = rng.permutation(keys)[:count]
+    return keys // n_items, keys % n_items
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+class Command(BaseCommand):
+    help = '生成幂律分布的模拟数据，测量推荐函数在不同规模下的延迟与查询次数（JSON 输出，数据在结束后回滚）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='small,medium',
+                            help=f'预设规模，逗号分隔（可选 {", ".join(SCALES)}）')
+        for name in COUNT_NAMES:
+            parser.add_argument(f'--{name}', type=int, help=f'自定义规模的 {name} 数量（覆盖 small 的默认值）')
+        parser.add_argument('--samples', type=int, default=30, help='每个函数按用户调用的次数')
+        parser.add_argument('--global-samples', type=int, default=3, help='全量函数（相似度矩阵）的调用次数')
+        parser.add_argument('--exponent', type=float, default=1.1, help='幂律指数，越大越集中')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='结果写入的 JSON 文件（默认输出到标准输出）')
+
+    def handle(self, *args, **options):
+        scales = []
+        for name in filter(None, (s.strip() for s in options['scales'].split(','))):
+            if name not in SCALES:
+                raise CommandError(f'未知规模: {name}')
+            scales.append((name, SCALES[name]))
+        custom = {name: options[name] for name in COUNT_NAMES if options[name] is not None}
+        if custom:
+            scales = [('custom', {**SCALES['small'], **custom})]
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'seed': options['seed'],
+            'exponent': options['exponent'],
+            'scales': [],
+        }
+        for name, counts in scales:
+            self.stderr.write(f'规模 {name}: {counts}')
+            report['scales'].append(self._run_scale(name, counts, options))
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stderr.write(self.style.SUCCESS(f'结果已写入 {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    def _run_scale(self, name, counts, options):
+        """在事务中生成数据并计时，结束后回滚"""
+        rng = np.random.default_rng(options['seed'])
+        with transaction.atomic():
+            started = time.monotonic()
+            users = self._seed(counts, rng, options['exponent'])
+            seed_seconds = time.monotonic() - started
+            self.stderr.write(f'  数据生成耗时 {seed_seconds:.2f} 秒')
+
+            sample = [users[i] for i in rng.choice(len(users), options['samples'])]
+            results = {}
+            for function_name, function, per_user in BENCHMARKS:
+                calls = sample if per_user else [None] * options['global_samples']
+                results[function_name] = self._measure(function, calls)
+                self.stderr.write(
+                    f'  {function_name}: p50 {results[function_name]["p50_ms"]} ms，'
+                    f'p95 {results[function_name]["p95_ms"]} ms'
+                )
+            transaction.set_rollback(True)
+
+        return {
+            'name': name,
+            'counts': counts,
+            'seed_seconds': round(seed_seconds, 3),
+            'functions': results,
+        }
+
+    def _measure(self, function, calls):
+        timings = []
+        queries = []
+        for user in calls:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                if user is None:
+                    function()
+                else:
+                    function(user)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured.captured_queries))
+        return {
+            'calls': len(timings),
+            'p50_ms': percentile(timings, 50),
+            'p95_ms': percentile(timings, 95),
+            'mean_ms': round(float(np.mean(timings)), 3),
+            'queries_p50': percentile(queries, 50),
+            'queries_max': max(queries),
+        }
+
+    def _seed(self, counts, rng, exponent):
+        """批量写入模拟数据（不触发信号，写完后重算统计字段、热门分数、作者统计和标签偏好）"""
+        n_users, n_posts, n_tags = counts['users'], counts['posts'], counts['tags']
+        run = f'{PREFIX}{time.time_ns()}'
+
+        User.objects.bulk_create(
+            [User(username=f'{run}_{i}', password='!') for i in range(n_users)],
+            batch_size=1000
+        )
+        users = list(User.objects.filter(username__startswith=f'{run}_').order_by('id'))
+        Tag.objects.bulk_create([Tag(name=f'{run}_{i}') for i in range(n_tags)], batch_size=1000)
+        tag_ids = list(Tag.objects.filter(name__startswith=f'{run}_').order_by('id').values_list('id', flat=True))
+
+        activity = zipf_weights(n_users, exponent, rng)    # 活跃用户互动更多、发帖更多
+        popularity = zipf_weights(n_posts, exponent, rng)  # 热门内容获得更多互动
+        tag_popularity = zipf_weights(n_tags, exponent, rng)
+        vocabulary = [f'w{i}' for i in range(2000)]
+        word_p = zipf_weights(len(vocabulary), exponent, rng)
+
+        interactions = {
+            name: sample_pairs(rng, counts[name], activity, popularity)
+            for name in ('likes', 'favorites', 'ratings')
+        }
+
+        authors = rng.choice(n_users, n_posts, p=activity)
+        public = rng.random(n_posts) < PUBLIC_RATIO
+        posts = [
+            CreativeContent(
+                title=f'{run} {i}',
+                content=' '.join(rng.choice(vocabulary, 40, p=word_p)),
+                author=users[authors[i]],
+                privacy='public' if public[i] else 'private',
+            )
+            for i in range(n_posts)
+        ]
+        CreativeContent.objects.bulk_create(posts, batch_size=1000)
+        post_ids = list(CreativeContent.objects.filter(
+            title__startswith=f'{run} '
+        ).order_by('id').values_list('id', flat=True))
+
+        through = CreativeContent.tags.through
+        links = []
+        for post_id in post_ids:
+            for tag in rng.choice(n_tags, min(int(rng.integers(1, 6)), n_tags), replace=False, p=tag_popularity):
+                links.append(through(creativecontent_id=post_id, tag_id=tag_ids[tag]))
+        through.objects.bulk_create(links, batch_size=5000)
+
+        user_ids = [user.id for user in users]
+        for model, name in ((Like, 'likes'), (Favorite, 'favorites')):
+            user_pos, post_pos = interactions[name]
+            model.objects.bulk_create(
+                [model(user_id=user_ids[u], content_id=post_ids[p]) for u, p in zip(user_pos, post_pos)],
+                batch_size=5000
+            )
+        user_pos, post_pos = interactions['ratings']
+        scores = rng.choice(5, len(user_pos), p=SCORE_PROBABILITIES) + 1
+        Rating.objects.bulk_create(
+            [Rating(user_id=user_ids[u], content_id=post_ids[p], score=int(s))
+             for u, p, s in zip(user_pos, post_pos, scores)],
+            batch_size=5000
+        )
+
+        # bulk_create 不触发信号，按实际数据重算信号维护的汇总
+        reconcile_counters()
+        update_hot_scores()
+        rebuild_author_stats()
+        rebuild_tag_preferences()
+        return users
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from content.ann import build_ann_index, get_ann_params, save_ann_index
+from content.vectorizer import embed_missing_contents
+
+
+class Command(BaseCommand):
+    help = '构建内容向量的 LSH 近似最近邻索引，写出供 Web 进程内存映射的数组文件'
+
+    def add_arguments(self, parser):
+        params = get_ann_params()
+        parser.add_argument('--tables', type=int, default=params['n_tables'], help='哈希表数量')
+        parser.add_argument('--bits', type=int, default=params['n_bits'], help='每个表的位数')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        embed_missing_contents()
+        # 此后更新的向量由各进程的增量部分补上
+        built_at = timezone.now()
+        index = build_ann_index(options['tables'], options['bits'], options['seed'])
+        if not len(index):
+            self.stdout.write(self.style.WARNING('没有公开内容，跳过索引构建'))
+            return
+        count = save_ann_index(index, built_at=built_at)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'ANN 索引构建完成：{count} 个内容，{index.n_tables} 个表 × {index.n_bits} 位，'
+            f'耗时 {time.monotonic() - started:.2f} 秒'
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.neighbors import DEFAULT_K, compute_top_k, save_index
+from content.vectorizer import embed_missing_contents, get_content_vectors
+
+
+class Command(BaseCommand):
+    help = '构建内容 Top-K 近邻索引，供详情页"相关内容"查询'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=DEFAULT_K, help='每个内容保留的邻居数')
+        parser.add_argument('--chunk-size', type=int, default=1024, help='每批计算相似度的行数')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        embed_missing_contents()
+        matrix, content_ids = get_content_vectors()
+        if not content_ids:
+            self.stdout.write(self.style.WARNING('没有公开内容，跳过索引构建'))
+            return
+
+        neighbors, scores = compute_top_k(matrix, options['k'], options['chunk_size'])
+        save_index(content_ids, neighbors, scores)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'近邻索引构建完成：{len(content_ids)} 个内容，'
+            f'K={neighbors.shape[1]}，耗时 {time.monotonic() - started:.2f} 秒'
+        ))
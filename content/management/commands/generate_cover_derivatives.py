@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from content.images import generate_cover_derivatives, prune_derivatives
+from content.models import CreativeContent
+
+
+class Command(BaseCommand):
+    help = '为封面生成缩略图和中图（补算缺失的衍生图，--force 重新生成全部，--prune 删除无引用的衍生图）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='重新生成所有封面的衍生图')
+        parser.add_argument('--prune', action='store_true', help='生成后删除没有内容引用的衍生图文件')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        contents = CreativeContent.objects.exclude(Q(cover_image='') | Q(cover_image__isnull=True))
+        if not options['force']:
+            contents = contents.filter(
+                Q(cover_hash='') | Q(cover_thumbnail='') | Q(cover_medium='')
+            )
+        # 已删除封面但仍保留衍生图的内容
+        stale = CreativeContent.objects.filter(
+            Q(cover_image='') | Q(cover_image__isnull=True)
+        ).exclude(cover_hash='')
+
+        generated = 0
+        failed = 0
+        for content in list(contents) + list(stale):
+            try:
+                if generate_cover_derivatives(content, force=options['force']):
+                    generated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'内容 {content.pk} 的封面处理失败: {e}')
+
+        if options['prune']:
+            self.stdout.write(f'删除 {prune_derivatives()} 个无引用的衍生图')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'生成 {generated} 个封面的衍生图，失败 {failed} 个，耗时 {time.monotonic() - started:.2f} 秒'
+        ))
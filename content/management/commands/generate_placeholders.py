@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.placeholders import generate_placeholders
+
+
+class Command(BaseCommand):
+    help = '为封面和头像补算列表页使用的占位图（--force 重新计算全部）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='重新计算所有占位图')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated, failed = generate_placeholders(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f'更新 {updated} 个占位图，失败 {failed} 个，耗时 {time.monotonic() - started:.2f} 秒'
+        ))
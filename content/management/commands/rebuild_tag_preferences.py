@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.preferences import rebuild_tag_preferences
+
+
+class Command(BaseCommand):
+    help = '根据点赞、收藏、评分重新计算所有用户的标签偏好权重（修正标签变更等增量无法覆盖的情况）'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = rebuild_tag_preferences()
+        self.stdout.write(self.style.SUCCESS(
+            f'写入 {rows} 条标签偏好，耗时 {time.monotonic() - started:.2f} 秒'
+        ))
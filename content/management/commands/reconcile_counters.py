@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from content.counters import COUNTERS, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = '按实际数据校正内容的点赞数、评论数、收藏数和评分汇总（定期批处理任务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--field', action='append', dest='fields', choices=list(COUNTERS),
+                            help='只校正指定字段（可重复）')
+        parser.add_argument('--dry-run', action='store_true', help='只统计偏差，不写入')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counters(options['fields'], dry_run=options['dry_run'])
+        verb = '发现' if options['dry_run'] else '校正'
+        for field, count in fixed.items():
+            self.stdout.write(f'{field}: {verb} {count} 个内容')
+        self.stdout.write(self.style.SUCCESS(f'共{verb} {sum(fixed.values())} 处偏差'))
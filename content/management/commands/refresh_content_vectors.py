@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.models import CreativeContent
+from content.vectorizer import embed_contents, embed_missing_contents, refresh_idf
+
+
+class Command(BaseCommand):
+    help = '补算内容文本向量并刷新 IDF 权重（定期批处理任务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reembed', action='store_true',
+            help='重新计算所有内容的词频向量（例如标签批量修改之后）'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        if options['reembed']:
+            embedded = embed_contents(CreativeContent.objects.prefetch_related('tags'))
+        else:
+            embedded = embed_missing_contents()
+        documents = refresh_idf()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'向量化 {embedded} 个内容，基于 {documents} 个公开内容刷新 IDF，'
+            f'耗时 {time.monotonic() - started:.2f} 秒'
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from content.thumbnails import get_thumbnail_widths, purge_thumbnails, warm_thumbnails
+
+
+class Command(BaseCommand):
+    help = '管理头像缩略图磁盘缓存：--purge 清空，--warm 预先生成所有头像的缩略图'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge', action='store_true', help='删除缓存的缩略图')
+        parser.add_argument('--warm', action='store_true', help='预先生成缩略图')
+        parser.add_argument('--widths', help='逗号分隔的宽度（默认 THUMBNAIL_WIDTHS 中的全部）')
+
+    def handle(self, *args, **options):
+        if not options['purge'] and not options['warm']:
+            raise CommandError('请指定 --purge 或 --warm')
+
+        if options['purge']:
+            removed = purge_thumbnails()
+            self.stdout.write(self.style.SUCCESS(f'已删除 {removed} 个缓存文件'))
+
+        if options['warm']:
+            widths = get_thumbnail_widths()
+            if options['widths']:
+                widths = [int(w) for w in options['widths'].split(',') if w.strip()]
+                unsupported = set(widths) - set(get_thumbnail_widths())
+                if unsupported:
+                    raise CommandError(f'不支持的宽度: {sorted(unsupported)}')
+            generated, failed = warm_thumbnails(widths)
+            self.stdout.write(self.style.SUCCESS(f'已生成 {generated} 个缩略图，失败 {failed} 个'))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.utils import update_hot_scores
+
+
+class Command(BaseCommand):
+    help = '批量计算公开内容的综合评分并写入 hot_score（定期批处理任务，用于热门排序）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批写入的内容数')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated = update_hot_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'已更新 {updated} 个公开内容的热度，耗时 {time.monotonic() - started:.2f} 秒'
+        ))
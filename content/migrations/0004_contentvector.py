@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0003_creativecontent_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVector',
+            fields=[
+                ('content', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='content.creativecontent', verbose_name='内容')),
+                ('indices', models.BinaryField(verbose_name='特征下标')),
+                ('values', models.BinaryField(verbose_name='词频')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '内容向量',
+                'verbose_name_plural': '内容向量',
+            },
+        ),
+    ]
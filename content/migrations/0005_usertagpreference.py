@@ -0,0 +1,79 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# 与 content/preferences.py 中的权重一致（迁移中不导入应用代码）
+LIKE_WEIGHT = 1.0
+FAVORITE_WEIGHT = 2.0
+HIGH_RATING_WEIGHT = 1.5
+HIGH_RATING_SCORE = 4
+
+
+def backfill_tag_preferences(apps, schema_editor):
+    """根据已有的点赞、收藏、评分计算标签权重（与 rebuild_tag_preferences 相同的聚合 SQL）"""
+    UserTagPreference = apps.get_model('content', 'UserTagPreference')
+    CreativeContent = apps.get_model('content', 'CreativeContent')
+    Like = apps.get_model('content', 'Like')
+    Favorite = apps.get_model('content', 'Favorite')
+    Rating = apps.get_model('content', 'Rating')
+
+    quote = schema_editor.connection.ops.quote_name
+    preference_table = quote(UserTagPreference._meta.db_table)
+    through_table = quote(CreativeContent.tags.through._meta.db_table)
+    like_table = quote(Like._meta.db_table)
+    favorite_table = quote(Favorite._meta.db_table)
+    rating_table = quote(Rating._meta.db_table)
+
+    sql = f"""
+        INSERT INTO {preference_table} (user_id, tag_id, weight, updated_at)
+        SELECT user_id, tag_id, SUM(weight), %s FROM (
+            SELECT l.user_id AS user_id, ct.tag_id AS tag_id, %s AS weight
+            FROM {like_table} l
+            JOIN {through_table} ct ON ct.creativecontent_id = l.content_id
+            UNION ALL
+            SELECT f.user_id, ct.tag_id, %s
+            FROM {favorite_table} f
+            JOIN {through_table} ct ON ct.creativecontent_id = f.content_id
+            UNION ALL
+            SELECT r.user_id, ct.tag_id, %s
+            FROM {rating_table} r
+            JOIN {through_table} ct ON ct.creativecontent_id = r.content_id
+            WHERE r.score >= %s
+        ) interactions
+        GROUP BY user_id, tag_id
+    """
+    params = [timezone.now(), LIKE_WEIGHT, FAVORITE_WEIGHT, HIGH_RATING_WEIGHT, HIGH_RATING_SCORE]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0004_contentvector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTagPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.FloatField(default=0, verbose_name='权重')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='content.tag', verbose_name='标签')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_preferences', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '标签偏好',
+                'verbose_name_plural': '标签偏好',
+                'indexes': [models.Index(fields=['user', '-weight'], name='content_tagpref_user_wt_idx')],
+                'unique_together': {('user', 'tag')},
+            },
+        ),
+        migrations.RunPython(backfill_tag_preferences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:38
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    """根据已有评分计算汇总字段"""
+    CreativeContent = apps.get_model('content', 'CreativeContent')
+    Rating = apps.get_model('content', 'Rating')
+
+    rows = Rating.objects.values('content_id').annotate(
+        rating_sum=Sum('score'),
+        rating_count=Count('pk'),
+        **{f'rating_{score}_count': Count('pk', filter=Q(score=score)) for score in range(1, 6)}
+    )
+    fields = ['rating_sum', 'rating_count'] + [f'rating_{score}_count' for score in range(1, 6)]
+    contents = [
+        CreativeContent(pk=row['content_id'], **{field: row[field] for field in fields})
+        for row in rows
+    ]
+    CreativeContent.objects.bulk_update(contents, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0005_usertagpreference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creativecontent',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='1星评分数'),
+        ),
+        migrations.AddField(
+            model_name='creativecontent',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='2星评分数'),
+        ),
+        migrations.AddField(
+            model_name='creativecontent',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='3星评分数'),
+        ),
+        migrations.AddField(
+            model_name='creativecontent',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='4星评分数'),
+        ),
+        migrations.AddField(
+            model_name='creativecontent',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='5星评分数'),
+        ),
+        migrations.AddField(
+            model_name='creativecontent',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='评分人数'),
+        ),
+        migrations.AddField(
+            model_name='creativecontent',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='评分总和'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0006_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creativecontent',
+            name='hot_score',
+            field=models.FloatField(db_index=True, default=0, verbose_name='热度'),
+        ),
+    ]
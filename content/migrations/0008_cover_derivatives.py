@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0007_creativecontent_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creativecontent',
+            name='cover_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='封面哈希'),
+        ),
+        migrations.AddField(
+            model_name='creativecontent',
+            name='cover_medium',
+            field=models.ImageField(blank=True, editable=False, upload_to='covers/derived/', verbose_name='封面中图'),
+        ),
+        migrations.AddField(
+            model_name='creativecontent',
+            name='cover_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='covers/derived/', verbose_name='封面缩略图'),
+        ),
+    ]
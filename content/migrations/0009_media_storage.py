@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:48
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0008_cover_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='creativecontent',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.get_media_storage, upload_to='covers/', verbose_name='封面图'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.get_media_storage, upload_to='avatars/', verbose_name='头像'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0009_media_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creativecontent',
+            name='cover_placeholder',
+            field=models.CharField(blank=True, editable=False, max_length=500, verbose_name='封面占位图'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_placeholder',
+            field=models.CharField(blank=True, editable=False, max_length=500, verbose_name='头像占位图'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0010_placeholders'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='useractivity',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='操作时间'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0011_activity_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['created_at'], name='content_activity_created_idx'),
+        ),
+    ]
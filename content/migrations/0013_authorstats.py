@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_author_stats(apps, schema_editor):
+    """根据已有内容的统计字段计算作者统计"""
+    AuthorStats = apps.get_model('content', 'AuthorStats')
+    CreativeContent = apps.get_model('content', 'CreativeContent')
+
+    public = Q(privacy='public')
+    summed = ['views_count', 'likes_count', 'favorites_count', 'comments_count', 'rating_sum', 'rating_count']
+    rows = CreativeContent.objects.values('author_id').annotate(
+        total_content_count=Count('pk'),
+        total_public_content_count=Count('pk', filter=public),
+        **{f'total_{field}': Sum(field) for field in summed},
+        **{f'total_public_{field}': Sum(field, filter=public) for field in ['views_count', 'likes_count', 'favorites_count']},
+    ).order_by()
+    AuthorStats.objects.bulk_create([
+        AuthorStats(user_id=row.pop('author_id'), **{alias[len('total_'):]: value or 0 for alias, value in row.items()})
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('content', '0012_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='author_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='作者')),
+                ('content_count', models.PositiveIntegerField(default=0, verbose_name='内容数')),
+                ('views_count', models.PositiveBigIntegerField(default=0, verbose_name='总浏览量')),
+                ('likes_count', models.PositiveIntegerField(default=0, verbose_name='总点赞数')),
+                ('favorites_count', models.PositiveIntegerField(default=0, verbose_name='总收藏数')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='总评论数')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='评分总和')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='评分人数')),
+                ('public_content_count', models.PositiveIntegerField(default=0, verbose_name='公开内容数')),
+                ('public_views_count', models.PositiveBigIntegerField(default=0, verbose_name='公开内容浏览量')),
+                ('public_likes_count', models.PositiveIntegerField(default=0, verbose_name='公开内容点赞数')),
+                ('public_favorites_count', models.PositiveIntegerField(default=0, verbose_name='公开内容收藏数')),
+            ],
+            options={
+                'verbose_name': '作者统计',
+                'verbose_name_plural': '作者统计',
+            },
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,15 @@
 from django.db import models
+from django.db.models import F, Subquery
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from PIL import Image
+
+from core.storage import get_media_storage
+
+from .recommendation_cache import bump_interaction_stamp
 
 
 class Tag(models.Model):
@@ -54,13 +59,27 @@ class CreativeContent(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="分类")
     tags = models.ManyToManyField(Tag, blank=True, verbose_name="标签")
     privacy = models.CharField(max_length=10, choices=PRIVACY_CHOICES, default='public', verbose_name="隐私设置")
-    cover_image = models.ImageField(upload_to='covers/', blank=True, null=True, verbose_name="封面图")
+    # 原图按内容哈希存放在 covers/ab/cd/ 下，相同图片只保存一份
+    cover_image = models.ImageField(upload_to='covers/', storage=get_media_storage, blank=True, null=True, verbose_name="封面图")
+    # 封面衍生图（由 content/images.py 在后台生成，文件名为原图的 SHA-256）
+    cover_thumbnail = models.ImageField(upload_to='covers/derived/', blank=True, editable=False, verbose_name="封面缩略图")
+    cover_medium = models.ImageField(upload_to='covers/derived/', blank=True, editable=False, verbose_name="封面中图")
+    cover_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name="封面哈希")
+    cover_placeholder = models.CharField(max_length=500, blank=True, editable=False, verbose_name="封面占位图")  # 8×8 PNG 的 data URI
     
     # 统计字段
     views_count = models.PositiveIntegerField(default=0, verbose_name="浏览量")
     likes_count = models.PositiveIntegerField(default=0, verbose_name="点赞数")
     comments_count = models.PositiveIntegerField(default=0, verbose_name="评论数")
     favorites_count = models.PositiveIntegerField(default=0, verbose_name="收藏数")
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="评分总和")
+    rating_count = models.PositiveIntegerField(default=0, verbose_name="评分人数")
+    rating_1_count = models.PositiveIntegerField(default=0, verbose_name="1星评分数")
+    rating_2_count = models.PositiveIntegerField(default=0, verbose_name="2星评分数")
+    rating_3_count = models.PositiveIntegerField(default=0, verbose_name="3星评分数")
+    rating_4_count = models.PositiveIntegerField(default=0, verbose_name="4星评分数")
+    rating_5_count = models.PositiveIntegerField(default=0, verbose_name="5星评分数")
+    hot_score = models.FloatField(default=0, db_index=True, verbose_name="热度")  # 由 update_hot_scores 定期计算
     
     # 时间字段
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
@@ -83,24 +102,44 @@ class CreativeContent(models.Model):
     
     def get_average_rating(self):
         """获取平均评分"""
-        ratings = self.ratings.all()
-        if ratings:
-            return sum([r.score for r in ratings]) / len(ratings)
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
         return 0
     
     def get_rating_count(self):
         """获取评分数量"""
-        return self.ratings.count()
+        return self.rating_count
+    
+    def get_rating_distribution(self):
+        """获取各星级的评分数量，依次为 1 星到 5 星"""
+        return [getattr(self, f'rating_{score}_count') for score in range(1, 6)]
+    
+    def get_cover_thumbnail_url(self):
+        """列表卡片使用的封面地址（衍生图未生成时使用原图）"""
+        if self.cover_thumbnail:
+            return self.cover_thumbnail.url
+        return self.cover_image.url if self.cover_image else ''
+    
+    def get_cover_medium_url(self):
+        """详情页使用的封面地址（衍生图未生成时使用原图）"""
+        if self.cover_medium:
+            return self.cover_medium.url
+        return self.cover_image.url if self.cover_image else ''
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录读出时的封面文件名，保存后据此判断封面是否更换
+        instance._loaded_cover_name = instance.cover_image.name if 'cover_image' in field_names else None
+        # 记录读出时的隐私设置，保存后据此调整作者的公开内容统计
+        instance._loaded_privacy = instance.privacy if 'privacy' in field_names else None
+        return instance
     
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        # 压缩封面图片
-        if self.cover_image:
-            img = Image.open(self.cover_image.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-                img.save(self.cover_image.path)
+        # 信号处理器已根据旧封面和旧隐私设置处理完毕，此后以新值为准
+        self._loaded_cover_name = self.cover_image.name or ''
+        self._loaded_privacy = self.privacy
 
 
 class Rating(models.Model):
@@ -118,6 +157,18 @@ class Rating(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.content.title} - {self.score}星"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录从数据库读出的分数，保存时据此计算增量
+        instance._loaded_score = instance.score if 'score' in field_names else None
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # 信号处理器已根据旧分数计算完增量，此后以新分数为准
+        self._loaded_score = self.score
+
 
 class Comment(models.Model):
     """评论模型"""
@@ -171,7 +222,8 @@ class UserProfile(models.Model):
     """用户扩展信息"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name="用户")
     bio = models.TextField(max_length=500, blank=True, verbose_name="个人简介")
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name="头像")
+    avatar = models.ImageField(upload_to='avatars/', storage=get_media_storage, blank=True, null=True, verbose_name="头像")
+    avatar_placeholder = models.CharField(max_length=500, blank=True, editable=False, verbose_name="头像占位图")
     website = models.URLField(blank=True, verbose_name="个人网站")
     location = models.CharField(max_length=100, blank=True, verbose_name="所在地")
     birth_date = models.DateField(null=True, blank=True, verbose_name="生日")
@@ -182,6 +234,17 @@ class UserProfile(models.Model):
     
     def __str__(self):
         return f"{self.user.username}的资料"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录读出时的头像文件名，保存后据此释放旧头像
+        instance._loaded_avatar_name = instance.avatar.name if 'avatar' in field_names else None
+        return instance
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_avatar_name = self.avatar.name or ''
 
 
 class UserActivity(models.Model):
@@ -201,40 +264,328 @@ class UserActivity(models.Model):
     content = models.ForeignKey(CreativeContent, on_delete=models.CASCADE, null=True, blank=True, verbose_name="相关内容")
     description = models.CharField(max_length=200, verbose_name="描述")
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="IP地址")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="操作时间")
+    # 活动由后台线程批量写入，时间取记录时刻而不是写入时刻
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="操作时间")
     
     class Meta:
         verbose_name = "用户活动"
         verbose_name_plural = "用户活动"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='content_activity_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} {self.get_action_display()} - {self.created_at}"
 
 
+class ContentVector(models.Model):
+    """内容文本向量（哈希词频，稀疏存储）"""
+    content = models.OneToOneField(CreativeContent, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='vector', verbose_name="内容")
+    indices = models.BinaryField(verbose_name="特征下标")  # int32
+    values = models.BinaryField(verbose_name="词频")  # float32
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "内容向量"
+        verbose_name_plural = "内容向量"
+
+    def __str__(self):
+        return f"{self.content_id} 的文本向量"
+
+
+class UserTagPreference(models.Model):
+    """用户标签偏好权重（由点赞、收藏、评分增量维护）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tag_preferences', verbose_name="用户")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, verbose_name="标签")
+    weight = models.FloatField(default=0, verbose_name="权重")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = "标签偏好"
+        verbose_name_plural = "标签偏好"
+        unique_together = ['user', 'tag']
+        indexes = [models.Index(fields=['user', '-weight'], name='content_tagpref_user_wt_idx')]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.tag.name}: {self.weight}"
+
+
+class AuthorStats(models.Model):
+    """作者统计（由信号处理器和浏览量写缓冲增量维护，rebuild_author_stats 命令可重建）"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name='author_stats', verbose_name="作者")
+    content_count = models.PositiveIntegerField(default=0, verbose_name="内容数")
+    views_count = models.PositiveBigIntegerField(default=0, verbose_name="总浏览量")
+    likes_count = models.PositiveIntegerField(default=0, verbose_name="总点赞数")
+    favorites_count = models.PositiveIntegerField(default=0, verbose_name="总收藏数")
+    comments_count = models.PositiveIntegerField(default=0, verbose_name="总评论数")
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="评分总和")
+    rating_count = models.PositiveIntegerField(default=0, verbose_name="评分人数")
+    # 只计公开内容，他人查看个人主页时使用
+    public_content_count = models.PositiveIntegerField(default=0, verbose_name="公开内容数")
+    public_views_count = models.PositiveBigIntegerField(default=0, verbose_name="公开内容浏览量")
+    public_likes_count = models.PositiveIntegerField(default=0, verbose_name="公开内容点赞数")
+    public_favorites_count = models.PositiveIntegerField(default=0, verbose_name="公开内容收藏数")
+
+    class Meta:
+        verbose_name = "作者统计"
+        verbose_name_plural = "作者统计"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.content_count} 篇"
+
+    def get_average_rating(self):
+        """所有内容的平均评分"""
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
+        return 0
+
+    def get_totals(self, public_only=False):
+        """页面显示的内容数、浏览、点赞、收藏（public_only 时只计公开内容）"""
+        prefix = 'public_' if public_only else ''
+        return {
+            'total_contents': getattr(self, f'{prefix}content_count'),
+            'total_views': getattr(self, f'{prefix}views_count'),
+            'total_likes': getattr(self, f'{prefix}likes_count'),
+            'total_favorites': getattr(self, f'{prefix}favorites_count'),
+        }
+
+
 # 信号处理器：自动更新统计字段
+def adjust_counter(content_id, field, delta):
+    """用单条 UPDATE 原子地增减内容的统计字段（不会减到负数），并同步到作者统计"""
+    from .author_stats import adjust_author_stats
+    queryset = CreativeContent.objects.filter(pk=content_id)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    if queryset.update(**{field: F(field) + delta}):
+        adjust_author_stats(content_id, **{field: delta})
+
+
 @receiver(post_save, sender=Like)
 @receiver(post_delete, sender=Like)
 def update_likes_count(sender, instance, **kwargs):
     """更新点赞数"""
-    content = instance.content
-    content.likes_count = content.likes.count()
-    content.save(update_fields=['likes_count'])
+    if kwargs.get('created') is False:
+        return
+    adjust_counter(instance.content_id, 'likes_count', 1 if kwargs.get('created') else -1)
+    bump_interaction_stamp(instance.user_id)
 
 
 @receiver(post_save, sender=Comment)
 @receiver(post_delete, sender=Comment)
 def update_comments_count(sender, instance, **kwargs):
     """更新评论数"""
-    content = instance.content
-    content.comments_count = content.comments.count()
-    content.save(update_fields=['comments_count'])
+    if kwargs.get('created') is False:
+        return
+    adjust_counter(instance.content_id, 'comments_count', 1 if kwargs.get('created') else -1)
 
 
 @receiver(post_save, sender=Favorite)
 @receiver(post_delete, sender=Favorite)
 def update_favorites_count(sender, instance, **kwargs):
     """更新收藏数"""
-    content = instance.content
-    content.favorites_count = content.favorites.count()
-    content.save(update_fields=['favorites_count'])
+    if kwargs.get('created') is False:
+        return
+    adjust_counter(instance.content_id, 'favorites_count', 1 if kwargs.get('created') else -1)
+    bump_interaction_stamp(instance.user_id)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def update_rating_stamp(sender, instance, **kwargs):
+    """评分变化后让该用户的推荐缓存和共享的协同过滤引擎失效"""
+    from django.db import transaction
+    from .collaborative import bump_engine_stamp
+    bump_interaction_stamp(instance.user_id)
+    # 提交后再通知，其他进程重新加载时能读到这次评分
+    transaction.on_commit(bump_engine_stamp)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def update_rating_aggregates(sender, instance, **kwargs):
+    """更新评分总和、评分人数和各星级数量，并同步到作者统计"""
+    from .author_stats import adjust_author_stats
+    changes = {}
+    if kwargs.get('signal') is post_delete:
+        old_score = getattr(instance, '_loaded_score', instance.score)
+        sum_delta, count_delta = -old_score, -1
+        changes = {
+            'rating_sum': F('rating_sum') - old_score,
+            'rating_count': F('rating_count') - 1,
+            f'rating_{old_score}_count': F(f'rating_{old_score}_count') - 1,
+        }
+    elif kwargs.get('created'):
+        sum_delta, count_delta = instance.score, 1
+        changes = {
+            'rating_sum': F('rating_sum') + instance.score,
+            'rating_count': F('rating_count') + 1,
+            f'rating_{instance.score}_count': F(f'rating_{instance.score}_count') + 1,
+        }
+    else:
+        old_score = getattr(instance, '_loaded_score', None)
+        if old_score is not None and old_score != instance.score:
+            sum_delta, count_delta = instance.score - old_score, 0
+            changes = {
+                'rating_sum': F('rating_sum') + (instance.score - old_score),
+                f'rating_{old_score}_count': F(f'rating_{old_score}_count') - 1,
+                f'rating_{instance.score}_count': F(f'rating_{instance.score}_count') + 1,
+            }
+    if changes:
+        CreativeContent.objects.filter(pk=instance.content_id).update(**changes)
+        adjust_author_stats(instance.content_id, rating_sum=sum_delta, rating_count=count_delta)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def update_like_tag_preferences(sender, instance, **kwargs):
+    """点赞后更新用户标签偏好"""
+    from .preferences import LIKE_WEIGHT, adjust_tag_preferences
+    if kwargs.get('created') is False:
+        return
+    delta = LIKE_WEIGHT if kwargs.get('created') else -LIKE_WEIGHT
+    adjust_tag_preferences(instance.user_id, instance.content_id, delta)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def update_favorite_tag_preferences(sender, instance, **kwargs):
+    """收藏后更新用户标签偏好"""
+    from .preferences import FAVORITE_WEIGHT, adjust_tag_preferences
+    if kwargs.get('created') is False:
+        return
+    delta = FAVORITE_WEIGHT if kwargs.get('created') else -FAVORITE_WEIGHT
+    adjust_tag_preferences(instance.user_id, instance.content_id, delta)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def update_rating_tag_preferences(sender, instance, **kwargs):
+    """评分变化后更新用户标签偏好（只有 4 分及以上计入）"""
+    from .preferences import adjust_tag_preferences, rating_weight
+    old_weight = rating_weight(getattr(instance, '_loaded_score', None))
+    if kwargs.get('signal') is post_delete:
+        delta = -rating_weight(getattr(instance, '_loaded_score', instance.score))
+    else:
+        delta = rating_weight(instance.score) - (0.0 if kwargs.get('created') else old_weight)
+    adjust_tag_preferences(instance.user_id, instance.content_id, delta)
+
+
+@receiver(post_save, sender=CreativeContent)
+def update_author_stats_on_save(sender, instance, created, **kwargs):
+    """新内容计入作者统计；隐私设置变化时把该内容的统计移入或移出公开部分"""
+    from .author_stats import adjust_author_stats, ensure_author_stats, move_public_stats
+    if created:
+        ensure_author_stats(instance.author_id)
+        adjust_author_stats(instance.pk, content_count=1)
+        return
+    old_privacy = getattr(instance, '_loaded_privacy', None)
+    if old_privacy is not None and old_privacy != instance.privacy:
+        move_public_stats(instance.pk, 1 if instance.privacy == 'public' else -1)
+
+
+@receiver(pre_delete, sender=CreativeContent)
+def update_author_stats_on_delete(sender, instance, **kwargs):
+    """内容删除前从作者统计中减去内容数和浏览量（点赞、收藏、评论、评分由级联删除的信号减去）"""
+    from .author_stats import adjust_author_stats
+    content = CreativeContent.objects.filter(pk=instance.pk)
+    adjust_author_stats(instance.pk, content_count=-1, views_count=-Subquery(content.values('views_count')))
+
+
+@receiver(post_save, sender=CreativeContent)
+def schedule_cover_derivatives(sender, instance, created, **kwargs):
+    """封面上传或更换后，在事务提交后交给后台生成衍生图"""
+    from django.db import transaction
+    from .images import enqueue_cover_derivatives
+    name = instance.cover_image.name or ''
+    if created:
+        changed = bool(name)
+    else:
+        changed = name != (getattr(instance, '_loaded_cover_name', None) or '')
+    if changed:
+        transaction.on_commit(lambda: enqueue_cover_derivatives(instance.pk))
+
+
+@receiver(pre_save, sender=CreativeContent)
+@receiver(pre_save, sender=UserProfile)
+def mark_new_media_uploads(sender, instance, **kwargs):
+    """记录本次保存上传了新文件的字段（内容相同的文件重新上传时文件名不变，但引用数已加一）"""
+    from core.storage import get_media_fields
+    instance._new_media_uploads = {
+        field for model, field in get_media_fields()
+        if model is sender and getattr(instance, field) and not getattr(instance, field)._committed
+    }
+
+
+def release_media_on_commit(old_name, new_name='', uploaded=False):
+    """事务提交后释放旧文件的引用（引用数归零时删除文件）；uploaded 为本次保存上传了新文件"""
+    from django.db import transaction
+    if old_name and (uploaded or old_name != (new_name or '')):
+        transaction.on_commit(lambda: get_media_storage().delete(old_name))
+
+
+@receiver(post_save, sender=CreativeContent)
+@receiver(post_delete, sender=CreativeContent)
+def release_replaced_cover(sender, instance, **kwargs):
+    """封面更换或内容删除后释放旧封面"""
+    if kwargs.get('signal') is post_delete:
+        release_media_on_commit(instance.cover_image.name)
+    elif not kwargs.get('created'):
+        release_media_on_commit(
+            getattr(instance, '_loaded_cover_name', None), instance.cover_image.name,
+            uploaded='cover_image' in getattr(instance, '_new_media_uploads', ()),
+        )
+
+
+@receiver(post_delete, sender=CreativeContent)
+def delete_cover_derivatives(sender, instance, **kwargs):
+    """内容删除后，在事务提交后删除不再被引用的衍生图"""
+    from django.db import transaction
+    from .images import delete_unreferenced_derivatives
+    names = [instance.cover_thumbnail.name, instance.cover_medium.name]
+    if any(names):
+        transaction.on_commit(lambda: delete_unreferenced_derivatives(names))
+
+
+@receiver(post_save, sender=ContentVector)
+@receiver(post_save, sender=CreativeContent)
+@receiver(post_delete, sender=CreativeContent)
+def update_ann_delta_stamp(sender, instance, **kwargs):
+    """向量更新、隐私设置变化或内容删除后，让各进程重新加载 ANN 索引的增量部分"""
+    from django.db import transaction
+    from .ann import bump_ann_delta_stamp
+    if sender is CreativeContent and kwargs.get('signal') is post_save:
+        old_privacy = getattr(instance, '_loaded_privacy', None)
+        if kwargs.get('created') or old_privacy is None or old_privacy == instance.privacy:
+            return
+    transaction.on_commit(bump_ann_delta_stamp)
+
+
+@receiver(post_save, sender=UserProfile)
+def schedule_avatar_placeholder(sender, instance, created, **kwargs):
+    """头像上传或更换后，在事务提交后交给后台计算占位图"""
+    from django.db import transaction
+    from .images import enqueue_avatar_placeholder
+    name = instance.avatar.name or ''
+    if created:
+        changed = bool(name)
+    else:
+        changed = name != (getattr(instance, '_loaded_avatar_name', None) or '')
+    if changed:
+        transaction.on_commit(lambda: enqueue_avatar_placeholder(instance.pk))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def release_replaced_avatar(sender, instance, **kwargs):
+    """头像更换或资料删除后释放旧头像"""
+    if kwargs.get('signal') is post_delete:
+        release_media_on_commit(instance.avatar.name)
+    elif not kwargs.get('created'):
+        release_media_on_commit(
+            getattr(instance, '_loaded_avatar_name', None), instance.avatar.name,
+            uploaded='avatar' in getattr(instance, '_new_media_uploads', ()),
+        )
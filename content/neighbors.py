@@ -0,0 +1,140 @@
+"""
+内容近邻索引
+
+离线为每个公开内容保留 Top-K 个最相似的内容，
+以 int32/float32 数组的形式保存到磁盘，详情页按 O(K) 查询"相关内容"。
+"""
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+
+INDEX_DIRNAME = 'content_neighbors'
+DEFAULT_K = 50
+
+
+def get_index_dir():
+    """近邻索引所在目录"""
+    return os.path.join(settings.RECOMMENDER_DATA_DIR, INDEX_DIRNAME)
+
+
+def compute_top_k(matrix, k=DEFAULT_K, chunk_size=1024):
+    """
+    分块计算每一行的 Top-K 余弦相似邻居
+
+    matrix 需为按行 L2 归一化的稀疏矩阵，每次只物化 chunk_size×n 的相似度块，
+    返回 (neighbors[int32], scores[float32])，形状均为 (n, k)。
+    """
+    n = matrix.shape[0]
+    k = min(k, max(n - 1, 0))
+    neighbors = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return neighbors, scores
+
+    matrix_t = matrix.T.tocsc()
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        block = (matrix[start:end] @ matrix_t).toarray()
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf  # 排除自身
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        neighbors[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbors, scores
+
+
+def save_index(content_ids, neighbors, scores, index_dir=None):
+    """保存索引（先写临时文件再替换，避免读到写了一半的文件）"""
+    index_dir = index_dir or get_index_dir()
+    os.makedirs(index_dir, exist_ok=True)
+
+    order = np.argsort(content_ids)
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+    arrays = {
+        # 按内容ID排序，便于二分查找；邻居同样映射到排序后的位置
+        'neighbors': position[neighbors[order]].astype(np.int32),
+        'scores': scores[order].astype(np.float32),
+        'content_ids': np.asarray(content_ids, dtype=np.int64)[order],
+    }
+    # content_ids 最后写入，它的修改时间代表整个索引的版本
+    for name, array in arrays.items():
+        path = os.path.join(index_dir, f'{name}.npy')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+
+class ContentNeighborIndex:
+    """只读的 Top-K 近邻索引"""
+
+    def __init__(self, content_ids, neighbors, scores):
+        self.content_ids = content_ids
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @classmethod
+    def load(cls, index_dir=None):
+        index_dir = index_dir or get_index_dir()
+        return cls(
+            np.load(os.path.join(index_dir, 'content_ids.npy'), mmap_mode='r'),
+            np.load(os.path.join(index_dir, 'neighbors.npy'), mmap_mode='r'),
+            np.load(os.path.join(index_dir, 'scores.npy'), mmap_mode='r'),
+        )
+
+    def __len__(self):
+        return len(self.content_ids)
+
+    def __contains__(self, content_id):
+        return self._position(content_id) is not None
+
+    def _position(self, content_id):
+        i = int(np.searchsorted(self.content_ids, content_id))
+        if i < len(self.content_ids) and self.content_ids[i] == content_id:
+            return i
+        return None
+
+    def related(self, content_id, limit=None):
+        """返回 [(content_id, score), ...]，按相似度降序"""
+        i = self._position(content_id)
+        if i is None:
+            return []
+        neighbors = self.neighbors[i][:limit]
+        scores = self.scores[i][:limit]
+        return [
+            (int(self.content_ids[j]), float(s))
+            for j, s in zip(neighbors, scores) if s > 0
+        ]
+
+
+_index_lock = threading.Lock()
+_index_cache = {'mtime': None, 'index': None}
+
+
+def get_neighbor_index():
+    """获取当前进程的索引（索引文件更新后自动重新加载），不存在时返回 None"""
+    path = os.path.join(get_index_dir(), 'content_ids.npy')
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _index_lock:
+        if _index_cache['mtime'] != mtime:
+            _index_cache['index'] = ContentNeighborIndex.load()
+            _index_cache['mtime'] = mtime
+        return _index_cache['index']
+
+
+def get_related_content_ids(content_id, limit=4):
+    """查询相关内容ID，索引不存在或内容未收录时返回空列表"""
+    index = get_neighbor_index()
+    if index is None:
+        return []
+    return [cid for cid, score in index.related(content_id, limit)]
@@ -0,0 +1,73 @@
+"""
+图片占位图（LQIP）
+
+为封面和头像预先计算一张不超过 8×8 像素的小图，编码为 data URI 存在模型上（约 200 字节）。
+列表页把它作为 <img> 的背景内联输出，真实图片延迟加载，加载前卡片不会跳动。
+"""
+import base64
+import io
+
+from django.db.models import Q
+from PIL import Image
+
+from .models import CreativeContent, UserProfile
+from .uploads import open_bounded_image
+
+
+PLACEHOLDER_SIZE = 8
+
+# 模型 -> (图片字段, 占位图字段)
+PLACEHOLDER_FIELDS = {
+    CreativeContent: ('cover_image', 'cover_placeholder'),
+    UserProfile: ('avatar', 'avatar_placeholder'),
+}
+
+
+def compute_placeholder(image):
+    """把已解码的图片缩成不超过 8×8 的 PNG，返回 data URI"""
+    small = image.convert('RGB')
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BOX)
+    output = io.BytesIO()
+    small.save(output, format='PNG', optimize=True)
+    return 'data:image/png;base64,' + base64.b64encode(output.getvalue()).decode('ascii')
+
+
+def update_placeholder(instance, force=False):
+    """计算并写回实例的占位图，返回是否更新了数据库"""
+    image_field, placeholder_field = PLACEHOLDER_FIELDS[type(instance)]
+    field_file = getattr(instance, image_field)
+    current = getattr(instance, placeholder_field)
+    if not field_file:
+        placeholder = ''
+    elif current and not force:
+        return False
+    else:
+        placeholder = compute_placeholder(open_bounded_image(field_file, PLACEHOLDER_SIZE))
+
+    if placeholder == current:
+        return False
+    # 直接 UPDATE，不触发 save() 和信号
+    type(instance).objects.filter(pk=instance.pk).update(**{placeholder_field: placeholder})
+    setattr(instance, placeholder_field, placeholder)
+    return True
+
+
+def generate_placeholders(force=False):
+    """补算所有缺失的占位图（force 时全部重算），返回 (更新数, 失败数)"""
+    updated = failed = 0
+    for model, (image_field, placeholder_field) in PLACEHOLDER_FIELDS.items():
+        instances = model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+        if not force:
+            instances = instances.filter(**{placeholder_field: ''})
+        # 已删除图片但仍保留占位图的记录
+        stale = model.objects.filter(
+            Q(**{image_field: ''}) | Q(**{f'{image_field}__isnull': True})
+        ).exclude(**{placeholder_field: ''})
+        for instance in list(instances.only('pk', image_field, placeholder_field)) + list(stale):
+            try:
+                if update_placeholder(instance, force=force):
+                    updated += 1
+            except Exception as e:
+                print(f"占位图生成错误 {model.__name__}/{instance.pk}: {e}")
+                failed += 1
+    return updated, failed
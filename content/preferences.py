@@ -0,0 +1,90 @@
+"""
+用户标签偏好
+
+每个用户对每个标签的权重保存在 UserTagPreference 表中：
+点赞 +1，收藏 +2，评分≥4 +1.5。点赞/收藏/评分的信号处理器增量维护权重，
+内容标签被修改等无法增量跟踪的变化由 rebuild_tag_preferences 命令定期整体重算。
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CreativeContent, Favorite, Like, Rating, UserTagPreference
+
+
+LIKE_WEIGHT = 1.0
+FAVORITE_WEIGHT = 2.0
+HIGH_RATING_WEIGHT = 1.5
+HIGH_RATING_SCORE = 4
+
+
+def rating_weight(score):
+    """评分对应的标签权重"""
+    return HIGH_RATING_WEIGHT if score is not None and score >= HIGH_RATING_SCORE else 0.0
+
+
+def adjust_tag_preferences(user_id, content_id, delta):
+    """把内容的所有标签在该用户上的权重加上 delta"""
+    if not delta:
+        return
+
+    tag_ids = list(CreativeContent.tags.through.objects.filter(
+        creativecontent_id=content_id
+    ).values_list('tag_id', flat=True))
+    if not tag_ids:
+        return
+
+    with transaction.atomic():
+        if delta > 0:
+            UserTagPreference.objects.bulk_create(
+                [UserTagPreference(user_id=user_id, tag_id=tag_id) for tag_id in tag_ids],
+                ignore_conflicts=True,
+            )
+        preferences = UserTagPreference.objects.filter(user_id=user_id, tag_id__in=tag_ids)
+        preferences.update(weight=F('weight') + delta, updated_at=timezone.now())
+        if delta < 0:
+            preferences.filter(weight__lte=1e-9).delete()
+
+
+def get_top_tag_ids(user, limit=10):
+    """用户权重最高的标签ID（单次索引查询）"""
+    return list(UserTagPreference.objects.filter(
+        user=user,
+        weight__gt=0
+    ).order_by('-weight', 'tag_id').values_list('tag_id', flat=True)[:limit])
+
+
+def rebuild_tag_preferences():
+    """用一条聚合 SQL 重新计算所有用户的标签权重，返回写入的行数"""
+    quote = connection.ops.quote_name
+    preference_table = quote(UserTagPreference._meta.db_table)
+    through_table = quote(CreativeContent.tags.through._meta.db_table)
+    like_table = quote(Like._meta.db_table)
+    favorite_table = quote(Favorite._meta.db_table)
+    rating_table = quote(Rating._meta.db_table)
+
+    sql = f"""
+        INSERT INTO {preference_table} (user_id, tag_id, weight, updated_at)
+        SELECT user_id, tag_id, SUM(weight), %s FROM (
+            SELECT l.user_id AS user_id, ct.tag_id AS tag_id, %s AS weight
+            FROM {like_table} l
+            JOIN {through_table} ct ON ct.creativecontent_id = l.content_id
+            UNION ALL
+            SELECT f.user_id, ct.tag_id, %s
+            FROM {favorite_table} f
+            JOIN {through_table} ct ON ct.creativecontent_id = f.content_id
+            UNION ALL
+            SELECT r.user_id, ct.tag_id, %s
+            FROM {rating_table} r
+            JOIN {through_table} ct ON ct.creativecontent_id = r.content_id
+            WHERE r.score >= %s
+        ) interactions
+        GROUP BY user_id, tag_id
+    """
+    params = [timezone.now(), LIKE_WEIGHT, FAVORITE_WEIGHT, HIGH_RATING_WEIGHT, HIGH_RATING_SCORE]
+
+    with transaction.atomic():
+        UserTagPreference.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
@@ -0,0 +1,89 @@
+"""
+按用户缓存推荐结果
+
+每个用户有一个"交互版本号"（最后一次点赞/收藏/评分的时间戳，纳秒），
+保存在 Django 缓存中，由 models.py 中的信号处理器更新。
+推荐结果保存在进程内的 LRU 缓存中，键为用户，值附带生成时的版本号；
+版本号变化或超过 TTL 后重新计算，交互没有变化的用户直接命中缓存。
+
+多进程部署时请把 CACHES 配置为共享缓存（Redis/Memcached），
+这样一个进程中的交互会让所有进程的缓存失效。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+STAMP_KEY = 'recommendation_stamp:{user_id}'
+
+
+def get_interaction_stamp(user_id):
+    """获取用户的交互版本号，没有记录时为 0"""
+    return cache.get(STAMP_KEY.format(user_id=user_id), 0)
+
+
+def bump_interaction_stamp(user_id):
+    """用户产生了新的交互，更新版本号"""
+    stamp = time.time_ns()
+    cache.set(STAMP_KEY.format(user_id=user_id), stamp, timeout=None)
+    return stamp
+
+
+class RecommendationCache:
+    """带 TTL 和容量上限的 LRU 缓存"""
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, stamp, value):
+        with self._lock:
+            self._entries[key] = (stamp, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+recommendation_cache = RecommendationCache(
+    max_size=getattr(settings, 'RECOMMENDATION_CACHE_SIZE', 1000),
+    ttl=getattr(settings, 'RECOMMENDATION_CACHE_TTL', 300),
+)
+
+
+def get_cached_recommendations(user, limit, compute):
+    """
+    命中缓存时直接返回，否则调用 compute(stamp) 计算并写入缓存
+
+    compute 接收当前交互版本号，便于判断预计算结果是否已过期。
+    """
+    stamp = get_interaction_stamp(user.id)
+    key = (user.id, limit)
+    recommendations = recommendation_cache.get(key, stamp)
+    if recommendations is None:
+        recommendations = compute(stamp)
+        recommendation_cache.set(key, stamp, recommendations)
+    return recommendations
@@ -0,0 +1,40 @@
+from django import template
+
+from content.images import COVER_DERIVATIVES
+from content.thumbnails import KIND_AVATAR, thumbnail_url
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def cover_thumbnail(content):
+    """列表卡片使用的封面地址（后台生成的缩略图，未生成时为原图）"""
+    return content.get_cover_thumbnail_url()
+
+
+@register.simple_tag
+def cover_srcset(content):
+    """封面缩略图和中图的 srcset，衍生图尚未生成时为空字符串"""
+    if not all(getattr(content, field) for field in COVER_DERIVATIVES):
+        return ''
+    return ', '.join(
+        f'{getattr(content, field).url} {width}w' for field, width in COVER_DERIVATIVES.items()
+    )
+
+
+@register.simple_tag
+def avatar_thumbnail(user, width):
+    """用户头像的缩略图地址，没有头像时为空字符串"""
+    profile = getattr(user, 'userprofile', None)
+    if profile is None or not profile.avatar:
+        return ''
+    return thumbnail_url(KIND_AVATAR, user.pk, profile.avatar, width)
+
+
+@register.simple_tag
+def placeholder_style(placeholder):
+    """把占位图作为背景的内联样式（真实图片加载完成后覆盖它）"""
+    if not placeholder:
+        return ''
+    return f'background: center / cover no-repeat url({placeholder});'
@@ -1,3 +1,1009 @@
-from django.test import TestCase
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+
+from .models import (
+    AuthorStats, Comment, ContentVector, CreativeContent, Favorite, Like, Rating, Tag, UserProfile, UserTagPreference,
+)
+from .als import get_als_model
+from .ann import (
+    ContentANNIndex, RandomHyperplaneLSH, get_ann_index, query_similar_content_ids, save_ann_index
+)
+from .budget import get_budgeted_recommendations, stage_slots
+from .collaborative import CollaborativeFilteringEngine, get_collaborative_engine
+from .neighbors import get_related_content_ids
+from .preferences import rebuild_tag_preferences
+from .utils import (
+    calculate_content_score, calculate_user_similarity, get_collaborative_filtering_recommendations,
+    get_recommendations_for_user,
+    get_user_preferences
+)
+from .vectorizer import N_FEATURES, embed_content, get_content_vectors
+from .view_counter import ViewCountBuffer
+from .views import UserProfileView
+
+
+def legacy_cf_ranking(user, limit=10):
+    """原有逐用户实现，用于对照稀疏矩阵引擎的结果"""
+    user_rated = dict(Rating.objects.filter(user=user).values_list('content_id', 'score'))
+    similar_users = []
+    for other in User.objects.exclude(id=user.id).order_by('id'):
+        other_rated = dict(Rating.objects.filter(user=other).values_list('content_id', 'score'))
+        common = set(user_rated) & set(other_rated)
+        if len(common) >= 2:
+            similarity = calculate_user_similarity(user_rated, other_rated, common)
+            if similarity > 0.3:
+                similar_users.append((other, similarity))
+    similar_users.sort(key=lambda x: x[1], reverse=True)
+
+    recommendations = []
+    for other, similarity in similar_users[:5]:
+        contents = CreativeContent.objects.filter(
+            ratings__user=other, ratings__score__gte=4, privacy='public'
+        ).exclude(id__in=user_rated.keys()).distinct()
+        for content in contents:
+            if content.id not in [rec[0] for rec in recommendations]:
+                score = similarity * content.ratings.get(user=other).score
+                recommendations.append((content.id, score))
+    recommendations.sort(key=lambda x: x[1], reverse=True)
+    return recommendations[:limit]
+
+
+class CollaborativeFilteringEngineTests(TestCase):
+    """稀疏矩阵协同过滤与原有皮尔逊实现的一致性"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{i}') for i in range(6)]
+        author = User.objects.create_user('author')
+        cls.contents = [
+            CreativeContent.objects.create(
+                title=f'内容{i}', content='正文', author=author,
+                privacy='private' if i == 7 else 'public'
+            )
+            for i in range(10)
+        ]
+        scores = [
+            [5, 3, 4, None, 1, None, None, None, 2, None],
+            [4, 2, 5, 5, None, 4, None, 5, None, None],
+            [5, 3, 4, 4, 2, None, 5, 4, None, 4],
+            [1, 5, 2, None, 5, 4, 4, None, None, 5],
+            [5, 3, None, 5, 1, 5, 4, 5, 2, None],
+            [2, 2, 2, None, None, 5, None, None, None, 4],
+        ]
+        for user, row in zip(cls.users, scores):
+            for content, score in zip(cls.contents, row):
+                if score is not None:
+                    Rating.objects.create(user=user, content=content, score=score)
+
+    def test_similarities_match_pearson(self):
+        engine = CollaborativeFilteringEngine.from_database()
+        user = self.users[0]
+        similar = dict(engine.similar_users(user.id))
+        user_rated = dict(Rating.objects.filter(user=user).values_list('content_id', 'score'))
+        for other in self.users[1:]:
+            other_rated = dict(Rating.objects.filter(user=other).values_list('content_id', 'score'))
+            common = set(user_rated) & set(other_rated)
+            expected = calculate_user_similarity(user_rated, other_rated, common)
+            if len(common) >= 2 and expected > 0.3:
+                self.assertAlmostEqual(similar[other.id], expected, places=9)
+            else:
+                self.assertNotIn(other.id, similar)
+
+    def test_ranking_matches_legacy_implementation(self):
+        engine = CollaborativeFilteringEngine.from_database()
+        batch = engine.recommend_batch([user.id for user in self.users])
+        for user in self.users:
+            expected = legacy_cf_ranking(user)
+            actual = engine.recommend(user.id)
+            self.assertEqual([c for c, _ in actual], [c for c, _ in expected])
+            for (_, a), (_, b) in zip(actual, expected):
+                self.assertAlmostEqual(a, b, places=9)
+            self.assertEqual(batch[user.id], actual)
+
+    def test_recommendations_return_contents(self):
+        user = self.users[0]
+        contents = get_collaborative_filtering_recommendations(user)
+        self.assertEqual([c.id for c in contents], [c for c, _ in legacy_cf_ranking(user)])
+        self.assertNotIn(self.contents[7], contents)
+
+
+class CollaborativeEngineCacheTests(TransactionTestCase):
+    """进程内共享的协同过滤引擎"""
+
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.users = [User.objects.create_user(f'user{i}') for i in range(2)]
+        self.contents = [
+            CreativeContent.objects.create(title=f'内容{i}', content='正文', author=author) for i in range(3)
+        ]
+        for user in self.users:
+            for content, score in zip(self.contents[:2], (5, 4)):
+                Rating.objects.create(user=user, content=content, score=score)
+
+    def test_engine_shared_until_ratings_change(self):
+        engine = get_collaborative_engine()
+        # 引擎已加载：只检查用户是否有评分，不再读取全部评分
+        with self.assertNumQueries(1):
+            self.assertEqual(get_collaborative_filtering_recommendations(self.users[0]), [])
+        self.assertIs(get_collaborative_engine(), engine)
+
+        # 评分变化后先返回旧引擎，后台加载完成后换成新引擎
+        Rating.objects.create(user=self.users[0], content=self.contents[2], score=3)
+        self.assertIs(get_collaborative_engine(block=False), engine)
+        deadline = time.monotonic() + 5
+        while get_collaborative_engine(block=False) is engine and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIn(self.contents[2].id, get_collaborative_engine().content_ids)
+
+
+class ContentNeighborIndexTests(TestCase):
+    """内容向量与 Top-K 近邻索引"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        words = ['python django web', 'python numpy matrix', 'django orm query',
+                 'numpy matrix vector', 'web css html', 'html css layout']
+        cls.contents = [
+            CreativeContent.objects.create(title=f'post{i}', content=text, author=author)
+            for i, text in enumerate(words)
+        ]
+
+    def test_index_matches_brute_force(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(RECOMMENDER_DATA_DIR=tmp):
+            call_command('refresh_content_vectors', stdout=StringIO())
+            call_command('build_content_neighbors', k=3, stdout=StringIO())
+            matrix, content_ids = get_content_vectors()
+            similarity = (matrix @ matrix.T).toarray()
+            np.fill_diagonal(similarity, -1)
+            for i, content_id in enumerate(content_ids):
+                expected = sorted(s for s in similarity[i] if s > 0)[::-1][:3]
+                actual = [
+                    similarity[i, content_ids.index(cid)]
+                    for cid in get_related_content_ids(content_id, limit=3)
+                ]
+                self.assertEqual(np.round(actual, 5).tolist(), np.round(expected, 5).tolist())
+
+    def test_update_reembeds_single_content(self):
+        content = self.contents[0]
+        embed_content(content)
+        before = bytes(ContentVector.objects.get(content=content).indices)
+        content.content = 'completely different words'
+        content.save()
+        embed_content(content)
+        self.assertNotEqual(bytes(ContentVector.objects.get(content=content).indices), before)
+        self.assertEqual(ContentVector.objects.count(), 1)
+
+    def test_offline_ann_index_serves_new_contents(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(RECOMMENDER_DATA_DIR=tmp):
+            self.assertEqual(query_similar_content_ids(self.contents[0].id), [])
+            call_command('refresh_content_vectors', stdout=StringIO())
+            call_command('build_content_ann', tables=8, bits=4, stdout=StringIO())
+            self.assertIn(self.contents[0].id, get_ann_index())
+
+            # 索引之后新建的内容进入增量部分，可以作为其他内容的邻居返回
+            with self.captureOnCommitCallbacks(execute=True):
+                new = CreativeContent.objects.create(
+                    title='new', content='numpy matrix vector', author=self.contents[0].author
+                )
+                embed_content(new)
+            self.assertIn(new.id, get_ann_index())
+            self.assertEqual(query_similar_content_ids(self.contents[3].id, limit=1), [new.id])
+
+            # 改为私密或删除的内容不再作为候选
+            private, deleted = self.contents[3], self.contents[1]
+            self.assertEqual(set(query_similar_content_ids(new.id, limit=5)), {private.id, deleted.id})
+            with self.captureOnCommitCallbacks(execute=True):
+                private.privacy = 'private'
+                private.save()
+                deleted.delete()
+            self.assertNotIn(private.id, get_ann_index())
+            self.assertEqual(query_similar_content_ids(new.id, limit=5), [])
+
+
+class RandomHyperplaneLSHTests(TestCase):
+    """LSH 索引的召回与增量更新"""
+
+    def setUp(self):
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+        rng = np.random.default_rng(0)
+        dense = rng.random((300, 64)) * (rng.random((300, 64)) < 0.2)
+        self.matrix = normalize(sparse.csr_matrix(dense))
+        self.ids = list(range(1000, 1300))
+
+    def test_recall_against_brute_force(self):
+        index = RandomHyperplaneLSH(n_tables=16, n_bits=6)
+        index.add(self.ids, self.matrix)
+        recalls = []
+        for i in range(0, 300, 10):
+            scores = (self.matrix @ self.matrix[i].T).toarray().ravel()
+            scores[i] = -1
+            expected = {self.ids[j] for j in np.argsort(-scores)[:10]}
+            found = {cid for cid, _ in index.query(self.matrix[i], 10, n_probes=2, exclude={self.ids[i]})}
+            recalls.append(len(found & expected) / 10)
+        self.assertGreater(np.mean(recalls), 0.8)
+
+    def test_insert_and_delete(self):
+        index = RandomHyperplaneLSH(n_tables=4, n_bits=4)
+        index.add(self.ids[:10], self.matrix[:10])
+        self.assertIn(self.ids[0], {cid for cid, _ in index.query(self.matrix[0], 3)})
+        index.remove([self.ids[0]])
+        self.assertNotIn(self.ids[0], index)
+        self.assertNotIn(self.ids[0], {cid for cid, _ in index.query(self.matrix[0], 10, n_probes=4)})
+        self.assertTrue(all(self.ids[0] not in bucket for table in index.tables for bucket in table.values()))
+
+    def test_saved_index_matches_in_memory_index(self):
+        from scipy import sparse
+        matrix = sparse.csr_matrix((self.matrix.data, self.matrix.indices, self.matrix.indptr),
+                                   shape=(300, N_FEATURES))
+        index = RandomHyperplaneLSH(n_tables=8, n_bits=6)
+        index.add(self.ids, matrix)
+        with tempfile.TemporaryDirectory() as tmp:
+            save_ann_index(index, tmp)
+            stored = ContentANNIndex.load(tmp)
+            self.assertEqual(len(stored), 300)
+            for i in range(0, 300, 25):
+                exclude = {self.ids[i]}
+                self.assertEqual(stored.query(matrix[i], 5, n_probes=2, exclude=exclude),
+                                 index.query(matrix[i], 5, n_probes=2, exclude=exclude))
+
+
+class UserTagPreferenceTests(TestCase):
+    """标签偏好的增量维护与整体重算"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.tags = [Tag.objects.create(name=f'标签{i}') for i in range(4)]
+        cls.contents = []
+        for i in range(4):
+            content = CreativeContent.objects.create(title=f'内容{i}', content='正文', author=cls.author)
+            content.tags.set(cls.tags[i:i + 2])
+            cls.contents.append(content)
+
+    def weights(self):
+        return dict(UserTagPreference.objects.filter(user=self.reader).values_list('tag__name', 'weight'))
+
+    def test_signals_match_rebuild(self):
+        Like.objects.create(user=self.reader, content=self.contents[0])
+        Favorite.objects.create(user=self.reader, content=self.contents[1])
+        rating = Rating.objects.create(user=self.reader, content=self.contents[2], score=5)
+        Rating.objects.create(user=self.reader, content=self.contents[3], score=2)
+        self.assertEqual(self.weights(), {'标签0': 1.0, '标签1': 3.0, '标签2': 3.5, '标签3': 1.5})
+
+        # 评分从 5 改为 3、取消点赞后，相应权重被扣除
+        rating = Rating.objects.get(pk=rating.pk)
+        rating.score = 3
+        rating.save()
+        Like.objects.filter(user=self.reader).delete()
+        incremental = self.weights()
+        self.assertEqual(incremental, {'标签1': 2.0, '标签2': 2.0})
+
+        rebuild_tag_preferences()
+        self.assertEqual(self.weights(), incremental)
+
+    def test_top_tags_in_one_query(self):
+        Favorite.objects.create(user=self.reader, content=self.contents[2])
+        Like.objects.create(user=self.reader, content=self.contents[3])
+        with self.assertNumQueries(1):
+            preferred = get_user_preferences(self.reader)
+        self.assertEqual(preferred, [self.tags[3].id, self.tags[2].id])
+
+
+class ALSRecommendationTests(TestCase):
+    """ALS 矩阵分解推荐"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        cls.clusters = [
+            [CreativeContent.objects.create(title=f'{group}{i}', content='正文', author=author) for i in range(4)]
+            for group in 'AB'
+        ]
+        cls.users = []
+        for c, contents in enumerate(cls.clusters):
+            for i in range(6):
+                user = User.objects.create_user(f'user{c}{i}')
+                for j, content in enumerate(contents):
+                    if j != i % 4:
+                        Like.objects.create(user=user, content=content)
+                # 对另一组的第一个内容给出低分
+                Rating.objects.create(user=user, content=cls.clusters[1 - c][0], score=1)
+                cls.users.append(user)
+        # 3 分评分的强度为 0，不参与训练，但仍算已交互
+        Rating.objects.create(user=cls.users[2], content=cls.clusters[1][1], score=3)
+
+    def test_recommends_missing_item_from_own_cluster(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(RECOMMENDER_DATA_DIR=tmp):
+            call_command('train_als', factors=4, stdout=StringIO())
+            model = get_als_model()
+            self.assertIsInstance(model.user_factors, np.memmap)
+
+            user = self.users[2]  # 没有点赞 A2
+            recommended = get_recommendations_for_user(user, limit=1, strategy='als')
+            self.assertEqual(recommended, [self.clusters[0][2]])
+
+            scores = dict(model.recommend(user.id, limit=10))
+            self.assertNotIn(self.clusters[0][0].id, scores)  # 已交互的内容被排除
+            self.assertNotIn(self.clusters[1][0].id, scores)
+            self.assertNotIn(self.clusters[1][1].id, scores)
+
+
+class RecommenderBenchmarkTests(TestCase):
+    """推荐基准测试命令"""
+
+    def test_reports_json_and_rolls_back(self):
+        out = StringIO()
+        call_command(
+            'benchmark_recommender', users=20, posts=40, tags=5, ratings=60, likes=80, favorites=20,
+            samples=3, global_samples=1, stdout=out, stderr=StringIO()
+        )
+        report = json.loads(out.getvalue())
+        functions = report['scales'][0]['functions']
+        self.assertEqual(functions['get_user_preferences']['queries_max'], 1)
+        self.assertEqual(set(functions['get_recommendations_for_user']), {
+            'calls', 'p50_ms', 'p95_ms', 'mean_ms', 'queries_p50', 'queries_max'
+        })
+        self.assertFalse(User.objects.exists())
+
+
+@override_settings(RECOMMENDATION_STAGE_TIMEOUTS={'collaborative': 0.2, 'content_based': 0.2},
+                   RECOMMENDATION_TOTAL_TIMEOUT=0.3)
+class BudgetedRecommendationTests(TransactionTestCase):
+    """限时混合推荐（阶段在线程池中执行，需要已提交的数据）"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author')
+        self.reader = User.objects.create_user('reader')
+        self.contents = [
+            CreativeContent.objects.create(title=f'内容{i}', content='正文', author=self.author)
+            for i in range(4)
+        ]
+        Like.objects.create(user=self.reader, content=self.contents[0])
+
+    def test_slow_stage_is_dropped_and_popular_fills(self):
+        def slow(user, limit):
+            time.sleep(0.5)
+            return [self.contents[1]]
+
+        with mock.patch('content.utils.get_content_based_recommendations', slow):
+            started = time.monotonic()
+            recommendations, report = get_budgeted_recommendations(self.reader, limit=3)
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.45)
+        self.assertEqual(report['content_based']['status'], 'timeout')
+        self.assertEqual(report['collaborative']['status'], 'ok')
+        self.assertEqual(report['popular']['count'], 3)
+        # 已点赞的内容不会出现在补充的热门内容中
+        self.assertEqual(len(recommendations), 3)
+        self.assertNotIn(self.contents[0], [content for content, reason in recommendations])
+
+    def test_completed_stages_are_merged_in_order(self):
+        with mock.patch('content.utils.get_content_based_recommendations',
+                        lambda user, limit: [self.contents[2]]):
+            recommendations, report = get_budgeted_recommendations(self.reader, limit=2)
+        self.assertEqual(report['content_based']['status'], 'ok')
+        self.assertEqual([content for content, reason in recommendations][:1], [self.contents[2]])
+        self.assertEqual(len(recommendations), 2)
+
+    @override_settings(RECOMMENDATION_STAGE_MAX_IN_FLIGHT=1)
+    def test_running_stage_limits_new_submissions(self):
+        release = threading.Event()
+
+        def stuck(user, limit):
+            release.wait(2)
+            return [self.contents[1]]
+
+        with mock.patch('content.utils.get_content_based_recommendations', stuck):
+            recommendations, report = get_budgeted_recommendations(self.reader, limit=2)
+            self.assertEqual(report['content_based']['status'], 'timeout')
+            # 超时的任务仍在执行，下一次请求不再提交该阶段
+            recommendations, report = get_budgeted_recommendations(self.reader, limit=2)
+            self.assertEqual(report['content_based']['status'], 'skipped')
+            self.assertEqual(len(recommendations), 2)
+
+        release.set()
+        deadline = time.monotonic() + 2
+        while stage_slots.snapshot().get('content_based') and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with mock.patch('content.utils.get_content_based_recommendations',
+                        lambda user, limit: [self.contents[2]]):
+            recommendations, report = get_budgeted_recommendations(self.reader, limit=2)
+        self.assertEqual(report['content_based']['status'], 'ok')
+
+
+class CounterTests(TestCase):
+    """统计字段的原子更新与校正"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.readers = [User.objects.create_user(f'reader{i}') for i in range(3)]
+        cls.content = CreativeContent.objects.create(title='内容', content='正文', author=cls.author)
+
+    def test_signals_update_counters_in_place(self):
+        likes = [Like.objects.create(user=user, content=self.content) for user in self.readers]
+        Favorite.objects.create(user=self.readers[0], content=self.content)
+        comment = Comment.objects.create(author=self.readers[1], content=self.content, text='好')
+        comment.text = '很好'
+        comment.save()
+        likes[0].delete()
+
+        self.content.refresh_from_db()
+        self.assertEqual(
+            (self.content.likes_count, self.content.favorites_count, self.content.comments_count),
+            (2, 1, 1)
+        )
+
+    def test_rating_aggregates_follow_create_update_delete(self):
+        Rating.objects.create(user=self.readers[0], content=self.content, score=5)
+        Rating.objects.update_or_create(user=self.readers[1], content=self.content, defaults={'score': 2})
+        Rating.objects.update_or_create(user=self.readers[1], content=self.content, defaults={'score': 4})
+        Rating.objects.create(user=self.readers[2], content=self.content, score=1)
+        Rating.objects.filter(user=self.readers[2]).delete()
+
+        self.content.refresh_from_db()
+        self.assertEqual((self.content.rating_sum, self.content.rating_count), (9, 2))
+        self.assertEqual(self.content.get_rating_distribution(), [0, 0, 0, 1, 1])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.content.get_average_rating(), 4.5)
+
+    def test_reconcile_fixes_drift(self):
+        Like.objects.create(user=self.readers[0], content=self.content)
+        Rating.objects.create(user=self.readers[1], content=self.content, score=3)
+        CreativeContent.objects.filter(pk=self.content.pk).update(
+            likes_count=7, comments_count=3, rating_sum=0, rating_3_count=0
+        )
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.content.refresh_from_db()
+        self.assertEqual((self.content.likes_count, self.content.comments_count), (1, 0))
+        self.assertEqual((self.content.rating_sum, self.content.get_rating_distribution()), (3, [0, 0, 1, 0, 0]))
+        self.assertIn('likes_count: 校正 1', out.getvalue())
+
+    def test_reconcile_adjusts_only_affected_authors(self):
+        other = User.objects.create_user('other')
+        CreativeContent.objects.create(title='其他', content='正文', author=other)
+        AuthorStats.objects.filter(user=other).update(views_count=42)
+        # bulk_create 不触发信号，内容和作者统计都漏掉这两个点赞
+        Like.objects.bulk_create([Like(user=user, content=self.content) for user in self.readers[:2]])
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(AuthorStats.objects.get(user=self.author).likes_count, 2)
+        self.assertEqual(AuthorStats.objects.get(user=self.author).public_likes_count, 2)
+        self.assertEqual(AuthorStats.objects.get(user=other).views_count, 42)
+
+    def test_reconcile_does_not_overwrite_concurrent_updates(self):
+        from . import counters
+
+        CreativeContent.objects.filter(pk=self.content.pk).update(likes_count=5, comments_count=2)
+        compute_counters = counters.compute_counters
+
+        def compute_then_like(fields):
+            actual = compute_counters(fields)
+            # 计算之后、写入之前有新的点赞
+            Like.objects.create(user=self.readers[0], content=self.content)
+            return actual
+
+        with mock.patch.object(counters, 'compute_counters', compute_then_like):
+            fixed = counters.reconcile_counters(['likes_count', 'comments_count'])
+        self.content.refresh_from_db()
+        # 计数已变化，本次跳过该内容，新点赞没有被覆盖
+        self.assertEqual((self.content.likes_count, self.content.comments_count), (6, 2))
+        self.assertEqual(fixed, {'likes_count': 0, 'comments_count': 0})
+
+        counters.reconcile_counters(['likes_count', 'comments_count'])
+        self.content.refresh_from_db()
+        self.assertEqual((self.content.likes_count, self.content.comments_count), (1, 0))
+
+
+class ViewCountBufferTests(TestCase):
+    """浏览量写缓冲"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        cls.contents = [
+            CreativeContent.objects.create(title=f'内容{i}', content='正文', author=author)
+            for i in range(2)
+        ]
+
+    def test_hits_are_flushed_in_one_update(self):
+        buffer = ViewCountBuffer(flush_interval=3600, flush_threshold=5)
+        first, second = self.contents
+        with self.assertNumQueries(0):
+            for content in (first, first, second, first):
+                buffer.hit(content.pk)
+        self.assertEqual(buffer.pending(first.pk), 3)
+
+        # 内容一条 UPDATE，作者统计读取作者后一条 UPDATE（另有事务的保存点）
+        with self.assertNumQueries(5):
+            self.assertEqual(buffer.hit(second.pk), 2)
+        self.assertEqual(buffer.pending(second.pk), 0)
+        self.assertEqual(
+            list(CreativeContent.objects.order_by('pk').values_list('views_count', flat=True)),
+            [3, 2]
+        )
+
+
+class AuthorStatsTests(TestCase):
+    """作者统计的增量维护与重建"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.readers = [User.objects.create_user(f'reader{i}') for i in range(3)]
+        cls.public = CreativeContent.objects.create(title='公开', content='正文', author=cls.author)
+        cls.private = CreativeContent.objects.create(title='私有', content='正文', author=cls.author, privacy='private')
+
+    def stats(self):
+        return AuthorStats.objects.values(*[field.attname for field in AuthorStats._meta.fields]).get(user=self.author)
+
+    def test_incremental_updates_match_rebuild(self):
+        for reader in self.readers:
+            Like.objects.create(user=reader, content=self.public)
+        Like.objects.create(user=self.readers[0], content=self.private)
+        Favorite.objects.create(user=self.readers[1], content=self.private)
+        Comment.objects.create(author=self.readers[2], content=self.public, text='好')
+        Rating.objects.create(user=self.readers[0], content=self.public, score=5)
+        Rating.objects.update_or_create(user=self.readers[1], content=self.private, defaults={'score': 2})
+        Rating.objects.update_or_create(user=self.readers[1], content=self.private, defaults={'score': 3})
+        buffer = ViewCountBuffer(flush_interval=3600, flush_threshold=1000)
+        for content in (self.public, self.public, self.private):
+            buffer.hit(content.pk)
+        buffer.flush()
+        Like.objects.filter(user=self.readers[2]).delete()
+
+        # 改为公开后，该内容的统计计入公开部分
+        private = CreativeContent.objects.get(pk=self.private.pk)
+        private.privacy = 'public'
+        private.save()
+
+        stats = self.stats()
+        self.assertEqual(
+            (stats['content_count'], stats['views_count'], stats['likes_count'], stats['favorites_count'],
+             stats['comments_count'], stats['rating_sum'], stats['rating_count']),
+            (2, 3, 3, 1, 1, 8, 2)
+        )
+        self.assertEqual(
+            (stats['public_content_count'], stats['public_views_count'],
+             stats['public_likes_count'], stats['public_favorites_count']),
+            (2, 3, 3, 1)
+        )
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(self.stats(), stats)
+
+    def test_privacy_change_and_delete(self):
+        Like.objects.create(user=self.readers[0], content=self.public)
+        Rating.objects.create(user=self.readers[0], content=self.public, score=4)
+        CreativeContent.objects.filter(pk=self.public.pk).update(views_count=10)
+        self.assertEqual(self.stats()['public_content_count'], 1)
+
+        content = CreativeContent.objects.get(pk=self.public.pk)
+        content.privacy = 'private'
+        content.save()
+        stats = self.stats()
+        self.assertEqual((stats['public_content_count'], stats['public_likes_count']), (0, 0))
+        self.assertEqual((stats['content_count'], stats['likes_count']), (2, 1))
+
+        content.delete()
+        stats = self.stats()
+        self.assertEqual(
+            (stats['content_count'], stats['views_count'], stats['likes_count'], stats['rating_count']),
+            (1, 0, 0, 0)
+        )
+
+    def test_profile_totals_depend_on_viewer(self):
+        Like.objects.create(user=self.readers[0], content=self.private)
+        for viewer, expected in ((self.readers[0], (1, 0)), (self.author, (2, 1))):
+            request = RequestFactory().get('/')
+            request.user = viewer
+            view = UserProfileView()
+            view.setup(request, username=self.author.username)
+            view.object = self.author
+            context = view.get_context_data()
+            self.assertEqual((context['total_contents'], context['total_likes']), expected)
+
+
+class HotScoreTests(TestCase):
+    """批量热度计算"""
+
+    def test_batch_scores_match_single_content_score(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        author = User.objects.create_user('author')
+        readers = [User.objects.create_user(f'reader{i}') for i in range(3)]
+        contents = [
+            CreativeContent.objects.create(title=f'内容{i}', content='正文', author=author)
+            for i in range(4)
+        ]
+        for i, content in enumerate(contents):
+            CreativeContent.objects.filter(pk=content.pk).update(
+                views_count=37 * i, created_at=timezone.now() - timedelta(days=5 * i, hours=3)
+            )
+        Like.objects.create(user=readers[0], content=contents[1])
+        Favorite.objects.create(user=readers[1], content=contents[2])
+        Comment.objects.create(author=readers[2], content=contents[3], text='好')
+        Rating.objects.create(user=readers[0], content=contents[3], score=4)
+        Rating.objects.create(user=readers[1], content=contents[3], score=5)
+        CreativeContent.objects.filter(pk=contents[0].pk).update(privacy='private', hot_score=9)
+
+        call_command('update_hot_scores', stdout=StringIO())
+        for content in CreativeContent.objects.all():
+            expected = calculate_content_score(content) if content.privacy == 'public' else 0
+            self.assertAlmostEqual(content.hot_score, expected)
+        self.assertGreater(CreativeContent.objects.get(pk=contents[3].pk).hot_score, 0)
+
+
+class CoverDerivativeTests(TestCase):
+    """封面衍生图"""
+
+    def setUp(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        import io
+
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name, COVER_DERIVATIVES_ASYNC=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 600), (200, 30, 30)).save(buffer, format='JPEG')
+        self.original_bytes = buffer.getvalue()
+        author = User.objects.create_user('author')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.content = CreativeContent.objects.create(
+                title='封面', content='正文', author=author,
+                cover_image=SimpleUploadedFile('cover.jpg', self.original_bytes, content_type='image/jpeg')
+            )
+        self.assertEqual(len(callbacks), 1)
+
+    def test_save_keeps_original_and_command_builds_widths(self):
+        from PIL import Image
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            content = CreativeContent.objects.get(pk=self.content.pk)
+            content.title = '新标题'
+            content.save()
+        self.assertEqual(callbacks, [])
+        with open(content.cover_image.path, 'rb') as f:
+            self.assertEqual(f.read(), self.original_bytes)
+
+        call_command('generate_cover_derivatives', stdout=StringIO())
+        content.refresh_from_db()
+        self.assertEqual(len(content.cover_hash), 64)
+        self.assertIn(content.cover_hash, content.cover_thumbnail.name)
+        with Image.open(content.cover_thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (400, 200))
+        with Image.open(content.cover_medium.path) as medium:
+            self.assertEqual(medium.size, (960, 480))
+
+        out = StringIO()
+        call_command('generate_cover_derivatives', stdout=out)
+        self.assertIn('生成 0 个', out.getvalue())
+
+    def test_replaced_and_deleted_covers_remove_unreferenced_derivatives(self):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        from .images import generate_cover_derivatives
+
+        # 第二个内容使用相同的封面，共享衍生图
+        other = CreativeContent.objects.create(
+            title='同图', content='正文', author=self.content.author,
+            cover_image=SimpleUploadedFile('same.jpg', self.original_bytes, content_type='image/jpeg')
+        )
+        generate_cover_derivatives(self.content)
+        generate_cover_derivatives(other)
+        old_names = [self.content.cover_thumbnail.name, self.content.cover_medium.name]
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 400), (30, 200, 30)).save(buffer, format='JPEG')
+        self.content.cover_image = SimpleUploadedFile('new.jpg', buffer.getvalue(), content_type='image/jpeg')
+        self.content.save()
+        generate_cover_derivatives(self.content)
+        self.assertTrue(all(default_storage.exists(name) for name in old_names))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+
+        self.content.cover_image = None
+        self.content.save()
+        new_names = [self.content.cover_thumbnail.name, self.content.cover_medium.name]
+        generate_cover_derivatives(self.content)
+        self.assertFalse(any(default_storage.exists(name) for name in new_names))
+
+        stray = default_storage.save('covers/derived/ab/stray_400.jpg', ContentFile(b'x'))
+        out = StringIO()
+        call_command('generate_cover_derivatives', prune=True, stdout=out)
+        self.assertFalse(default_storage.exists(stray))
+        self.assertIn('删除 1 个', out.getvalue())
+
+    def test_placeholders_rendered_inline_with_lazy_image(self):
+        import base64
+        from PIL import Image
+        from .models import UserProfile
+
+        call_command('generate_cover_derivatives', stdout=StringIO())
+        self.content.refresh_from_db()
+        prefix = 'data:image/png;base64,'
+        self.assertTrue(self.content.cover_placeholder.startswith(prefix))
+        self.assertLess(len(self.content.cover_placeholder), 300)
+        with Image.open(io.BytesIO(base64.b64decode(self.content.cover_placeholder[len(prefix):]))) as image:
+            self.assertEqual(image.size, (8, 4))
+            red, green, blue = image.getpixel((0, 0))
+            self.assertGreater(red, 180)
+            self.assertLess(green + blue, 100)
+
+        profile, _ = UserProfile.objects.get_or_create(user=self.content.author)
+        UserProfile.objects.filter(pk=profile.pk).update(avatar=self.content.cover_image.name)
+        out = StringIO()
+        call_command('generate_placeholders', stdout=out)
+        self.assertIn('更新 1 个', out.getvalue())
+        self.assertEqual(UserProfile.objects.get(pk=profile.pk).avatar_placeholder, self.content.cover_placeholder)
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            response = self.client.get(reverse('content:content_list'))
+        self.assertContains(response, f'url({self.content.cover_placeholder})', count=2)
+        self.assertContains(response, 'loading="lazy"', count=2)
+
+
+class ThumbnailEndpointTests(TestCase):
+    """按需头像缩略图与封面模板标签"""
+
+    def setUp(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        import io
+
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(
+            MEDIA_ROOT=self.media.name, THUMBNAIL_CACHE_DIR=f'{self.media.name}/thumbnails',
+            COVER_DERIVATIVES_ASYNC=False, ALLOWED_HOSTS=['testserver'],
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), (10, 120, 200)).save(buffer, format='PNG')
+        self.author = User.objects.create_user('author')
+        self.profile = UserProfile.objects.create(
+            user=self.author, avatar=SimpleUploadedFile('avatar.png', buffer.getvalue(), content_type='image/png')
+        )
+        self.content = CreativeContent.objects.create(
+            title='封面', content='正文', author=self.author,
+            cover_image=SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+        )
+
+    def test_webp_cached_with_etag(self):
+        from PIL import Image
+        from .thumbnails import source_version
+
+        url = reverse('content:thumbnail', kwargs={'kind': 'avatar', 'pk': self.author.pk, 'width': 160})
+        version = source_version(self.profile.avatar)
+        response = self.client.get(url, {'v': version})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (160, 80)))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url.replace('/160/', '/400/')).status_code, 404)
+        cover_url = reverse('content:thumbnail', kwargs={'kind': 'cover', 'pk': self.content.pk, 'width': 160})
+        self.assertEqual(self.client.get(cover_url).status_code, 404)
+
+        out = StringIO()
+        call_command('thumbnails', purge=True, stdout=out)
+        self.assertIn('已删除 1 个', out.getvalue())
+
+    def test_pruning_keeps_in_progress_files_and_failed_render_cleans_up(self):
+        from . import thumbnails
+
+        directory = os.path.join(self.media.name, 'thumbnails', 'avatar', str(self.author.pk))
+        os.makedirs(directory)
+        for name in ('64_old.webp', 'writing.tmp'):
+            open(os.path.join(directory, name), 'wb').close()
+        thumbnails.get_thumbnail('avatar', self.author.pk, self.profile.avatar, 160)
+        names = sorted(os.listdir(directory))
+        self.assertNotIn('64_old.webp', names)
+        self.assertIn('writing.tmp', names)
+
+        # 编码失败时不留下临时文件
+        with mock.patch('PIL.Image.Image.save', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                thumbnails.get_thumbnail('avatar', self.author.pk, self.profile.avatar, 64)
+        self.assertEqual(sorted(os.listdir(directory)), names)
+
+    def test_cover_tags_use_stored_derivatives(self):
+        from django.template import Context, Template
+        from .images import generate_cover_derivatives
+
+        template = Template('{% load thumbnails %}{% cover_thumbnail content %}|{% cover_srcset content %}')
+        src, srcset = template.render(Context({'content': self.content})).split('|')
+        self.assertEqual((src, srcset), (self.content.cover_image.url, ''))
+
+        generate_cover_derivatives(self.content)
+        src, srcset = template.render(Context({'content': self.content})).split('|')
+        self.assertEqual(src, self.content.cover_thumbnail.url)
+        self.assertEqual(srcset, f'{self.content.cover_thumbnail.url} 400w, {self.content.cover_medium.url} 960w')
+
+
+# 在子进程中测量有界解码和完整解码的峰值内存增量（VmHWM，单位 KB）
+MEMORY_PROBE = '''
+import sys
+import django
+django.setup()
+from django.core.files import File
+from PIL import Image
+from content.uploads import open_bounded_image
+
+def peak():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+
+base = peak()
+image = open_bounded_image(File(open(sys.argv[1], 'rb')), 400)
+bounded = peak() - base
+size = image.size
+del image
+base = peak()
+with Image.open(sys.argv[1]) as full:
+    full.load()
+print(bounded, peak() - base, *size)
+'''
+
+
+class BoundedImageUploadTests(TestCase):
+    """上传图片的限制与有界解码"""
+
+    def image_file(self, size, name='cover.png', format='PNG'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (90, 160, 40)).save(buffer, format=format)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+    def test_form_rejects_by_bytes_and_header_pixels(self):
+        from .forms import CreativeContentForm
+
+        data = {'title': '标题', 'content': '正文', 'privacy': 'public'}
+        with override_settings(IMAGE_UPLOAD_MAX_PIXELS=200 * 100):
+            form = CreativeContentForm(data, {'cover_image': self.image_file((300, 100))})
+            self.assertFalse(form.is_valid())
+            self.assertEqual(form.errors.as_data()['cover_image'][0].code, 'image_too_large')
+            form = CreativeContentForm(data, {'cover_image': self.image_file((200, 100))})
+            self.assertTrue(form.is_valid(), form.errors)
+        with override_settings(IMAGE_UPLOAD_MAX_BYTES=100):
+            form = CreativeContentForm(data, {'cover_image': self.image_file((200, 100))})
+            self.assertEqual(form.errors.as_data()['cover_image'][0].code, 'file_too_large')
+
+    @skipUnless(os.path.exists('/proc/self/status'), '需要 /proc 读取峰值内存')
+    def test_jpeg_decoded_with_bounded_memory(self):
+        from django.conf import settings
+
+        # 12 百万像素的 JPEG，完整解码约需 48 MB
+        upload = self.image_file((4000, 3000), 'large.jpg', 'JPEG')
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as f:
+            f.write(upload.read())
+            f.flush()
+            result = subprocess.run(
+                [sys.executable, '-c', MEMORY_PROBE, f.name],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'learning_platform.settings'},
+            )
+        bounded_kb, full_kb, width, height = map(int, result.stdout.split())
+        self.assertEqual((width, height), (500, 375))
+        self.assertLess(bounded_kb, 8 * 1024)
+        self.assertGreater(full_kb, 30 * 1024)
+
+
+class ActivityWriterTests(TransactionTestCase):
+    """用户活动异步批量写入"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader')
+        self.gone_user = User.objects.create_user('gone')
+        author = User.objects.create_user('author')
+        self.content = CreativeContent.objects.create(title='保留', content='正文', author=author)
+        self.deleted = CreativeContent.objects.create(title='删除', content='正文', author=author)
+
+    def test_request_path_only_enqueues_and_flush_writes_one_batch(self):
+        from .activity_log import activity_writer
+        from .models import UserActivity
+        from .utils import record_user_activity
+
+        with self.assertNumQueries(0):
+            record_user_activity(self.user, 'view', self.content, '浏览')
+            record_user_activity(self.user, 'delete', self.deleted, '删除')
+            record_user_activity(self.gone_user, 'view', self.content, '浏览')
+        self.deleted.delete()
+        self.gone_user.delete()
+
+        # 查询用户、查询内容、一条 INSERT（bulk_create 另有 BEGIN/COMMIT）
+        with self.assertNumQueries(5):
+            activity_writer.flush()
+        self.assertEqual(
+            sorted(UserActivity.objects.values_list('action', 'content_id')),
+            [('delete', None), ('view', self.content.pk)]
+        )
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        from .activity_log import ActivityWriter
+        from .models import UserActivity
+
+        writer = ActivityWriter(max_queue_size=2, batch_size=10, flush_interval=60)
+        results = [writer.put(UserActivity(user_id=self.user.pk, action='view', description=str(i))) for i in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(writer.dropped, 1)
+        self.assertEqual(writer.stop(), 2)
+        self.assertEqual(UserActivity.objects.count(), 2)
+
+    def test_failed_batches_are_retried_and_only_bad_rows_dropped(self):
+        from django.db import IntegrityError, OperationalError
+
+        from .activity_log import ActivityWriter
+        from .models import UserActivity
+
+        writer = ActivityWriter(batch_size=10, flush_interval=60)
+        bulk_create = UserActivity.objects.bulk_create
+        for i in range(3):
+            writer.put(UserActivity(user_id=self.user.pk, action='view', description=str(i)))
+
+        # 数据库一直不可用：重试一次后放回队列，不计入丢弃
+        with mock.patch.object(UserActivity.objects, 'bulk_create', side_effect=OperationalError('locked')):
+            self.assertEqual(writer.flush(), 0)
+        self.assertEqual((writer.pending(), writer.dropped), (3, 0))
+
+        # 只失败一次：重试成功
+        failures = iter([OperationalError('locked')])
+
+        def flaky(rows, **kwargs):
+            for error in failures:
+                raise error
+            return bulk_create(rows, **kwargs)
+
+        with mock.patch.object(UserActivity.objects, 'bulk_create', flaky):
+            self.assertEqual(writer.flush(), 3)
+        self.assertEqual(writer.dropped, 0)
+
+        # 其他错误逐条写入，只丢弃写不进去的那一条
+        def reject_bad(rows, **kwargs):
+            if any(row.description == 'bad' for row in rows):
+                raise IntegrityError('bad row')
+            return bulk_create(rows, **kwargs)
+
+        for description in ('ok', 'bad', 'ok'):
+            writer.put(UserActivity(user_id=self.user.pk, action='view', description=description))
+        with mock.patch.object(UserActivity.objects, 'bulk_create', reject_bad):
+            self.assertEqual(writer.stop(), 2)
+        self.assertEqual((writer.written, writer.dropped), (5, 1))
+        self.assertEqual(UserActivity.objects.count(), 5)
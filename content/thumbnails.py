@@ -0,0 +1,125 @@
+"""
+按需头像缩略图
+
+/content/thumbnail/avatar/<用户ID>/<width>/ 返回头像在指定宽度下的 WebP 缩略图。
+封面不走这里，使用 content/images.py 在后台生成的缩略图和中图。
+宽度只能取 THUMBNAIL_WIDTHS 中的值；首次请求时生成并写入 THUMBNAIL_CACHE_DIR，
+之后直接读取磁盘缓存。URL 中的 v 参数为源文件版本，源文件更换后 URL 随之变化，
+因此带版本的响应可以长期缓存。
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.urls import reverse
+from .models import UserProfile
+from .uploads import open_bounded_image, resize_to_width
+
+
+DEFAULT_WIDTHS = (64, 160)
+WEBP_QUALITY = 80
+
+KIND_AVATAR = 'avatar'
+
+
+def get_thumbnail_widths():
+    return tuple(getattr(settings, 'THUMBNAIL_WIDTHS', DEFAULT_WIDTHS))
+
+
+def get_cache_dir():
+    return str(getattr(settings, 'THUMBNAIL_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'thumbnails')))
+
+
+def source_version(field_file):
+    """源文件版本（由文件名计算，重新上传时 Django 会生成新文件名）"""
+    return hashlib.sha1(field_file.name.encode('utf-8')).hexdigest()[:12]
+
+
+def get_source(kind, pk):
+    """返回源文件，不存在时返回 None"""
+    if kind == KIND_AVATAR:
+        profile = UserProfile.objects.filter(user_id=pk).only('avatar', 'user_id').first()
+        if profile is not None and profile.avatar:
+            return profile.avatar
+    return None
+
+
+def get_cache_path(kind, pk, width, version):
+    return os.path.join(get_cache_dir(), kind, str(pk), f'{width}_{version}.webp')
+
+
+def render_thumbnail(field_file, width, path):
+    """生成 WebP 缩略图（不放大），先写临时文件再替换"""
+    image = resize_to_width(open_bounded_image(field_file, width), width)
+    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format='WEBP', quality=WEBP_QUALITY, method=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def remove_stale_versions(directory, version):
+    """源文件更换后，删除同一源的旧版本缓存（跳过其他宽度正在写入的临时文件）"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith(f'_{version}.webp') and not name.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def get_thumbnail(kind, pk, field_file, width):
+    """返回 (缓存文件路径, 版本)，缓存不存在时生成"""
+    version = source_version(field_file)
+    path = get_cache_path(kind, pk, width, version)
+    if not os.path.exists(path):
+        remove_stale_versions(os.path.dirname(path), version)
+        render_thumbnail(field_file, width, path)
+    return path, version
+
+
+def thumbnail_url(kind, pk, field_file, width):
+    """带版本参数的缩略图地址"""
+    url = reverse('content:thumbnail', kwargs={'kind': kind, 'pk': pk, 'width': width})
+    return f'{url}?v={source_version(field_file)}'
+
+
+def purge_thumbnails(kind=None):
+    """删除缩略图缓存，返回删除的文件数"""
+    root = get_cache_dir() if kind is None else os.path.join(get_cache_dir(), kind)
+    removed = sum(len(files) for _, _, files in os.walk(root))
+    shutil.rmtree(root, ignore_errors=True)
+    return removed
+
+
+def warm_thumbnails(widths=None):
+    """预先生成所有头像的缩略图，返回 (生成数, 失败数)"""
+    widths = widths or get_thumbnail_widths()
+    sources = [
+        (KIND_AVATAR, profile.user_id, profile.avatar)
+        for profile in UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True).only('avatar', 'user_id')
+    ]
+
+    generated = failed = 0
+    for kind, pk, field_file in sources:
+        for width in widths:
+            try:
+                get_thumbnail(kind, pk, field_file, width)
+                generated += 1
+            except Exception as e:
+                print(f"缩略图生成错误 {kind}/{pk}/{width}: {e}")
+                failed += 1
+    return generated, failed
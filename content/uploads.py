@@ -0,0 +1,107 @@
+"""
+上传图片的限制与有界解码
+
+上传时只读取文件头校验字节数和像素数，超过 IMAGE_UPLOAD_MAX_BYTES / IMAGE_UPLOAD_MAX_PIXELS
+或被 Pillow 判定为解压炸弹的图片直接拒绝，不解码位图。
+生成缩略图时用 open_bounded_image() 打开：JPEG 通过 Image.draft() 在解码阶段按 1/2、1/4、1/8 缩小，
+解码后的位图只比目标尺寸略大，每次处理的内存占用与原图像素数无关。
+"""
+import math
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from PIL import Image, ImageOps
+
+
+DEFAULT_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_UPLOAD_PIXELS = 40_000_000
+
+# EXIF 方向为 5~8 时图片需要旋转 90 度，显示宽度对应原始高度
+EXIF_ORIENTATION = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def get_max_upload_bytes():
+    return getattr(settings, 'IMAGE_UPLOAD_MAX_BYTES', DEFAULT_MAX_UPLOAD_BYTES)
+
+
+def get_max_upload_pixels():
+    return getattr(settings, 'IMAGE_UPLOAD_MAX_PIXELS', DEFAULT_MAX_UPLOAD_PIXELS)
+
+
+def check_image_size(width, height):
+    """像素数超过限制时抛出 ValidationError"""
+    max_pixels = get_max_upload_pixels()
+    if width * height > max_pixels:
+        raise ValidationError(
+            f'图片尺寸过大（{width}×{height}），像素数不能超过 {max_pixels // 1_000_000} 百万',
+            code='image_too_large',
+        )
+
+
+class BoundedImageField(forms.ImageField):
+    """先检查字节数，再由文件头检查像素数的图片字段（不解码位图）"""
+
+    def to_python(self, data):
+        if data is not None and getattr(data, 'size', None) is not None:
+            max_bytes = get_max_upload_bytes()
+            if data.size > max_bytes:
+                raise ValidationError(
+                    f'图片文件不能超过 {max_bytes // (1024 * 1024)} MB',
+                    code='file_too_large',
+                )
+        # Pillow 在 Image.open() 时检查 MAX_IMAGE_PIXELS，解压炸弹会被当作无效图片拒绝
+        f = super().to_python(data)
+        if f is not None and getattr(f, 'image', None) is not None:
+            check_image_size(*f.image.size)
+        return f
+
+
+def validate_image_upload(uploaded_file):
+    """校验未经表单的上传图片（如资料页的头像），不合法时抛出 ValidationError"""
+    return BoundedImageField(required=False).clean(uploaded_file)
+
+
+def draft_for_width(image, width):
+    """JPEG 在解码阶段缩小到不小于目标宽度的最小尺寸（其他格式不变）"""
+    if image.format != 'JPEG':
+        return
+    display_width = image.width
+    if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+        display_width = image.height
+    if display_width <= width:
+        return
+    scale = width / display_width
+    image.draft(image.mode, (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+
+
+def open_bounded_image(field_file, width):
+    """
+    打开图片并解码为不大于所需尺寸的位图（已按 EXIF 方向旋转）
+
+    解码前检查文件头中的像素数，超过 IMAGE_UPLOAD_MAX_PIXELS 时抛出 ValidationError，
+    调用方负责再缩放到精确宽度。
+    """
+    field_file.open('rb')
+    try:
+        try:
+            original = Image.open(field_file)
+        except Image.DecompressionBombError as e:
+            raise ValidationError(f'图片尺寸过大: {e}', code='image_too_large')
+        with original:
+            check_image_size(*original.size)
+            draft_for_width(original, width)
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    finally:
+        field_file.close()
+    return image
+
+
+def resize_to_width(image, width):
+    """按宽度等比缩放（不放大）"""
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    return image
@@ -31,4 +31,7 @@ urlpatterns = [
     
     # AI功能
     path('<int:content_id>/ai-comment/', views.generate_ai_content_comment, name='ai_comment'),
+    
+    # 缩略图（封面和头像）
+    path('thumbnail/<str:kind>/<int:pk>/<int:width>/', views.thumbnail, name='thumbnail'),
 ]
\ No newline at end of file
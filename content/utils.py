@@ -1,13 +1,19 @@
-from django.db.models import Count, Q, Avg
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q
+from django.db.models.functions import NullIf
 from django.contrib.auth.models import User
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-from collections import defaultdict
 import requests
 import json
 
-from .models import CreativeContent, Tag, Like, Favorite, Rating, UserActivity
+from .models import CreativeContent, Tag, Like, Favorite, Rating
+from .activity_log import record_user_activity
+from .collaborative import get_collaborative_engine
+from .vectorizer import get_content_text
+from .preferences import get_top_tag_ids
+from .als import get_als_model
 
 
 def get_client_ip(request):
@@ -20,81 +26,46 @@ def get_client_ip(request):
     return ip
 
 
-def record_user_activity(user, action, content=None, description=""):
-    """记录用户活动"""
-    if user.is_authenticated:
-        UserActivity.objects.create(
-            user=user,
-            action=action,
-            content=content,
-            description=description
-        )
-
-
 def get_user_preferences(user):
-    """获取用户偏好标签"""
-    # 基于用户点赞、收藏、评分的内容获取偏好标签
-    liked_contents = CreativeContent.objects.filter(
-        likes__user=user
-    ).prefetch_related('tags')
-    
-    favorited_contents = CreativeContent.objects.filter(
-        favorites__user=user
-    ).prefetch_related('tags')
-    
-    rated_contents = CreativeContent.objects.filter(
-        ratings__user=user,
-        ratings__score__gte=4  # 高分评价
-    ).prefetch_related('tags')
-    
-    # 统计标签权重
-    tag_weights = defaultdict(float)
-    
-    # 点赞权重 1
-    for content in liked_contents:
-        for tag in content.tags.all():
-            tag_weights[tag.id] += 1.0
-    
-    # 收藏权重 2
-    for content in favorited_contents:
-        for tag in content.tags.all():
-            tag_weights[tag.id] += 2.0
-    
-    # 高分评价权重 1.5
-    for content in rated_contents:
-        for tag in content.tags.all():
-            tag_weights[tag.id] += 1.5
-    
-    # 返回权重最高的标签
-    sorted_tags = sorted(tag_weights.items(), key=lambda x: x[1], reverse=True)
-    return [tag_id for tag_id, weight in sorted_tags[:10]]
+    """获取用户偏好标签（读取预先维护的标签权重表）"""
+    # 点赞权重 1、收藏权重 2、高分评价权重 1.5，由信号处理器增量累加
+    return get_top_tag_ids(user, limit=10)
 
 
-def get_content_similarity_matrix():
-    """计算内容相似度矩阵（基于TF-IDF）"""
-    contents = CreativeContent.objects.filter(privacy='public')
-    
-    if not contents.exists():
-        return {}, []
+def get_content_tfidf_matrix():
+    """计算所有公开内容的TF-IDF矩阵，返回 (tfidf_matrix, content_ids)"""
+    contents = CreativeContent.objects.filter(privacy='public').prefetch_related('tags')
     
     # 准备文本数据
     texts = []
     content_ids = []
     
     for content in contents:
-        # 组合标题、内容和标签
-        text = f"{content.title} {content.content} {' '.join([tag.name for tag in content.tags.all()])}"
-        texts.append(text)
+        texts.append(get_content_text(content))
         content_ids.append(content.id)
     
-    # 计算TF-IDF
+    if not texts:
+        return None, []
+    
+    vectorizer = TfidfVectorizer(
+        max_features=1000,
+        stop_words=None,  # 中文需要自定义停用词
+        ngram_range=(1, 2)
+    )
+    return vectorizer.fit_transform(texts), content_ids
+
+
+def get_content_similarity_matrix():
+    """
+    计算内容相似度矩阵（基于TF-IDF）
+    
+    结果为 n² 的字典，只适合离线对比和小数据量使用；
+    详情页的相关内容请使用 neighbors.get_related_content_ids。
+    """
     try:
-        vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words=None,  # 中文需要自定义停用词
-            ngram_range=(1, 2)
-        )
-        tfidf_matrix = vectorizer.fit_transform(texts)
+        tfidf_matrix, content_ids = get_content_tfidf_matrix()
+        if tfidf_matrix is None:
+            return {}, []
         
         # 计算余弦相似度
         similarity_matrix = cosine_similarity(tfidf_matrix)
@@ -113,57 +84,34 @@ def get_content_similarity_matrix():
         return {}, []
 
 
-def get_collaborative_filtering_recommendations(user, limit=10):
-    """协同过滤推荐"""
-    # 获取用户的评分数据
-    user_ratings = Rating.objects.filter(user=user).values_list('content_id', 'score')
-    user_rated_contents = dict(user_ratings)
-    
-    if not user_rated_contents:
+def get_collaborative_filtering_recommendations(user, limit=10, engine=None):
+    """协同过滤推荐（默认使用进程内共享的稀疏评分矩阵引擎）"""
+    if engine is None:
+        if not Rating.objects.filter(user=user).exists():
+            return []
+        engine = get_collaborative_engine()
+    
+    recommendations = engine.recommend(user.id, limit)
+    if not recommendations:
         return []
     
-    # 找到相似用户
-    similar_users = []
-    all_users = User.objects.exclude(id=user.id)
-    
-    for other_user in all_users:
-        other_ratings = Rating.objects.filter(user=other_user).values_list('content_id', 'score')
-        other_rated_contents = dict(other_ratings)
-        
-        # 计算用户相似度（基于共同评分的内容）
-        common_contents = set(user_rated_contents.keys()) & set(other_rated_contents.keys())
-        
-        if len(common_contents) >= 2:  # 至少有2个共同评分
-            similarity = calculate_user_similarity(
-                user_rated_contents, 
-                other_rated_contents, 
-                common_contents
-            )
-            if similarity > 0.3:  # 相似度阈值
-                similar_users.append((other_user, similarity))
-    
-    # 根据相似用户推荐内容
-    recommendations = []
-    similar_users.sort(key=lambda x: x[1], reverse=True)  # 按相似度排序
-    
-    for similar_user, similarity in similar_users[:5]:  # 取前5个相似用户
-        # 获取相似用户高分评价的内容
-        high_rated_contents = CreativeContent.objects.filter(
-            ratings__user=similar_user,
-            ratings__score__gte=4,
-            privacy='public'
-        ).exclude(
-            id__in=user_rated_contents.keys()
-        ).distinct()
-        
-        for content in high_rated_contents:
-            if content not in [rec[0] for rec in recommendations]:
-                score = similarity * content.ratings.filter(user=similar_user).first().score
-                recommendations.append((content, score))
-    
-    # 按推荐分数排序
-    recommendations.sort(key=lambda x: x[1], reverse=True)
-    return [content for content, score in recommendations[:limit]]
+    # 按推荐分数顺序返回内容对象（引擎加载后转为私密的内容在这里去掉）
+    content_ids = [content_id for content_id, score in recommendations]
+    contents = CreativeContent.objects.filter(privacy='public').in_bulk(content_ids)
+    return [contents[content_id] for content_id in content_ids if content_id in contents]
+
+
+def get_als_recommendations(user, limit=10, model=None):
+    """矩阵分解推荐（读取 train_als 生成的模型），模型不存在或用户未收录时返回空列表"""
+    model = model or get_als_model()
+    if model is None:
+        return []
+
+    # 多取一些，去掉已转为私密的内容和用户自己的作品后仍能凑够数量
+    recommendations = model.recommend(user.id, limit * 2 + 10)
+    content_ids = [content_id for content_id, score in recommendations]
+    contents = CreativeContent.objects.filter(privacy='public').exclude(author=user).in_bulk(content_ids)
+    return [contents[content_id] for content_id in content_ids if content_id in contents][:limit]
 
 
 def calculate_user_similarity(user1_ratings, user2_ratings, common_contents):
@@ -196,6 +144,14 @@ def calculate_user_similarity(user1_ratings, user2_ratings, common_contents):
     return numerator / denominator
 
 
+def average_rating_expression():
+    """由评分汇总字段计算平均分的表达式（无评分时为 NULL），无需关联评分表"""
+    return ExpressionWrapper(
+        F('rating_sum') * 1.0 / NullIf(F('rating_count'), 0),
+        output_field=FloatField()
+    )
+
+
 def get_content_based_recommendations(user, limit=10):
     """基于内容的推荐"""
     # 获取用户偏好标签
@@ -231,7 +187,7 @@ def get_content_based_recommendations(user, limit=10):
         id__in=interacted_content_ids
     ).annotate(
         tag_match_count=Count('tags', filter=Q(tags__id__in=preferred_tag_ids)),
-        avg_rating=Avg('ratings__score'),
+        avg_rating=average_rating_expression(),
         popularity_score=Count('likes') + Count('favorites') * 2
     ).order_by(
         '-tag_match_count',
@@ -243,21 +199,41 @@ def get_content_based_recommendations(user, limit=10):
     return list(recommended_contents)
 
 
-def get_recommendations_for_user(user, limit=10):
-    """为用户获取推荐内容（混合推荐）"""
+# 推荐理由
+REASON_COLLABORATIVE = '与你兴趣相似的用户给了高分'
+REASON_CONTENT_BASED = '包含你喜欢的标签'
+REASON_POPULAR = '热门内容'
+REASON_ALS = '根据你的点赞、收藏和评分'
+
+# 推荐策略
+STRATEGY_HYBRID = 'hybrid'  # 协同过滤 + 标签 + 热门
+STRATEGY_ALS = 'als'        # 矩阵分解，不足时用标签和热门补充
+
+
+def get_hybrid_recommendations(user, limit=10, cf_engine=None, strategy=None):
+    """混合推荐，返回 [(content, reason), ...]，按推荐顺序排列"""
+    strategy = strategy or getattr(settings, 'RECOMMENDATION_STRATEGY', STRATEGY_HYBRID)
     recommendations = []
     
-    # 1. 协同过滤推荐（权重40%）
-    try:
-        cf_recommendations = get_collaborative_filtering_recommendations(user, limit//2)
-        recommendations.extend(cf_recommendations)
-    except Exception as e:
-        print(f"协同过滤推荐错误: {e}")
+    if strategy == STRATEGY_ALS:
+        # 1. 矩阵分解推荐
+        try:
+            als_recommendations = get_als_recommendations(user, limit)
+            recommendations.extend((content, REASON_ALS) for content in als_recommendations)
+        except Exception as e:
+            print(f"矩阵分解推荐错误: {e}")
+    else:
+        # 1. 协同过滤推荐（权重40%）
+        try:
+            cf_recommendations = get_collaborative_filtering_recommendations(user, limit//2, engine=cf_engine)
+            recommendations.extend((content, REASON_COLLABORATIVE) for content in cf_recommendations)
+        except Exception as e:
+            print(f"协同过滤推荐错误: {e}")
     
     # 2. 基于内容的推荐（权重60%）
     try:
         cb_recommendations = get_content_based_recommendations(user, limit)
-        recommendations.extend(cb_recommendations)
+        recommendations.extend((content, REASON_CONTENT_BASED) for content in cb_recommendations)
     except Exception as e:
         print(f"基于内容推荐错误: {e}")
     
@@ -273,7 +249,7 @@ def get_recommendations_for_user(user, limit=10):
             interacted_ids.update(Rating.objects.filter(user=user).values_list('content_id', flat=True))
         
         # 排除已推荐的内容
-        recommended_ids = [content.id for content in recommendations]
+        recommended_ids = [content.id for content, reason in recommendations]
         interacted_ids.update(recommended_ids)
         
         popular_contents = CreativeContent.objects.filter(
@@ -286,21 +262,32 @@ def get_recommendations_for_user(user, limit=10):
             popularity_score=Count('likes') + Count('favorites') * 2 + Count('ratings')
         ).order_by('-popularity_score', '-created_at')[:limit - len(recommendations)]
         
-        recommendations.extend(popular_contents)
+        recommendations.extend((content, REASON_POPULAR) for content in popular_contents)
     
     # 去重并限制数量
     seen_ids = set()
     unique_recommendations = []
-    for content in recommendations:
+    for content, reason in recommendations:
         if content.id not in seen_ids:
             seen_ids.add(content.id)
-            unique_recommendations.append(content)
+            unique_recommendations.append((content, reason))
             if len(unique_recommendations) >= limit:
                 break
     
     return unique_recommendations
 
 
+def get_recommendations_for_user(user, limit=10, strategy=None):
+    """
+    为用户获取推荐内容（在线请求使用，各阶段受时限约束，见 budget.py）
+    
+    strategy 为 'hybrid' 或 'als'，默认取 RECOMMENDATION_STRATEGY 设置。
+    """
+    from .budget import get_budgeted_recommendations
+    recommendations, report = get_budgeted_recommendations(user, limit, strategy=strategy)
+    return [content for content, reason in recommendations]
+
+
 def generate_ai_summary(title, content):
     """使用DeepSeek AI生成内容摘要"""
     try:
@@ -539,37 +526,70 @@ def get_trending_tags(days=7, limit=10):
     return trending_tags
 
 
+# 内容综合评分的权重
+SCORE_WEIGHTS = {
+    'likes': 1,        # 点赞数权重
+    'favorites': 2,    # 收藏数权重
+    'comments': 0.5,   # 评论数权重
+    'views': 0.1,      # 浏览数权重
+    'rating': 2,       # 平均评分权重
+}
+SCORE_DECAY_PER_DAY = 0.05  # 每天衰减5%
+SCORE_MIN_TIME_FACTOR = 0.1
+
+
+def compute_content_scores(likes, favorites, comments, views, rating_sum, rating_count, days_old):
+    """按列计算综合评分，参数为等长的 NumPy 数组（也可以是标量）"""
+    rating_count = np.asarray(rating_count, dtype=np.float64)
+    avg_rating = np.divide(
+        rating_sum, rating_count,
+        out=np.zeros_like(rating_count), where=rating_count > 0
+    )
+    raw_score = (
+        np.multiply(likes, SCORE_WEIGHTS['likes'])
+        + np.multiply(favorites, SCORE_WEIGHTS['favorites'])
+        + np.multiply(comments, SCORE_WEIGHTS['comments'])
+        + np.multiply(views, SCORE_WEIGHTS['views'])
+        + avg_rating * SCORE_WEIGHTS['rating']
+    )
+    # 时间衰减（新内容有加分）
+    time_factor = np.maximum(SCORE_MIN_TIME_FACTOR, 1 - np.multiply(days_old, SCORE_DECAY_PER_DAY))
+    return np.round(raw_score * time_factor, 2)
+
+
 def calculate_content_score(content):
     """计算内容综合评分"""
-    # 基础分数
-    base_score = 0
-    
-    # 点赞数权重
-    likes_score = content.likes_count * 1
-    
-    # 收藏数权重
-    favorites_score = content.favorites_count * 2
-    
-    # 评论数权重
-    comments_score = content.comments_count * 0.5
-    
-    # 浏览数权重
-    views_score = content.views_count * 0.1
-    
-    # 评分权重
-    rating_score = 0
-    if content.ratings.exists():
-        avg_rating = content.ratings.aggregate(avg=Avg('score'))['avg'] or 0
-        rating_score = avg_rating * 2
-    
-    # 时间衰减（新内容有加分）
     from django.utils import timezone
     days_old = (timezone.now() - content.created_at).days
-    time_factor = max(0.1, 1 - (days_old * 0.05))  # 每天衰减5%
+    return float(compute_content_scores(
+        content.likes_count, content.favorites_count, content.comments_count,
+        content.views_count, content.rating_sum, content.rating_count, days_old
+    ))
+
+
+def update_hot_scores(batch_size=500):
+    """批量计算所有公开内容的综合评分并写入 hot_score，返回更新的内容数"""
+    from django.utils import timezone
+    
+    fields = ['id', 'likes_count', 'favorites_count', 'comments_count', 'views_count',
+              'rating_sum', 'rating_count', 'created_at']
+    rows = list(CreativeContent.objects.filter(privacy='public').values_list(*fields))
     
-    total_score = (
-        base_score + likes_score + favorites_score + 
-        comments_score + views_score + rating_score
-    ) * time_factor
+    # 私有内容不参与热门排序
+    CreativeContent.objects.exclude(privacy='public').exclude(hot_score=0).update(hot_score=0)
+    if not rows:
+        return 0
     
-    return round(total_score, 2)
\ No newline at end of file
+    columns = list(zip(*rows))
+    counters = [np.asarray(column, dtype=np.float64) for column in columns[1:7]]
+    now = timezone.now().timestamp()
+    created = np.fromiter((dt.timestamp() for dt in columns[7]), dtype=np.float64, count=len(rows))
+    days_old = np.floor((now - created) / 86400)
+    
+    scores = compute_content_scores(*counters, days_old)
+    CreativeContent.objects.bulk_update(
+        [CreativeContent(id=content_id, hot_score=float(score)) for content_id, score in zip(columns[0], scores)],
+        ['hot_score'],
+        batch_size=batch_size
+    )
+    return len(rows)
@@ -0,0 +1,183 @@
+"""
+增量内容向量化
+
+使用无状态的 HashingVectorizer 计算每个内容的词频向量，
+内容创建/更新时只需对这一条内容做一次向量化，代价与语料规模无关。
+IDF 权重由定期批处理任务（refresh_content_vectors 命令）统一刷新并保存到磁盘。
+"""
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from .models import ContentVector, CreativeContent
+
+
+N_FEATURES = 2 ** 18
+IDF_FILENAME = 'content_idf.npy'
+
+# 与 TfidfVectorizer 使用相同的分词方式，只是用哈希代替词表
+_vectorizer = HashingVectorizer(
+    n_features=N_FEATURES,
+    ngram_range=(1, 2),
+    alternate_sign=False,
+    norm=None,
+)
+
+
+def get_content_text(content):
+    """组合标题、内容和标签，作为文本特征的输入"""
+    return f"{content.title} {content.content} {' '.join([tag.name for tag in content.tags.all()])}"
+
+
+def vectorize_texts(texts):
+    """把文本转换为哈希词频矩阵"""
+    return _vectorizer.transform(texts)
+
+
+def embed_content(content):
+    """计算并保存单个内容的词频向量"""
+    row = vectorize_texts([get_content_text(content)])
+    vector, created = ContentVector.objects.update_or_create(
+        content=content,
+        defaults={
+            'indices': row.indices.astype(np.int32).tobytes(),
+            'values': row.data.astype(np.float32).tobytes(),
+        }
+    )
+    return vector
+
+
+def embed_contents(contents, batch_size=500):
+    """批量计算词频向量，返回处理的内容数量"""
+    total = 0
+    contents = list(contents)
+    for start in range(0, len(contents), batch_size):
+        batch = contents[start:start + batch_size]
+        matrix = vectorize_texts([get_content_text(content) for content in batch])
+        vectors = []
+        for i, content in enumerate(batch):
+            row = matrix.getrow(i)
+            vectors.append(ContentVector(
+                content=content,
+                indices=row.indices.astype(np.int32).tobytes(),
+                values=row.data.astype(np.float32).tobytes(),
+            ))
+        ContentVector.objects.bulk_create(
+            vectors,
+            update_conflicts=True,
+            unique_fields=['content'],
+            update_fields=['indices', 'values', 'updated_at'],
+        )
+        total += len(batch)
+    if total:
+        # bulk_create 不触发信号，直接通知 ANN 索引重新加载增量部分
+        from .ann import bump_ann_delta_stamp
+        bump_ann_delta_stamp()
+    return total
+
+
+def load_term_frequencies(content_ids=None, public_only=True):
+    """
+    从数据库读取词频矩阵
+
+    返回 (tf_matrix[csr], content_ids)，按内容ID升序排列。
+    """
+    vectors = ContentVector.objects.order_by('content_id')
+    if public_only:
+        vectors = vectors.filter(content__privacy='public')
+    if content_ids is not None:
+        vectors = vectors.filter(content_id__in=content_ids)
+
+    ids, indptr, indices, values = [], [0], [], []
+    for content_id, raw_indices, raw_values in vectors.values_list('content_id', 'indices', 'values'):
+        row_indices = np.frombuffer(raw_indices, dtype=np.int32)
+        indices.append(row_indices)
+        values.append(np.frombuffer(raw_values, dtype=np.float32))
+        indptr.append(indptr[-1] + len(row_indices))
+        ids.append(content_id)
+
+    matrix = sparse.csr_matrix(
+        (
+            np.concatenate(values) if values else np.zeros(0, dtype=np.float32),
+            np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+            np.asarray(indptr),
+        ),
+        shape=(len(ids), N_FEATURES),
+    )
+    return matrix, ids
+
+
+def get_idf_path():
+    return os.path.join(settings.RECOMMENDER_DATA_DIR, IDF_FILENAME)
+
+
+def compute_idf(tf_matrix):
+    """与 TfidfVectorizer(smooth_idf=True) 相同的 IDF 公式"""
+    n_documents = tf_matrix.shape[0]
+    document_frequency = np.bincount(tf_matrix.indices, minlength=N_FEATURES)
+    return (np.log((1 + n_documents) / (1 + document_frequency)) + 1).astype(np.float32)
+
+
+def save_idf(idf):
+    path = get_idf_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, idf)
+    os.replace(tmp_path, path)
+
+
+_idf_lock = threading.Lock()
+_idf_cache = {'mtime': None, 'idf': None}
+
+
+def load_idf():
+    """读取最近一次批处理得到的 IDF，尚未生成时返回 None"""
+    path = get_idf_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _idf_lock:
+        if _idf_cache['mtime'] != mtime:
+            _idf_cache['idf'] = np.load(path, mmap_mode='r')
+            _idf_cache['mtime'] = mtime
+        return _idf_cache['idf']
+
+
+def apply_idf(tf_matrix, idf=None):
+    """词频矩阵乘以 IDF 并按行 L2 归一化；没有 IDF 时只做归一化"""
+    if idf is None:
+        idf = load_idf()
+    matrix = tf_matrix.astype(np.float32)
+    if matrix.shape[0] == 0:
+        return matrix.tocsr()
+    if idf is not None:
+        matrix = matrix @ sparse.diags(np.asarray(idf, dtype=np.float32))
+    return normalize(matrix.tocsr(), norm='l2', copy=False)
+
+
+def get_content_vectors(content_ids=None):
+    """获取公开内容的 TF-IDF 向量，返回 (matrix, content_ids)"""
+    tf_matrix, ids = load_term_frequencies(content_ids)
+    return apply_idf(tf_matrix), ids
+
+
+def refresh_idf():
+    """根据所有公开内容的词频重新计算 IDF（定期批处理）"""
+    tf_matrix, ids = load_term_frequencies()
+    idf = compute_idf(tf_matrix)
+    save_idf(idf)
+    return len(ids)
+
+
+def embed_missing_contents():
+    """为还没有向量的内容补算向量"""
+    missing = CreativeContent.objects.filter(vector__isnull=True).prefetch_related('tags')
+    return embed_contents(missing)
@@ -0,0 +1,82 @@
+"""
+浏览量写缓冲
+
+详情页的浏览先累加在进程内存中，每隔 VIEW_COUNT_FLUSH_INTERVAL 秒或累计
+VIEW_COUNT_FLUSH_THRESHOLD 次浏览后，用一条 UPDATE ... CASE 语句批量写回数据库（作者统计同样一条）；
+进程退出时写回剩余部分。缓冲按进程独立，页面显示 数据库值 + 本进程未写回的浏览数。
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from .author_stats import add_author_views
+from .models import CreativeContent
+
+
+class ViewCountBuffer:
+    """按内容累计浏览次数，定时或定量批量写回"""
+
+    def __init__(self, flush_interval=10, flush_threshold=100):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = Counter()
+        self._pending_total = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def hit(self, content_id):
+        """记录一次浏览，返回该内容尚未写回数据库的浏览数（含本次）"""
+        with self._lock:
+            self._pending[content_id] += 1
+            self._pending_total += 1
+            count = self._pending[content_id]
+            due = (self._pending_total >= self.flush_threshold
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+        return count
+
+    def pending(self, content_id):
+        """该内容尚未写回数据库的浏览数"""
+        with self._lock:
+            return self._pending.get(content_id, 0)
+
+    def flush(self):
+        """把缓冲的浏览数写回数据库，返回更新的内容数"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            with transaction.atomic():
+                updated = CreativeContent.objects.filter(pk__in=list(pending)).update(
+                    views_count=F('views_count') + Case(
+                        *[When(pk=content_id, then=Value(count)) for content_id, count in pending.items()],
+                        default=Value(0),
+                        output_field=PositiveIntegerField(),
+                    )
+                )
+                add_author_views(pending)
+            return updated
+        except Exception as e:
+            print(f"浏览量写回错误: {e}")
+            # 写回失败时放回缓冲，下次再试
+            with self._lock:
+                self._pending.update(pending)
+                self._pending_total += sum(pending.values())
+            return 0
+
+
+view_counter = ViewCountBuffer(
+    flush_interval=getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10),
+    flush_threshold=getattr(settings, 'VIEW_COUNT_FLUSH_THRESHOLD', 100),
+)
+atexit.register(view_counter.flush)
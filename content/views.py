@@ -2,12 +2,13 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_http_methods
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q, Count, Avg, Prefetch
+from django.db.models import F, Q, Count, Prefetch
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
@@ -23,8 +24,16 @@ from .forms import (
 )
 from .utils import (
     record_user_activity, get_recommendations_for_user,
-    generate_ai_summary, generate_ai_comment, calculate_content_score
+    generate_ai_summary, generate_ai_comment, calculate_content_score,
+    average_rating_expression
 )
+from .neighbors import get_related_content_ids
+from core.utils import get_recommendations
+from .vectorizer import embed_content
+from .ann import query_similar_content_ids
+from .view_counter import view_counter
+from .author_stats import get_author_stats
+from . import thumbnails
 
 
 class ContentListView(ListView):
@@ -67,14 +76,14 @@ class ContentListView(ListView):
         sort_by = self.request.GET.get('sort', '-created_at')  # 修复参数名
         if sort_by == 'views_count':
             queryset = queryset.order_by('-views_count')
-        elif sort_by == 'likes_count':
+        elif sort_by in ('likes_count', '-likes_count'):
+            queryset = queryset.order_by('-likes_count', '-created_at')
+        elif sort_by in ('favorites_count', '-favorites_count'):
+            queryset = queryset.order_by('-favorites_count', '-created_at')
+        elif sort_by in ('rating', '-rating'):
             queryset = queryset.annotate(
-                likes_count=Count('likes')
-            ).order_by('-likes_count')
-        elif sort_by == 'favorites_count':
-            queryset = queryset.annotate(
-                favorites_count=Count('favorites')
-            ).order_by('-favorites_count')
+                average_rating=average_rating_expression()
+            ).order_by(F('average_rating').desc(nulls_last=True), '-rating_count', '-created_at')
         else:
             queryset = queryset.order_by('-created_at')
         
@@ -107,11 +116,9 @@ class ContentListView(ListView):
             
             for content in contents:
                 content.is_liked_by_user = content.id in user_likes
-                content.comments_count = content.comments.count()
         else:
             for content in context['contents']:
                 content.is_liked_by_user = False
-                content.comments_count = content.comments.count()
         
         return context
 
@@ -135,9 +142,8 @@ class ContentDetailView(DetailView):
             if not self.request.user.is_superuser:
                 raise Http404("内容不存在")
         
-        # 增加浏览量
-        obj.views_count += 1
-        obj.save(update_fields=['views_count'])
+        # 增加浏览量（先写入缓冲，批量写回数据库），显示时加上未写回的部分
+        obj.views_count += view_counter.hit(obj.pk)
         
         # 记录用户活动
         if self.request.user.is_authenticated:
@@ -177,20 +183,29 @@ class ContentDetailView(DetailView):
             content.is_liked_by_user = False
         
         # 统计信息
-        context['likes_count'] = content.likes.count()
-        context['favorites_count'] = content.favorites.count()
-        context['comments_count'] = content.comments.count()
-        
-        # 平均评分
-        avg_rating = content.ratings.aggregate(avg=Avg('score'))['avg']
-        context['avg_rating'] = round(avg_rating, 1) if avg_rating else 0
-        context['ratings_count'] = content.ratings.count()
-        
-        # 相关内容推荐
-        related_contents = CreativeContent.objects.filter(
-            tags__in=content.tags.all(),
-            privacy='public'
-        ).exclude(id=content.id).distinct()[:4]
+        context['likes_count'] = content.likes_count
+        context['favorites_count'] = content.favorites_count
+        context['comments_count'] = content.comments_count
+        
+        # 平均评分（读取内容行上的评分汇总）
+        context['avg_rating'] = round(content.get_average_rating(), 1)
+        context['ratings_count'] = content.rating_count
+        
+        # 相关内容推荐（优先使用离线近邻索引，新内容尚未收录时用 ANN 检索）
+        related_ids = get_related_content_ids(content.id, limit=4)
+        if not related_ids:
+            related_ids = query_similar_content_ids(content.id, limit=4)
+        if related_ids:
+            related_map = CreativeContent.objects.filter(
+                id__in=related_ids,
+                privacy='public'
+            ).select_related('author').in_bulk()
+            related_contents = [related_map[cid] for cid in related_ids if cid in related_map]
+        else:
+            related_contents = CreativeContent.objects.filter(
+                tags__in=content.tags.all(),
+                privacy='public'
+            ).exclude(id=content.id).distinct()[:4]
         context['related_contents'] = related_contents
         
         # 二创内容
@@ -232,6 +247,9 @@ class ContentCreateView(LoginRequiredMixin, CreateView):
             f"创建了内容：{self.object.title}"
         )
         
+        # 增量计算文本向量（只处理当前内容），ANN 检索直接读取新向量
+        embed_content(self.object)
+        
         messages.success(self.request, '创意内容发布成功！')
         return response
     
@@ -260,6 +278,9 @@ class ContentUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
             f"更新了内容：{self.object.title}"
         )
         
+        # 增量计算文本向量（只处理当前内容），ANN 检索直接读取新向量
+        embed_content(self.object)
+        
         messages.success(self.request, '内容更新成功！')
         return response
     
@@ -314,7 +335,8 @@ class UserProfileView(DetailView):
         context['user_profile'] = user_profile
         
         # 用户内容
-        if self.request.user == profile_user or self.request.user.is_superuser:
+        public_only = not (self.request.user == profile_user or self.request.user.is_superuser)
+        if not public_only:
             # 自己或管理员可以看到所有内容
             user_contents = CreativeContent.objects.filter(
                 author=profile_user
@@ -332,11 +354,8 @@ class UserProfileView(DetailView):
         page_obj = paginator.get_page(page_number)
         context['page_obj'] = page_obj
         
-        # 统计信息
-        context['total_contents'] = user_contents.count()
-        context['total_views'] = sum(content.views_count for content in user_contents)
-        context['total_likes'] = sum(content.likes_count for content in user_contents)
-        context['total_favorites'] = sum(content.favorites_count for content in user_contents)
+        # 统计信息（读取作者统计）
+        context.update(get_author_stats(profile_user).get_totals(public_only=public_only))
         
         # 最近活动
         context['recent_activities'] = UserActivity.objects.filter(
@@ -439,13 +458,13 @@ def add_rating(request, content_id):
         f"给内容评分：{score}星"
     )
     
-    # 计算新的平均评分
-    avg_rating = content.ratings.aggregate(avg=Avg('score'))['avg']
+    # 评分汇总由信号处理器原子更新，这里只读回这两个字段
+    content.refresh_from_db(fields=['rating_sum', 'rating_count'])
     
     return JsonResponse({
         'success': True,
-        'avg_rating': round(avg_rating, 1) if avg_rating else 0,
-        'ratings_count': content.ratings.count(),
+        'avg_rating': round(content.get_average_rating(), 1),
+        'ratings_count': content.rating_count,
         'user_rating': score
     })
 
@@ -484,10 +503,12 @@ def toggle_like(request, content_id):
         f"{'点赞' if liked else '取消点赞'}了内容：{content.title}"
     )
     
+    # 计数由信号处理器原子更新，这里只读回该字段
+    content.refresh_from_db(fields=['likes_count'])
     return JsonResponse({
         'success': True,
         'liked': liked,
-        'likes_count': content.likes.count()
+        'likes_count': content.likes_count
     })
 
 
@@ -518,10 +539,11 @@ def toggle_favorite(request, content_id):
         f"{'收藏' if favorited else '取消收藏'}了内容：{content.title}"
     )
     
+    content.refresh_from_db(fields=['favorites_count'])
     return JsonResponse({
         'success': True,
         'favorited': favorited,
-        'favorites_count': content.favorites.count()
+        'favorites_count': content.favorites_count
     })
 
 
@@ -572,6 +594,9 @@ class DerivativeCreateView(LoginRequiredMixin, CreateView):
             f"基于'{original_content.title}'创建了二创内容"
         )
         
+        # 增量计算文本向量（只处理当前内容），ANN 检索直接读取新向量
+        embed_content(self.object)
+        
         messages.success(self.request, '二创内容发布成功！')
         return response
     
@@ -621,7 +646,7 @@ def my_favorites(request):
 def recommendations(request):
     """推荐内容"""
     try:
-        recommended_contents = get_recommendations_for_user(request.user, limit=20)
+        recommended_contents = get_recommendations(request.user, limit=20)
     except Exception as e:
         print(f"获取推荐内容失败: {e}")
         recommended_contents = []
@@ -672,3 +697,38 @@ def generate_ai_content_comment(request, content_id):
             'success': False,
             'error': f'AI点评生成失败: {str(e)}'
         })
+
+
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600  # 带版本参数的缩略图缓存一年
+THUMBNAIL_UNVERSIONED_MAX_AGE = 3600
+
+
+@require_http_methods(["GET", "HEAD"])
+def thumbnail(request, kind, pk, width):
+    """按固定宽度返回头像的 WebP 缩略图（磁盘缓存 + ETag）"""
+    if width not in thumbnails.get_thumbnail_widths():
+        raise Http404("不支持的尺寸")
+    field_file = thumbnails.get_source(kind, pk)
+    if field_file is None:
+        raise Http404("图片不存在")
+
+    version = thumbnails.source_version(field_file)
+    etag = f'"{kind}-{pk}-{width}-{version}"'
+    if request.GET.get('v') == version:
+        cache_control = f'max-age={THUMBNAIL_MAX_AGE}, immutable'
+    else:
+        cache_control = f'max-age={THUMBNAIL_UNVERSIONED_MAX_AGE}'
+    cache_control = f'public, {cache_control}'
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            path, version = thumbnails.get_thumbnail(kind, pk, field_file, width)
+        except (OSError, ValueError, ValidationError) as e:
+            print(f"缩略图生成错误: {e}")
+            raise Http404("图片无法处理")
+        response = FileResponse(open(path, 'rb'), content_type='image/webp')
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
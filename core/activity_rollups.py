@@ -0,0 +1,174 @@
+"""
+用户活动的每日汇总与保留策略
+
+rollup_activity() 把 UserActivity 按天汇总到 ActivityRollup（每天每种操作）、
+ContentActivityRollup（每天每个内容每种操作）和 UserActivityRollup（每天每个活跃用户），
+处理进度（高水位）记录在 SiteSettings 中，每次只重算高水位所在的日期及之后的数据。
+prune_activity() 删除（可先归档）超过保留天数且已汇总的原始记录。
+
+仪表板读取汇总表，再加上高水位之后尚未汇总的少量记录。
+"""
+import gzip
+import json
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from content.models import UserActivity
+
+from .models import ActivityRollup, ContentActivityRollup, SiteSettings, UserActivityRollup
+
+
+HIGH_WATER_MARK_KEY = 'activity_rollup_high_water_mark'
+# 活动由后台线程批量写入，写入时间可能略晚于记录时间；重算时从高水位往前多取这段时间
+LATE_ARRIVAL_WINDOW = timedelta(minutes=10)
+
+
+def get_high_water_mark(key=HIGH_WATER_MARK_KEY):
+    """已汇总到的时间点，从未汇总时返回 None"""
+    value = SiteSettings.objects.filter(key=key).values_list('value', flat=True).first()
+    return datetime.fromisoformat(value) if value else None
+
+
+def set_high_water_mark(moment, key=HIGH_WATER_MARK_KEY, description='用户活动每日汇总的处理进度'):
+    SiteSettings.objects.update_or_create(
+        key=key,
+        defaults={'value': moment.isoformat(), 'description': description}
+    )
+
+
+def start_of_day(date):
+    """当前时区中该日期零点的时间"""
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def rollup_activity(until=None):
+    """
+    增量汇总用户活动，返回重算的天数
+
+    从高水位所在的日期开始整天重算（按用户去重的人数无法增量累加），
+    每张汇总表一条分组查询，与重算的天数无关。
+    """
+    until = until or timezone.now()
+    high_water_mark = get_high_water_mark()
+    if high_water_mark is None:
+        first = UserActivity.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if first is None:
+            set_high_water_mark(until)
+            return 0
+        start_date = timezone.localdate(first)
+    else:
+        start_date = timezone.localdate(high_water_mark - LATE_ARRIVAL_WINDOW)
+
+    activities = UserActivity.objects.filter(
+        created_at__gte=start_of_day(start_date), created_at__lt=until
+    ).annotate(day=TruncDate('created_at')).order_by()
+
+    with transaction.atomic():
+        for model in (ActivityRollup, ContentActivityRollup, UserActivityRollup):
+            model.objects.filter(date__gte=start_date).delete()
+
+        ActivityRollup.objects.bulk_create([
+            ActivityRollup(date=row['day'], action=row['action'],
+                           user_count=row['user_count'], event_count=row['event_count'])
+            for row in activities.values('day', 'action').annotate(
+                user_count=Count('user', distinct=True), event_count=Count('id')
+            )
+        ], batch_size=1000)
+        ContentActivityRollup.objects.bulk_create([
+            ContentActivityRollup(date=row['day'], content_id=row['content'],
+                                  action=row['action'], event_count=row['event_count'])
+            for row in activities.filter(content__isnull=False).values('day', 'content', 'action').annotate(
+                event_count=Count('id')
+            )
+        ], batch_size=1000)
+        UserActivityRollup.objects.bulk_create([
+            UserActivityRollup(date=row['day'], user_id=row['user'], event_count=row['event_count'])
+            for row in activities.values('day', 'user').annotate(event_count=Count('id'))
+        ], batch_size=1000)
+
+        set_high_water_mark(until)
+    return (timezone.localdate(until) - start_date).days + 1
+
+
+def prune_activity(retention_days, archive_path=None, batch_size=5000):
+    """
+    删除超过保留天数且已汇总的原始活动记录，返回删除条数
+
+    archive_path 不为空时，先把要删除的记录以 JSON Lines 追加写入该 gzip 文件。
+    """
+    high_water_mark = get_high_water_mark()
+    if high_water_mark is None or retention_days <= 0:
+        return 0
+    # 只删除已经完整汇总的日期
+    cutoff = min(
+        start_of_day(timezone.localdate() - timedelta(days=retention_days)),
+        start_of_day(timezone.localdate(high_water_mark - LATE_ARRIVAL_WINDOW)),
+    )
+
+    archive = gzip.open(archive_path, 'at', encoding='utf-8') if archive_path else None
+    deleted = 0
+    try:
+        while True:
+            rows = list(UserActivity.objects.filter(created_at__lt=cutoff).order_by('id').values(
+                'id', 'user_id', 'action', 'content_id', 'description', 'ip_address', 'created_at'
+            )[:batch_size])
+            if not rows:
+                return deleted
+            if archive is not None:
+                for row in rows:
+                    archive.write(json.dumps({**row, 'created_at': row['created_at'].isoformat()}, ensure_ascii=False))
+                    archive.write('\n')
+                archive.flush()
+            UserActivity.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            deleted += len(rows)
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def _unrolled_activities():
+    """高水位之后尚未汇总的活动"""
+    high_water_mark = get_high_water_mark()
+    if high_water_mark is None:
+        return UserActivity.objects.order_by()
+    return UserActivity.objects.filter(created_at__gte=high_water_mark).order_by()
+
+
+def get_activity_stats():
+    """各类操作的累计次数 [{'action', 'count'}, ...]，按次数降序"""
+    counts = Counter({
+        row['action']: row['count']
+        for row in ActivityRollup.objects.values('action').annotate(count=Sum('event_count'))
+    })
+    counts.update({
+        row['action']: row['count']
+        for row in _unrolled_activities().values('action').annotate(count=Count('id'))
+    })
+    return [{'action': action, 'count': count} for action, count in counts.most_common()]
+
+
+def count_active_users(date=None):
+    """某天（默认今天）有活动的用户数"""
+    date = date or timezone.localdate()
+    user_ids = set(UserActivityRollup.objects.filter(date=date).values_list('user_id', flat=True))
+    unrolled = _unrolled_activities().filter(
+        created_at__gte=start_of_day(date), created_at__lt=start_of_day(date + timedelta(days=1))
+    )
+    user_ids.update(unrolled.values_list('user_id', flat=True).distinct())
+    return len(user_ids)
+
+
+def user_activity_count():
+    """按用户累计活动次数的子查询表达式（每日汇总加上高水位之后的原始记录），用于 User 的 annotate"""
+    rolled = UserActivityRollup.objects.filter(
+        user=OuterRef('pk')
+    ).order_by().values('user').annotate(total=Sum('event_count')).values('total')
+    unrolled = _unrolled_activities().filter(
+        user=OuterRef('pk')
+    ).values('user').annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(rolled), 0) + Coalesce(Subquery(unrolled), 0)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SiteVisit, SiteSettings, Recommendation
+from .models import MediaFile, SiteVisit, SiteSettings, Recommendation, VisitorSketch
 
 
 @admin.register(SiteVisit)
@@ -30,3 +30,18 @@ class RecommendationAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return False  # 不允许手动添加推荐记录
+
+
+@admin.register(MediaFile)
+class MediaFileAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'created_at']
+    search_fields = ['name', 'sha256']
+    readonly_fields = ['name', 'sha256', 'size', 'ref_count', 'created_at']
+
+
+@admin.register(VisitorSketch)
+class VisitorSketchAdmin(admin.ModelAdmin):
+    list_display = ['key', 'estimate', 'updated_at']
+    search_fields = ['key']
+    readonly_fields = ['key', 'estimate', 'version', 'updated_at']
+    exclude = ['registers']
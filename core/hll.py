@@ -0,0 +1,76 @@
+"""
+HyperLogLog 基数估计
+
+用 2^p 个 6 位以内的寄存器（这里每个占 1 字节）估计不同元素的个数，
+p=14 时占 16 KB，标准误差约 1.04 / sqrt(2^14) ≈ 0.8%。
+两个草图按寄存器取最大值即可合并，因此各进程可以分别计数后合并。
+"""
+import hashlib
+import math
+
+import numpy as np
+
+
+DEFAULT_PRECISION = 14
+HASH_BITS = 64
+
+
+def hash64(value):
+    """64 位哈希（blake2b），value 为 str 或 bytes"""
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """HyperLogLog 草图"""
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            self.registers = np.zeros(self.size, dtype=np.uint8)
+        else:
+            self.registers = np.frombuffer(bytes(registers), dtype=np.uint8).copy()
+            if len(self.registers) != self.size:
+                raise ValueError(f'寄存器数量 {len(self.registers)} 与精度 {precision} 不符')
+
+    def add(self, value):
+        """加入一个元素，返回寄存器是否变化"""
+        h = hash64(value)
+        index = h >> (HASH_BITS - self.precision)
+        rest = h & ((1 << (HASH_BITS - self.precision)) - 1)
+        # 剩余位中第一个 1 的位置（从 1 开始）
+        rank = HASH_BITS - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """合并另一个草图（逐个寄存器取最大值）"""
+        if other.precision != self.precision:
+            raise ValueError('只能合并精度相同的草图')
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """估计不同元素的个数"""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # 小基数时改用线性计数
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def is_empty(self):
+        return not self.registers.any()
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, precision=DEFAULT_PRECISION):
+        return cls(precision, registers=data)
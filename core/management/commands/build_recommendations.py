@@ -0,0 +1,109 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from content.collaborative import CollaborativeFilteringEngine
+from content.utils import get_hybrid_recommendations
+from core.utils import save_user_recommendations
+
+
+# 工作进程内共享的只读模型（由 _init_worker 设置）
+_worker_engine = None
+
+
+def _init_worker(engine):
+    """工作进程初始化：准备 Django 环境，使用自己的数据库连接"""
+    global _worker_engine
+    if not django.apps.apps.ready:
+        django.setup()
+    # fork 出来的进程会继承父进程的连接对象，必须丢弃后重新连接
+    connections.close_all()
+    _worker_engine = engine
+
+
+def _recommend_chunk(user_ids, limit, strategy=None):
+    """在工作进程中计算一批用户的推荐，返回 {user_id: [(content_id, reason), ...]}"""
+    results = {}
+    for user in User.objects.filter(id__in=user_ids):
+        results[user.id] = [
+            (content.id, reason)
+            for content, reason in get_hybrid_recommendations(user, limit, _worker_engine, strategy)
+        ]
+    return results
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = '为所有活跃用户批量计算混合推荐，并写入 Recommendation 表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='每个用户保存的推荐数量')
+        parser.add_argument('--chunk-size', type=int, default=200, help='每批计算和写入的用户数')
+        parser.add_argument('--workers', type=int, default=1, help='并行进程数（1 表示在当前进程中计算）')
+        parser.add_argument('--user', action='append', dest='usernames', help='只计算指定用户（可重复）')
+        parser.add_argument('--strategy', choices=['hybrid', 'als'], help='推荐策略（默认取 RECOMMENDATION_STRATEGY 设置）')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        users = User.objects.filter(is_active=True).order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('id', flat=True))
+
+        # 协同过滤的评分矩阵只加载一次，所有用户（和所有工作进程）共用
+        engine = CollaborativeFilteringEngine.from_database()
+        chunks = list(_chunks(user_ids, options['chunk_size']))
+
+        if options['workers'] > 1:
+            results = self._run_parallel(chunks, engine, options)
+        else:
+            _init_worker(engine)
+            results = (_recommend_chunk(chunk, options['limit'], options['strategy']) for chunk in chunks)
+
+        total_users = 0
+        total_rows = 0
+        for batch in results:
+            total_rows += save_user_recommendations(batch)
+            total_users += len(batch)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'进度 {total_users}/{len(user_ids)}，{total_users / elapsed:.1f} 用户/秒'
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'已为 {total_users} 个用户写入 {total_rows} 条推荐，'
+            f'耗时 {elapsed:.2f} 秒，吞吐量 {total_users / elapsed if elapsed else 0:.1f} 用户/秒'
+            f'（{options["workers"]} 个进程）'
+        ))
+
+    def _run_parallel(self, chunks, engine, options):
+        """把用户分块交给进程池计算，结果回到主进程统一批量写入"""
+        methods = multiprocessing.get_all_start_methods()
+        # fork 时工作进程直接继承只读模型，无需序列化
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+        # 派生子进程前关闭当前连接，避免子进程复用父进程的连接
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(engine,),
+        ) as executor:
+            futures = [
+                executor.submit(_recommend_chunk, chunk, options['limit'], options['strategy'])
+                for chunk in chunks
+            ]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.storage import migrate_legacy_media, sync_ref_counts
+
+
+class Command(BaseCommand):
+    help = '把已有的封面和头像迁移到按 SHA-256 命名的分片目录，并重建引用计数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只统计需要迁移的文件，不移动')
+
+    def handle(self, *args, **options):
+        moved, missing = migrate_legacy_media(dry_run=options['dry_run'])
+        verb = '需要迁移' if options['dry_run'] else '已迁移'
+        for field, count in moved.items():
+            self.stdout.write(f'{field}: {verb} {count} 个文件')
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{missing} 个文件不存在，已跳过'))
+        if options['dry_run']:
+            return
+
+        updated, orphans = sync_ref_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'共迁移 {sum(moved.values())} 个文件，更新 {updated} 条引用计数，清理 {orphans} 个无引用文件'
+        ))
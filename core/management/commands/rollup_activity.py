@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.activity_rollups import prune_activity, rollup_activity
+
+
+class Command(BaseCommand):
+    help = '增量汇总用户活动到每日汇总表，并按保留天数清理已汇总的原始记录（定期批处理任务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int,
+                            default=getattr(settings, 'ACTIVITY_RETENTION_DAYS', 90),
+                            help='原始记录保留天数（0 表示不清理）')
+        parser.add_argument('--archive', help='清理前把记录追加写入的 gzip 文件（JSON Lines）')
+
+    def handle(self, *args, **options):
+        days = rollup_activity()
+        self.stdout.write(f'重算 {days} 天的活动汇总')
+        deleted = prune_activity(options['retention_days'], archive_path=options['archive'])
+        self.stdout.write(self.style.SUCCESS(f'汇总完成，清理 {deleted} 条过期活动记录'))
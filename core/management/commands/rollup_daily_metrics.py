@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.metrics import METRICS, rollup_daily_metrics
+
+
+class Command(BaseCommand):
+    help = '增量汇总每日指标（内容发布数）到 DailyMetric（定期批处理任务）'
+
+    def handle(self, *args, **options):
+        days = rollup_daily_metrics()
+        self.stdout.write(self.style.SUCCESS(f'重算 {days} 天的每日指标：{", ".join(METRICS)}'))
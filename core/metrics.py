@@ -0,0 +1,104 @@
+"""
+每日指标
+
+DailyMetric 按 (日期, 指标, 维度) 保存每天的数值，由 rollup_daily_metrics() 增量维护：
+从高水位的前一天开始整天重算，每个指标一条分组查询。
+get_metric_series() 返回补零后的连续时间序列，已汇总的日期读 DailyMetric，
+高水位之后的日期直接由原始数据计算，查询次数与天数无关。
+
+指标：
+- contents_created：当天发布的内容数，维度为空（全站）或 user:<用户ID>（作者）
+
+独立访客数本身就按天保存在 VisitorSketch 中，直接用 get_visitor_counts() 读取，不再复制到这里。
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from content.models import CreativeContent
+
+from .activity_rollups import get_high_water_mark, set_high_water_mark, start_of_day
+from .models import DailyMetric
+
+
+HIGH_WATER_MARK_KEY = 'daily_metrics_high_water_mark'
+
+METRIC_CONTENTS_CREATED = 'contents_created'
+
+
+def user_dimension(user):
+    return f'user:{user.pk}'
+
+
+def _contents_created(start, end, dimension=None):
+    """[start, end] 内每天发布的内容数，返回 {(日期, 维度): 数值}"""
+    contents = CreativeContent.objects.filter(
+        created_at__gte=start_of_day(start), created_at__lt=start_of_day(end + timedelta(days=1))
+    )
+    if dimension and dimension.startswith('user:'):
+        contents = contents.filter(author_id=int(dimension.split(':', 1)[1]))
+    values = Counter()
+    for row in contents.annotate(day=TruncDate('created_at')).values('day', 'author_id').annotate(
+        count=Count('id')
+    ).order_by():
+        values[(row['day'], f"user:{row['author_id']}")] += row['count']
+        values[(row['day'], '')] += row['count']
+    return values
+
+
+# 指标名 -> 计算函数 (start, end, dimension) -> {(日期, 维度): 数值}
+METRICS = {
+    METRIC_CONTENTS_CREATED: _contents_created,
+}
+
+
+def rollup_daily_metrics(today=None):
+    """增量汇总每日指标，返回重算的天数"""
+    today = today or timezone.localdate()
+    high_water_mark = get_high_water_mark(HIGH_WATER_MARK_KEY)
+    if high_water_mark is None:
+        first = CreativeContent.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        start = timezone.localdate(first) if first else today
+    else:
+        start = timezone.localdate(high_water_mark)
+
+    with transaction.atomic():
+        DailyMetric.objects.filter(metric__in=list(METRICS), date__gte=start).delete()
+        rows = []
+        for metric, compute in METRICS.items():
+            rows.extend(
+                DailyMetric(date=date, metric=metric, dimension=dimension, value=value)
+                for (date, dimension), value in compute(start, today).items()
+            )
+        DailyMetric.objects.bulk_create(rows, batch_size=1000)
+        # 今天的数据还会变化，下次从今天开始重算
+        set_high_water_mark(start_of_day(today), HIGH_WATER_MARK_KEY, '每日指标汇总的处理进度')
+    return (today - start).days + 1
+
+
+def get_metric_series(metric, dimension='', days=30, end=None):
+    """
+    最近 days 天（截至 end，默认今天）的指标值，返回 [(日期, 数值), ...]，缺失的日期补零
+
+    已汇总的日期一条分组查询读取 DailyMetric，尚未汇总的日期由原始数据计算。
+    """
+    end = end or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    high_water_mark = get_high_water_mark(HIGH_WATER_MARK_KEY)
+    rolled_until = timezone.localdate(high_water_mark) if high_water_mark else start
+
+    values = defaultdict(int)
+    if rolled_until > start:
+        values.update(DailyMetric.objects.filter(
+            metric=metric, dimension=dimension, date__gte=start, date__lt=min(rolled_until, end + timedelta(days=1))
+        ).values_list('date', 'value'))
+    live_start = max(start, rolled_until)
+    if live_start <= end:
+        for (date, row_dimension), value in METRICS[metric](live_start, end, dimension).items():
+            if row_dimension == dimension:
+                values[date] = value
+    return [(start + timedelta(days=i), values[start + timedelta(days=i)]) for i in range(days)]
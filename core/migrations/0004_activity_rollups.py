@@ -0,0 +1,63 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0012_activity_rollups'),
+        ('core', '0003_mediafile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('action', models.CharField(max_length=20, verbose_name='操作')),
+                ('user_count', models.PositiveIntegerField(default=0, verbose_name='用户数')),
+                ('event_count', models.PositiveIntegerField(default=0, verbose_name='次数')),
+            ],
+            options={
+                'verbose_name': '每日活动汇总',
+                'verbose_name_plural': '每日活动汇总',
+                'unique_together': {('date', 'action')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ContentActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('action', models.CharField(max_length=20, verbose_name='操作')),
+                ('event_count', models.PositiveIntegerField(default=0, verbose_name='次数')),
+                ('content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='content.creativecontent', verbose_name='内容')),
+            ],
+            options={
+                'verbose_name': '每日内容活动汇总',
+                'verbose_name_plural': '每日内容活动汇总',
+                'indexes': [models.Index(fields=['content', 'date'], name='core_contentroll_content_idx')],
+                'unique_together': {('date', 'content', 'action')},
+            },
+        ),
+        migrations.CreateModel(
+            name='UserActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('event_count', models.PositiveIntegerField(default=0, verbose_name='次数')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '每日用户活动汇总',
+                'verbose_name_plural': '每日用户活动汇总',
+                'indexes': [models.Index(fields=['user', 'date'], name='core_userroll_user_idx')],
+                'unique_together': {('date', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:55
+
+from django.db import migrations, models
+from django.utils import timezone
+
+from core.hll import HyperLogLog
+
+
+def backfill_visitor_sketches(apps, schema_editor):
+    """把已有的 SiteVisit 访客加入全部和按天的草图（访客标识与 visitors.visitor_id 一致）"""
+    SiteVisit = apps.get_model('core', 'SiteVisit')
+    VisitorSketch = apps.get_model('core', 'VisitorSketch')
+
+    sketches = {}
+    rows = SiteVisit.objects.values_list('user_id', 'session_key', 'visited_at').iterator()
+    for user_id, session_key, visited_at in rows:
+        visitor = f'user:{user_id}' if user_id else f'session:{session_key}'
+        for key in ('all', f'day:{timezone.localdate(visited_at).isoformat()}'):
+            sketches.setdefault(key, HyperLogLog()).add(visitor)
+    VisitorSketch.objects.bulk_create(
+        [
+            VisitorSketch(key=key, registers=sketch.to_bytes(), estimate=sketch.count())
+            for key, sketch in sketches.items()
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32, unique=True, verbose_name='键')),
+                ('registers', models.BinaryField(verbose_name='寄存器')),
+                ('estimate', models.PositiveBigIntegerField(default=0, verbose_name='估计访客数')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='版本')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '访客草图',
+                'verbose_name_plural': '访客草图',
+            },
+        ),
+        migrations.RunPython(backfill_visitor_sketches, migrations.RunPython.noop),
+    ]
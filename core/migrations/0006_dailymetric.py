@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_visitorsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('metric', models.CharField(max_length=50, verbose_name='指标')),
+                ('dimension', models.CharField(blank=True, default='', max_length=50, verbose_name='维度')),
+                ('value', models.BigIntegerField(default=0, verbose_name='数值')),
+            ],
+            options={
+                'verbose_name': '每日指标',
+                'verbose_name_plural': '每日指标',
+                'indexes': [models.Index(fields=['metric', 'dimension', 'date'], name='core_dailymetric_series_idx')],
+                'unique_together': {('date', 'metric', 'dimension')},
+            },
+        ),
+    ]
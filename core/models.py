@@ -55,6 +55,107 @@ class Recommendation(models.Model):
         verbose_name_plural = "推荐记录"
         ordering = ['-created_at']
         unique_together = ['user', 'content']
+        indexes = [
+            models.Index(fields=['user', '-score'], name='core_rec_user_score_idx'),
+        ]
     
     def __str__(self):
         return f"推荐给 {self.user.username}: {self.content.title}"
+
+
+class MediaFile(models.Model):
+    """内容寻址存储中的媒体文件及其引用次数"""
+    name = models.CharField(max_length=255, unique=True, verbose_name="文件名")
+    sha256 = models.CharField(max_length=64, verbose_name="SHA-256")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="字节数")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="引用次数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    
+    class Meta:
+        verbose_name = "媒体文件"
+        verbose_name_plural = "媒体文件"
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class ActivityRollup(models.Model):
+    """按天、按操作汇总的用户活动（由 rollup_activity 命令增量维护）"""
+    date = models.DateField(verbose_name="日期")
+    action = models.CharField(max_length=20, verbose_name="操作")
+    user_count = models.PositiveIntegerField(default=0, verbose_name="用户数")
+    event_count = models.PositiveIntegerField(default=0, verbose_name="次数")
+    
+    class Meta:
+        verbose_name = "每日活动汇总"
+        verbose_name_plural = "每日活动汇总"
+        unique_together = ['date', 'action']
+    
+    def __str__(self):
+        return f"{self.date} {self.action}: {self.event_count}"
+
+
+class ContentActivityRollup(models.Model):
+    """按天汇总的单个内容的各类活动次数"""
+    date = models.DateField(verbose_name="日期")
+    content = models.ForeignKey('content.CreativeContent', on_delete=models.CASCADE, related_name='+', verbose_name="内容")
+    action = models.CharField(max_length=20, verbose_name="操作")
+    event_count = models.PositiveIntegerField(default=0, verbose_name="次数")
+    
+    class Meta:
+        verbose_name = "每日内容活动汇总"
+        verbose_name_plural = "每日内容活动汇总"
+        unique_together = ['date', 'content', 'action']
+        indexes = [
+            models.Index(fields=['content', 'date'], name='core_contentroll_content_idx'),
+        ]
+
+
+class UserActivityRollup(models.Model):
+    """按天汇总的单个用户的活动次数（每天每个活跃用户一行）"""
+    date = models.DateField(verbose_name="日期")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', verbose_name="用户")
+    event_count = models.PositiveIntegerField(default=0, verbose_name="次数")
+    
+    class Meta:
+        verbose_name = "每日用户活动汇总"
+        verbose_name_plural = "每日用户活动汇总"
+        unique_together = ['date', 'user']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='core_userroll_user_idx'),
+        ]
+
+
+class VisitorSketch(models.Model):
+    """独立访客的 HyperLogLog 草图（key 为 all 或 day:YYYY-MM-DD），各进程定期合并写入"""
+    key = models.CharField(max_length=32, unique=True, verbose_name="键")
+    registers = models.BinaryField(verbose_name="寄存器")
+    estimate = models.PositiveBigIntegerField(default=0, verbose_name="估计访客数")
+    version = models.PositiveIntegerField(default=0, verbose_name="版本")  # 乐观锁，合并时比较
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    
+    class Meta:
+        verbose_name = "访客草图"
+        verbose_name_plural = "访客草图"
+    
+    def __str__(self):
+        return f"{self.key}: {self.estimate}"
+
+
+class DailyMetric(models.Model):
+    """按天汇总的站点指标（由 rollup_daily_metrics 命令增量维护），dimension 为空表示全站"""
+    date = models.DateField(verbose_name="日期")
+    metric = models.CharField(max_length=50, verbose_name="指标")
+    dimension = models.CharField(max_length=50, blank=True, default='', verbose_name="维度")
+    value = models.BigIntegerField(default=0, verbose_name="数值")
+    
+    class Meta:
+        verbose_name = "每日指标"
+        verbose_name_plural = "每日指标"
+        unique_together = ['date', 'metric', 'dimension']
+        indexes = [
+            models.Index(fields=['metric', 'dimension', 'date'], name='core_dailymetric_series_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.metric}[{self.dimension}]: {self.value}"
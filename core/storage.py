@@ -0,0 +1,209 @@
+"""
+内容寻址的媒体存储
+
+上传的封面和头像以内容的 SHA-256 命名，存放在两级分片目录中：
+covers/ab/cd/abcd….jpg。相同内容只保存一份，MediaFile 记录每个文件被引用的次数，
+delete() 只减少引用计数，计数归零时才删除文件。
+save() 先增加引用计数再检查文件，purge() 在事务中只删除计数仍为 0 的记录，
+删除了记录才删除文件，因此并发上传同一内容时不会留下指向已删除文件的引用。
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+
+HASHED_NAME_RE = re.compile(r'^(?P<prefix>.+/)?[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(\.[a-z0-9]+)?$')
+
+
+def content_sha256(content, chunk_size=64 * 1024):
+    """分块计算文件内容的 SHA-256，返回 (摘要, 字节数)"""
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(chunk_size):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def hashed_name(name, digest):
+    """原文件名 covers/photo.JPG -> covers/ab/cd/<digest>.jpg"""
+    directory = os.path.dirname(name)
+    ext = os.path.splitext(name)[1].lower()
+    sharded = f'{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+    return f'{directory}/{sharded}' if directory else sharded
+
+
+def is_hashed_name(name):
+    return bool(name) and HASHED_NAME_RE.match(name) is not None
+
+
+def acquire(name, digest, size):
+    """引用计数加一（记录不存在时创建）"""
+    from .models import MediaFile
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, sha256=digest, size=size, ref_count=0)],
+        ignore_conflicts=True
+    )
+    MediaFile.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+
+def release(name):
+    """引用计数减一，返回剩余的引用数（没有记录的文件返回 None）"""
+    from .models import MediaFile
+    MediaFile.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    return MediaFile.objects.filter(name=name).values_list('ref_count', flat=True).first()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """按内容哈希命名、去重并计数引用的文件系统存储"""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest, size = content_sha256(content)
+        name = hashed_name(name, digest)
+        # 先占用引用，之后 purge() 不会再删除这个文件
+        acquire(name, digest, size)
+        if not self.exists(name):
+            self._write(name, content)
+        return name
+
+    def _write(self, name, content):
+        """先写临时文件再原子替换，并发上传同一内容时结果相同"""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                content.seek(0)
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, name):
+        """释放一个引用，没有引用时删除文件"""
+        if not name:
+            return
+        if not release(name):
+            self.purge(name)
+
+    def purge(self, name):
+        """删除没有引用的文件，返回是否删除；未记录引用的旧文件名直接删除"""
+        from .models import MediaFile
+        with transaction.atomic():
+            deleted, _ = MediaFile.objects.filter(name=name, ref_count=0).delete()
+            if not deleted and (is_hashed_name(name) or MediaFile.objects.filter(name=name).exists()):
+                return False
+            # 在事务内删除文件：并发的 acquire() 要等事务结束，之后的 save() 会重新写入文件
+            super().delete(name)
+        return True
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """封面和头像字段使用的存储（可调用对象，迁移文件中不会写入存储配置）"""
+    return media_storage
+
+
+def get_media_fields():
+    """使用内容寻址存储的 (模型, 字段)"""
+    from content.models import CreativeContent, UserProfile
+    return [(CreativeContent, 'cover_image'), (UserProfile, 'avatar')]
+
+
+def _referenced_files(model, field):
+    """返回 [(主键, 文件名), ...]，跳过空值"""
+    return model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list('pk', field)
+
+
+def migrate_legacy_media(dry_run=False):
+    """
+    把旧的平铺文件（covers/photo.jpg）迁移到哈希分片目录，返回 ({字段: 迁移数}, 缺失文件数)
+
+    内容相同的旧文件合并为一份；数据库直接 UPDATE，不触发信号。
+    """
+    storage = get_media_storage()
+    moved = {}
+    missing = 0
+    legacy_names = set()
+    for model, field in get_media_fields():
+        moved[field] = 0
+        for pk, name in _referenced_files(model, field).iterator():
+            if is_hashed_name(name):
+                continue
+            if not storage.exists(name):
+                print(f"媒体文件不存在: {name}")
+                missing += 1
+                continue
+            moved[field] += 1
+            if dry_run:
+                continue
+            with storage.open(name, 'rb') as f:
+                new_name = storage.save(name, File(f, name))
+            model.objects.filter(pk=pk).update(**{field: new_name})
+            legacy_names.add(name)
+
+    # 所有引用都改写后再删除旧文件（同一旧文件可能被多行引用）
+    for name in legacy_names:
+        storage.purge(name)
+    return moved, missing
+
+
+def sync_ref_counts():
+    """按数据库中的实际引用重建 MediaFile 计数，返回 (更新数, 删除的孤立记录数)"""
+    from collections import Counter
+
+    from .models import MediaFile
+
+    references = Counter()
+    for model, field in get_media_fields():
+        references.update(name for pk, name in _referenced_files(model, field) if is_hashed_name(name))
+
+    updated = 0
+    existing = {media.name: media for media in MediaFile.objects.all()}
+    changed = []
+    for name, count in references.items():
+        media = existing.get(name)
+        if media is None:
+            storage = get_media_storage()
+            if not storage.exists(name):
+                continue
+            with storage.open(name, 'rb') as f:
+                digest, size = content_sha256(File(f))
+            MediaFile.objects.create(name=name, sha256=digest, size=size, ref_count=count)
+            updated += 1
+        elif media.ref_count != count:
+            media.ref_count = count
+            changed.append(media)
+    MediaFile.objects.bulk_update(changed, ['ref_count'], batch_size=500)
+    updated += len(changed)
+
+    # 只把计数仍为快照值的孤立记录清零：快照之后被 save() 占用的文件保留
+    orphans = {}
+    for name, media in existing.items():
+        if name not in references:
+            orphans.setdefault(media.ref_count, []).append(name)
+    for ref_count, names in orphans.items():
+        MediaFile.objects.filter(name__in=names, ref_count=ref_count).update(ref_count=0)
+    purged = sum(get_media_storage().purge(name) for names in orphans.values() for name in names)
+    return updated, purged
@@ -1,3 +1,363 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from content.models import CreativeContent, Like, UserActivity, UserProfile
+from content.recommendation_cache import recommendation_cache
+from .activity_rollups import count_active_users, get_activity_stats, rollup_activity, user_activity_count
+from .hll import HyperLogLog
+from .metrics import METRIC_CONTENTS_CREATED, get_metric_series, user_dimension
+from .models import ActivityRollup, ContentActivityRollup, DailyMetric, MediaFile, Recommendation, SiteVisit, UserActivityRollup
+from .storage import get_media_storage, is_hashed_name, release, sync_ref_counts
+from .utils import get_recommendations, save_user_recommendations
+from .views import admin_dashboard
+from .visitors import day_key, get_visitor_counts, merge_sketch, visitor_counter
+
+
+class PrecomputedRecommendationTests(TestCase):
+    """离线推荐写入与读取"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.reader = User.objects.create_user('reader')
+        cls.contents = [
+            CreativeContent.objects.create(title=f'内容{i}', content='正文', author=cls.author)
+            for i in range(5)
+        ]
+        Like.objects.create(user=cls.author, content=cls.contents[2])
+
+    def setUp(self):
+        cache.clear()
+        recommendation_cache.clear()
+
+    def test_command_materializes_recommendations(self):
+        call_command('build_recommendations', limit=3, stdout=StringIO())
+        rows = Recommendation.objects.filter(user=self.reader).order_by('-score')
+        self.assertEqual(rows.count(), 3)
+        self.assertEqual(rows[0].content, self.contents[2])
+
+        with self.assertNumQueries(1):
+            recommendations = get_recommendations(self.reader, limit=3)
+        self.assertEqual(recommendations, [row.content for row in rows])
+
+    @skipUnless('fork' in multiprocessing.get_all_start_methods(), '需要 fork 启动方式')
+    def test_parallel_chunks_match_serial_run(self):
+        for i in range(5):
+            reader = User.objects.create_user(f'reader{i}')
+            Like.objects.create(user=reader, content=self.contents[i])
+
+        def snapshot():
+            return sorted(Recommendation.objects.values_list('user_id', 'content_id', 'score', 'reason'))
+
+        call_command('build_recommendations', limit=3, stdout=StringIO())
+        serial = snapshot()
+        Recommendation.objects.all().delete()
+        call_command('build_recommendations', limit=3, workers=2, chunk_size=2, stdout=StringIO())
+        # 作者的内容都是自己的，没有可推荐的内容
+        self.assertEqual(len(serial), 3 * User.objects.exclude(pk=self.author.pk).count())
+        self.assertEqual(snapshot(), serial)
+
+    def test_upsert_keeps_clicked_and_drops_stale_rows(self):
+        first, second, third = self.contents[:3]
+        save_user_recommendations({self.reader.id: [(first.id, 'a'), (second.id, 'b')]})
+        Recommendation.objects.filter(user=self.reader, content=first).update(clicked=True)
+
+        save_user_recommendations({self.reader.id: [(third.id, 'c'), (first.id, 'a')]})
+        rows = list(Recommendation.objects.filter(user=self.reader).order_by('-score'))
+        self.assertEqual([row.content_id for row in rows], [third.id, first.id])
+        self.assertTrue(rows[1].clicked)
+
+    def test_cache_serves_unchanged_users_and_invalidates_on_interaction(self):
+        call_command('build_recommendations', limit=3, stdout=StringIO())
+        first = get_recommendations(self.reader, limit=3)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_recommendations(self.reader, limit=3), first)
+
+        # 点赞后版本号变化，缓存和旧的预计算结果都不再使用
+        Like.objects.create(user=self.reader, content=first[0])
+        refreshed = get_recommendations(self.reader, limit=3)
+        self.assertNotIn(first[0], refreshed)
+
+
+class ContentAddressedStorageTests(TestCase):
+    """内容寻址的媒体存储"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name, COVER_DERIVATIVES_ASYNC=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.author = User.objects.create_user('author')
+
+    def create(self, data, name='cover.JPG'):
+        return CreativeContent.objects.create(
+            title='封面', content='正文', author=self.author,
+            cover_image=SimpleUploadedFile(name, data)
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create(b'same bytes')
+            second = self.create(b'same bytes', 'other.jpg')
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        self.assertTrue(is_hashed_name(first.cover_image.name))
+        digest = first.cover_image.name.rsplit('/', 1)[1].split('.')[0]
+        self.assertEqual(first.cover_image.name, f'covers/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(MediaFile.objects.get().ref_count, 2)
+
+        path = first.cover_image.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.cover_image = SimpleUploadedFile('new.jpg', b'new bytes')
+            second.save()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(list(MediaFile.objects.values_list('name', 'ref_count')), [(second.cover_image.name, 1)])
+
+    def test_reuploading_identical_bytes_keeps_one_reference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            content = self.create(b'same bytes')
+        for name in ('again.jpg', 'once-more.jpg'):
+            with self.captureOnCommitCallbacks(execute=True):
+                content.cover_image = SimpleUploadedFile(name, b'same bytes')
+                content.save()
+        self.assertEqual(MediaFile.objects.get().ref_count, 1)
+
+        path = content.cover_image.path
+        with self.captureOnCommitCallbacks(execute=True):
+            content.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_purge_skips_file_acquired_after_release(self):
+        storage = get_media_storage()
+        name = storage.save('covers/a.jpg', ContentFile(b'shared bytes'))
+        self.assertEqual(release(name), 0)
+        # 释放与清理之间，另一次上传占用了同一文件
+        self.assertEqual(storage.save('covers/b.jpg', ContentFile(b'shared bytes')), name)
+        self.assertFalse(storage.purge(name))
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).ref_count, 1)
+
+        storage.delete(name)
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_sync_keeps_orphan_acquired_after_snapshot(self):
+        storage = get_media_storage()
+        name = storage.save('covers/orphan.jpg', ContentFile(b'orphan bytes'))
+        bulk_update = MediaFile.objects.bulk_update
+
+        def acquire_then_update(*args, **kwargs):
+            # 读取快照之后，另一次上传占用了这个没有被引用的文件
+            storage.save('covers/again.jpg', ContentFile(b'orphan bytes'))
+            return bulk_update(*args, **kwargs)
+
+        with mock.patch.object(MediaFile.objects, 'bulk_update', acquire_then_update):
+            self.assertEqual(sync_ref_counts(), (0, 0))
+        self.assertEqual(MediaFile.objects.get(name=name).ref_count, 2)
+        self.assertTrue(storage.exists(name))
+
+        self.assertEqual(sync_ref_counts(), (0, 1))
+        self.assertFalse(storage.exists(name))
+
+    def test_command_moves_legacy_files(self):
+        legacy = default_storage.save('covers/legacy.png', ContentFile(b'legacy bytes'))
+        content = self.create(b'x')
+        CreativeContent.objects.filter(pk=content.pk).update(cover_image=legacy)
+        profile, _ = UserProfile.objects.get_or_create(user=self.author)
+        UserProfile.objects.filter(pk=profile.pk).update(avatar=default_storage.save('avatars/a.png', ContentFile(b'legacy bytes')))
+
+        out = StringIO()
+        call_command('migrate_media_storage', stdout=out)
+        self.assertIn('共迁移 2 个文件', out.getvalue())
+        content.refresh_from_db()
+        profile.refresh_from_db()
+        self.assertTrue(content.cover_image.name.startswith('covers/'))
+        self.assertTrue(profile.avatar.name.startswith('avatars/'))
+        self.assertTrue(is_hashed_name(content.cover_image.name))
+        self.assertFalse(default_storage.exists(legacy))
+        with content.cover_image.open('rb') as f:
+            self.assertEqual(f.read(), b'legacy bytes')
+        # 首次上传的 x 已无引用，被清理
+        self.assertEqual(
+            sorted(MediaFile.objects.values_list('name', 'ref_count')),
+            sorted([(content.cover_image.name, 1), (profile.avatar.name, 1)])
+        )
+
+
+class ActivityRollupTests(TestCase):
+    """用户活动每日汇总与清理"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+        cls.content = CreativeContent.objects.create(title='内容', content='正文', author=cls.alice)
+
+    def add(self, user, action, days_ago, content=None):
+        return UserActivity.objects.create(
+            user=user, action=action, content=content, description=action,
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+
+    def test_incremental_rollup_feeds_dashboard_stats(self):
+        self.add(self.alice, 'view', 3, self.content)
+        self.add(self.alice, 'view', 3, self.content)
+        self.add(self.bob, 'view', 3, self.content)
+        self.add(self.bob, 'like', 0, self.content)
+        rollup_activity()
+
+        day = timezone.localdate() - timedelta(days=3)
+        row = ActivityRollup.objects.get(date=day, action='view')
+        self.assertEqual((row.user_count, row.event_count), (2, 3))
+        self.assertEqual(ContentActivityRollup.objects.get(date=day, action='view').event_count, 3)
+        self.assertEqual(UserActivityRollup.objects.get(date=day, user=self.alice).event_count, 2)
+
+        # 高水位之后的活动：仪表板直接计入，下一次汇总只重算今天
+        self.add(self.alice, 'like', 0, self.content)
+        self.assertEqual(get_activity_stats(), [{'action': 'view', 'count': 3}, {'action': 'like', 'count': 2}])
+        self.assertEqual(count_active_users(), 2)
+        counts = dict(User.objects.annotate(total=user_activity_count()).values_list('username', 'total'))
+        self.assertEqual(counts, {'alice': 3, 'bob': 2})
+        self.assertEqual(rollup_activity(), 1)
+        self.assertEqual(ActivityRollup.objects.get(date=timezone.localdate(), action='like').user_count, 2)
+        self.assertEqual(ActivityRollup.objects.get(date=day, action='view').event_count, 3)
+
+    def test_prune_keeps_rollups_and_archives_rows(self):
+        import gzip
+        import json
+
+        self.add(self.alice, 'view', 100, self.content)
+        self.add(self.bob, 'view', 1)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive = os.path.join(directory.name, 'activity.jsonl.gz')
+        out = StringIO()
+        call_command('rollup_activity', retention_days=30, archive=archive, stdout=out)
+        self.assertIn('清理 1 条', out.getvalue())
+
+        self.assertEqual(UserActivity.objects.count(), 1)
+        with gzip.open(archive, 'rt', encoding='utf-8') as f:
+            archived = [json.loads(line) for line in f]
+        self.assertEqual([(row['user_id'], row['action']) for row in archived], [(self.alice.pk, 'view')])
+        self.assertEqual(get_activity_stats(), [{'action': 'view', 'count': 2}])
+
+
+class HyperLogLogTests(TestCase):
+    """独立访客计数"""
+
+    def test_estimate_within_two_percent_and_merge_is_union(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(60000):
+            first.add(f'visitor-{i}')
+        for i in range(40000, 100000):
+            second.add(f'visitor-{i}')
+        self.assertLess(abs(first.count() - 60000) / 60000, 0.02)
+
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        self.assertLess(abs(merged.count() - 100000) / 100000, 0.02)
+        small = HyperLogLog()
+        for _ in range(3):
+            small.add('same')
+        self.assertEqual(small.count(), 1)
+
+    @override_settings(ALLOWED_HOSTS=['testserver'], SITE_VISIT_LOG=False)
+    def test_home_counts_visitors_without_sessions_or_site_visits(self):
+        self.addCleanup(visitor_counter.flush)
+        for agent in ('a', 'b', 'a'):
+            response = self.client.get(reverse('core:home'), HTTP_USER_AGENT=agent)
+            self.assertEqual(response.status_code, 200)
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertFalse(SiteVisit.objects.exists())
+
+        visitor_counter.flush()
+        self.assertEqual(get_visitor_counts([timezone.localdate()]), (2, {timezone.localdate(): 2}))
+        # 其他进程的草图合并进来
+        other = HyperLogLog()
+        other.add('ip:127.0.0.1|c')
+        merge_sketch('all', other)
+        response = self.client.get(reverse('core:home'), HTTP_USER_AGENT='a')
+        self.assertEqual(response.context['total_visits'], 3)
+
+    def test_counts_include_unflushed_visits(self):
+        self.addCleanup(visitor_counter.flush)
+        visitor_counter.flush()
+        stored = HyperLogLog()
+        stored.add('user:1')
+        merge_sketch('all', stored)
+
+        # 刚合并过，以下访问还留在本进程中
+        visitor_counter.add('user:1')
+        visitor_counter.add('user:2')
+        today = timezone.localdate()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_visitor_counts([today]), (2, {today: 2}))
+
+    def test_admin_trend_reads_daily_sketches(self):
+        today = timezone.localdate()
+        for days_ago, visitors in ((0, 2), (3, 1)):
+            sketch = HyperLogLog()
+            for i in range(visitors):
+                sketch.add(f'user:{i}')
+            merge_sketch(day_key(today - timedelta(days=days_ago)), sketch)
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser('admin')
+
+        # 只检查视图传给模板的数据
+        with mock.patch('core.views.render') as render:
+            admin_dashboard(request)
+        context = render.call_args.args[2]
+        trend = json.loads(context['visit_trend'])
+        self.assertEqual([point['count'] for point in trend], [0, 0, 0, 1, 0, 0, 2])
+        self.assertEqual(trend[-1]['date'], today.strftime('%m-%d'))
+        self.assertEqual(context['today_visits'], 2)
+
+
+class DailyMetricTests(TestCase):
+    """每日指标与时间序列"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.other = User.objects.create_user('other')
+        for days_ago, author in ((5, cls.author), (5, cls.author), (5, cls.other), (2, cls.author)):
+            content = CreativeContent.objects.create(title='内容', content='正文', author=author)
+            CreativeContent.objects.filter(pk=content.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_series_is_zero_filled_and_reads_rollup_plus_live_days(self):
+        today = timezone.localdate()
+        call_command('rollup_daily_metrics', stdout=StringIO())
+        self.assertEqual(DailyMetric.objects.get(
+            date=today - timedelta(days=5), metric=METRIC_CONTENTS_CREATED, dimension=user_dimension(self.author)
+        ).value, 2)
+
+        # 汇总之后发布的内容从原始数据计算；查询次数与天数无关
+        CreativeContent.objects.create(title='今天', content='正文', author=self.author)
+        for days in (7, 90):
+            with self.assertNumQueries(3):
+                series = get_metric_series(METRIC_CONTENTS_CREATED, user_dimension(self.author), days=days)
+            self.assertEqual(len(series), days)
+        self.assertEqual(series[-1], (today, 1))
+        self.assertEqual(dict(series)[today - timedelta(days=5)], 2)
+        self.assertEqual(dict(series)[today - timedelta(days=2)], 1)
+        self.assertEqual(sum(value for _, value in series), 4)
+        site = dict(get_metric_series(METRIC_CONTENTS_CREATED, days=7))
+        self.assertEqual(site[today - timedelta(days=5)], 3)
@@ -1,6 +1,8 @@
 from django.contrib.sessions.models import Session
 from django.utils import timezone
 from datetime import datetime, timedelta
+from django.db import transaction
+from content.activity_log import record_user_activity
 from content.models import UserActivity
 
 
@@ -14,17 +16,6 @@ def get_client_ip(request):
     return ip
 
 
-def record_user_activity(user, action, content_object=None, description=''):
-    """记录用户活动"""
-    if user.is_authenticated:
-        UserActivity.objects.create(
-            user=user,
-            action=action,
-            content=content_object,
-            description=description
-        )
-
-
 def get_today_visit_count(request):
     """获取今日访问次数（基于会话）"""
     today = timezone.now().date()
@@ -65,8 +56,9 @@ def get_site_statistics():
     """获取网站统计信息"""
     from django.contrib.auth.models import User
     from content.models import CreativeContent, Comment, Like, Favorite
+    from .activity_rollups import count_active_users
     
-    today = timezone.now().date()
+    today = timezone.localdate()
     week_ago = today - timedelta(days=7)
     
     stats = {
@@ -81,9 +73,83 @@ def get_site_statistics():
         'new_content_this_week': CreativeContent.objects.filter(
             created_at__gte=week_ago
         ).count(),
-        'active_users_today': UserActivity.objects.filter(
-            created_at__date=today
-        ).values('user').distinct().count(),
+        'active_users_today': count_active_users(today),
     }
     
-    return stats
\ No newline at end of file
+    return stats
+
+
+def save_user_recommendations(recommendations):
+    """
+    批量写入预计算的推荐结果
+    
+    recommendations: {user_id: [(content_id, reason), ...]}，列表顺序即推荐顺序。
+    已存在的 (user, content) 行就地更新分数（保留 clicked），本次未出现的旧推荐会被删除。
+    """
+    from .models import Recommendation
+    
+    if not recommendations:
+        return 0
+    
+    started = timezone.now()
+    rows = []
+    for user_id, items in recommendations.items():
+        total = len(items)
+        for position, (content_id, reason) in enumerate(items):
+            rows.append(Recommendation(
+                user_id=user_id,
+                content_id=content_id,
+                score=float(total - position),
+                reason=reason,
+            ))
+    
+    with transaction.atomic():
+        Recommendation.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['user', 'content'],
+            update_fields=['score', 'reason', 'created_at'],
+        )
+        # 本轮写入的行 created_at 都不早于 started，更早的即为过期推荐
+        Recommendation.objects.filter(
+            user_id__in=list(recommendations.keys()),
+            created_at__lt=started
+        ).delete()
+    
+    return len(rows)
+
+
+def get_precomputed_recommendations(user, limit=10, since_stamp=0):
+    """
+    读取预计算的推荐内容（单次索引查询）
+    
+    since_stamp 为用户的交互版本号（纳秒时间戳），早于该时间生成的推荐视为过期。
+    """
+    from .models import Recommendation
+    
+    rows = list(Recommendation.objects.filter(
+        user=user,
+        content__privacy='public'
+    ).select_related('content__author').order_by('-score')[:limit])
+    if rows and since_stamp and rows[0].created_at.timestamp() * 1e9 < since_stamp:
+        return []
+    return [row.content for row in rows]
+
+
+def get_recommendations(user, limit=10):
+    """
+    获取推荐内容：进程内缓存 -> 预计算结果 -> 实时计算
+    
+    用户点赞、收藏、评分后缓存和过期的预计算结果都会失效。
+    """
+    from content.recommendation_cache import get_cached_recommendations
+    from content.utils import get_recommendations_for_user
+    
+    def compute(stamp):
+        recommendations = get_precomputed_recommendations(user, limit, since_stamp=stamp)
+        if recommendations:
+            return recommendations
+        return get_recommendations_for_user(user, limit)
+    
+    return get_cached_recommendations(user, limit, compute)
@@ -10,55 +10,33 @@ from django.views.decorators.http import require_http_methods
 from datetime import datetime, timedelta
 import json
 
-from .models import SiteVisit, SiteSettings, Recommendation
+from .activity_rollups import get_activity_stats, user_activity_count
+from .metrics import METRIC_CONTENTS_CREATED, get_metric_series, user_dimension
+from .models import SiteSettings, Recommendation
+from .utils import get_recommendations
+from .visitors import get_visitor_counts, record_visit
+from content.author_stats import get_author_stats
 from content.models import CreativeContent, UserActivity, Tag
 
 
 def home(request):
     """首页视图"""
-    # 记录访问
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.create()
-        session_key = request.session.session_key
-    
-    # 获取客户端IP
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    
-    # 使用 get_or_create 避免重复记录
-    today = timezone.now().date()
-    visit, created = SiteVisit.objects.get_or_create(
-        session_key=session_key,
-        ip_address=ip,
-        defaults={
-            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
-            'user': request.user if request.user.is_authenticated else None
-        }
-    )
-    
-    # 如果记录已存在但不是今天创建的，更新访问时间
-    if not created and visit.visited_at.date() != today:
-        visit.visited_at = timezone.now()
-        visit.save()
-    
-    # 获取今日访问统计
-    today_visits = SiteVisit.objects.filter(visited_at__date=today).count()
-    total_visits = SiteVisit.objects.count()
+    # 记录访问（加入独立访客草图，不为匿名访客创建会话）
+    record_visit(request)
+    
+    # 获取访问统计（草图估计值，误差约 1%）
+    today = timezone.localdate()
+    total_visits, daily_visits = get_visitor_counts([today])
+    today_visits = daily_visits[today]
     
     # 获取总内容数和用户数
     total_contents = CreativeContent.objects.filter(privacy='public').count()
     total_users = User.objects.count()
     
-    # 获取热门内容
+    # 获取热门内容（hot_score 由 update_hot_scores 定期计算）
     popular_contents = CreativeContent.objects.filter(
         privacy='public'
-    ).annotate(
-        total_score=Count('likes') + Count('favorites') * 2
-    ).order_by('-total_score', '-created_at')[:6]
+    ).order_by('-hot_score', '-created_at')[:6]
     
     # 获取最新内容
     latest_contents = CreativeContent.objects.filter(
@@ -69,8 +47,7 @@ def home(request):
     recommended_contents = []
     if request.user.is_authenticated:
         try:
-            from content.utils import get_recommendations_for_user
-            recommended_contents = get_recommendations_for_user(request.user)[:4]
+            recommended_contents = get_recommendations(request.user, limit=4)
         except Exception as e:
             print(f"推荐系统错误: {e}")
     
@@ -105,12 +82,9 @@ def dashboard(request):
     """用户仪表板"""
     user = request.user
     
-    # 用户统计
+    # 用户统计（读取作者统计）
     user_contents = CreativeContent.objects.filter(author=user)
-    total_contents = user_contents.count()
-    total_views = sum(content.views_count for content in user_contents)
-    total_likes = sum(content.likes_count for content in user_contents)
-    total_favorites = sum(content.favorites_count for content in user_contents)
+    author_stats = get_author_stats(user)
     
     # 最近活动
     recent_activities = UserActivity.objects.filter(
@@ -122,17 +96,13 @@ def dashboard(request):
     
     # 推荐内容
     try:
-        from content.utils import get_recommendations_for_user
-        recommendations = get_recommendations_for_user(user)[:5]
+        recommendations = get_recommendations(user, limit=5)
     except Exception as e:
         recommendations = []
         print(f"推荐系统错误: {e}")
     
     context = {
-        'total_contents': total_contents,
-        'total_views': total_views,
-        'total_likes': total_likes,
-        'total_favorites': total_favorites,
+        **author_stats.get_totals(),
         'recent_activities': recent_activities,
         'recent_contents': recent_contents,
         'recommendations': recommendations,
@@ -152,47 +122,41 @@ def admin_dashboard(request):
     # 基础统计
     total_users = User.objects.count()
     total_contents = CreativeContent.objects.count()
-    total_visits = SiteVisit.objects.count()
     
     # 今日统计
-    today = timezone.now().date()
-    today_visits = SiteVisit.objects.filter(visited_at__date=today).count()
+    today = timezone.localdate()
     today_contents = CreativeContent.objects.filter(created_at__date=today).count()
     today_users = User.objects.filter(date_joined__date=today).count()
     
-    # 最近7天访问趋势
-    visit_trend = []
-    for i in range(7):
-        date = today - timedelta(days=i)
-        count = SiteVisit.objects.filter(visited_at__date=date).count()
-        visit_trend.append({
-            'date': date.strftime('%m-%d'),
-            'count': count
-        })
-    visit_trend.reverse()
+    # 访问统计和最近7天访问趋势（按天的独立访客草图，一次查询）
+    dates = [today - timedelta(days=i) for i in range(6, -1, -1)]
+    total_visits, daily_visits = get_visitor_counts(dates)
+    today_visits = daily_visits[today]
+    visit_trend = [
+        {'date': date.strftime('%m-%d'), 'count': daily_visits[date]}
+        for date in dates
+    ]
     
-    # 最活跃用户
+    # 最活跃用户（活动次数取每日汇总加上尚未汇总的记录）
     active_users = User.objects.annotate(
         content_count=Count('creativecontent'),
-        activity_count=Count('useractivity')
+        activity_count=user_activity_count()
     ).filter(
         content_count__gt=0
     ).order_by('-content_count', '-activity_count')[:10]
     
     # 热门内容
-    popular_contents = CreativeContent.objects.annotate(
-        total_score=Count('likes') + Count('favorites') * 2
-    ).order_by('-total_score')[:10]
+    popular_contents = CreativeContent.objects.filter(
+        privacy='public'
+    ).order_by('-hot_score', '-created_at')[:10]
     
     # 最近活动
     recent_activities = UserActivity.objects.select_related(
         'user', 'content'
     ).order_by('-created_at')[:20]
     
-    # 用户活动统计
-    activity_stats = UserActivity.objects.values('action').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    # 用户活动统计（每日汇总 + 尚未汇总的部分）
+    activity_stats = get_activity_stats()
     
     context = {
         'total_users': total_users,
@@ -228,7 +192,7 @@ def admin_users(request):
     # 添加统计信息
     users = users.annotate(
         content_count=Count('creativecontent'),
-        activity_count=Count('useractivity')
+        activity_count=user_activity_count()
     ).order_by('-date_joined')
     
     paginator = Paginator(users, 20)
@@ -372,24 +336,15 @@ def data_analysis(request):
     """数据分析页面"""
     user = request.user
     
-    # 用户内容统计
+    # 用户内容统计（读取作者统计）
     user_contents = CreativeContent.objects.filter(author=user)
-    total_contents = user_contents.count()
-    total_views = sum(content.views_count for content in user_contents)
-    total_likes = sum(content.likes_count for content in user_contents)
-    total_favorites = sum(content.favorites_count for content in user_contents)
-    
-    # 最近30天的数据趋势
-    today = timezone.now().date()
-    trend_data = []
-    for i in range(30):
-        date = today - timedelta(days=i)
-        daily_contents = user_contents.filter(created_at__date=date).count()
-        trend_data.append({
-            'date': date.strftime('%m-%d'),
-            'contents': daily_contents
-        })
-    trend_data.reverse()
+    author_stats = get_author_stats(user)
+    
+    # 最近30天的数据趋势（每日指标）
+    trend_data = [
+        {'date': date.strftime('%m-%d'), 'contents': count}
+        for date, count in get_metric_series(METRIC_CONTENTS_CREATED, user_dimension(user), days=30)
+    ]
     
     # 内容类型分布（如果有分类字段）
     privacy_stats = user_contents.values('privacy').annotate(
@@ -402,10 +357,7 @@ def data_analysis(request):
     ).order_by('-total_score')[:5]
     
     context = {
-        'total_contents': total_contents,
-        'total_views': total_views,
-        'total_likes': total_likes,
-        'total_favorites': total_favorites,
+        **author_stats.get_totals(),
         'trend_data': json.dumps(trend_data),
         'privacy_stats': privacy_stats,
         'popular_contents': popular_contents,
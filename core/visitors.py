@@ -0,0 +1,150 @@
+"""
+独立访客计数
+
+每次访问只把访客标识（登录用户ID、已有会话或 IP+UA 的哈希）加入进程内的 HyperLogLog 草图，
+每隔 VISITOR_SKETCH_FLUSH_INTERVAL 秒合并到 VisitorSketch 表（当天和全部两行），
+合并时用版本号做乐观锁，多个进程同时写入也不会丢失。合并后顺便算出估计值存在行上，
+读取访客数只需按主键取一个整数；本进程还有未合并的草图时，读取时与数据库中的草图合并后再估计。
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .hll import HyperLogLog
+from .models import SiteVisit, VisitorSketch
+from .utils import get_client_ip
+
+
+KEY_ALL = 'all'
+MERGE_RETRIES = 5
+
+
+def day_key(date):
+    return f'day:{date.isoformat()}'
+
+
+def visitor_id(request):
+    """访客标识：不为匿名访客创建会话"""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    session_key = request.session.session_key
+    if session_key:
+        return f'session:{session_key}'
+    return f"ip:{get_client_ip(request)}|{request.META.get('HTTP_USER_AGENT', '')}"
+
+
+def merge_sketch(key, sketch):
+    """把草图合并进数据库中的同名草图，返回合并后的估计值"""
+    VisitorSketch.objects.bulk_create(
+        [VisitorSketch(key=key, registers=HyperLogLog().to_bytes())],
+        ignore_conflicts=True
+    )
+    for _ in range(MERGE_RETRIES):
+        row = VisitorSketch.objects.filter(key=key).values('registers', 'version').get()
+        merged = HyperLogLog.from_bytes(row['registers']).merge(sketch)
+        estimate = merged.count()
+        updated = VisitorSketch.objects.filter(key=key, version=row['version']).update(
+            registers=merged.to_bytes(), estimate=estimate, version=row['version'] + 1,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            return estimate
+    raise RuntimeError(f'访客草图 {key} 合并冲突次数过多')
+
+
+class VisitorCounter:
+    """进程内的访客草图，定时合并到数据库"""
+
+    def __init__(self, flush_interval=10):
+        self.flush_interval = flush_interval
+        self._sketches = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, visitor, date=None):
+        """记录一次访问"""
+        date = date or timezone.localdate()
+        with self._lock:
+            for key in (KEY_ALL, day_key(date)):
+                self._sketches.setdefault(key, HyperLogLog()).add(visitor)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def pending(self, keys):
+        """本进程尚未合并到数据库的草图（副本），返回 {键: 草图}"""
+        with self._lock:
+            return {
+                key: HyperLogLog.from_bytes(self._sketches[key].to_bytes())
+                for key in keys if key in self._sketches
+            }
+
+    def flush(self):
+        """把本进程的草图合并到数据库，返回合并的草图数"""
+        with self._lock:
+            sketches, self._sketches = self._sketches, {}
+            self._last_flush = time.monotonic()
+
+        merged = 0
+        for key, sketch in sketches.items():
+            try:
+                merge_sketch(key, sketch)
+                merged += 1
+            except Exception as e:
+                print(f"访客草图合并错误: {e}")
+                # 合并失败时放回，下次再试
+                with self._lock:
+                    self._sketches.setdefault(key, HyperLogLog()).merge(sketch)
+        return merged
+
+
+visitor_counter = VisitorCounter(flush_interval=getattr(settings, 'VISITOR_SKETCH_FLUSH_INTERVAL', 10))
+atexit.register(visitor_counter.flush)
+
+
+def record_visit(request):
+    """记录首页访问（SITE_VISIT_LOG 为 True 时另外写入 SiteVisit 明细）"""
+    visitor_counter.add(visitor_id(request))
+    if getattr(settings, 'SITE_VISIT_LOG', False):
+        log_site_visit(request)
+
+
+def log_site_visit(request):
+    """按会话和 IP 写入访问明细（会为匿名访客创建会话）"""
+    session_key = request.session.session_key
+    if not session_key:
+        request.session.create()
+        session_key = request.session.session_key
+
+    visit, created = SiteVisit.objects.get_or_create(
+        session_key=session_key,
+        ip_address=get_client_ip(request),
+        defaults={
+            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+            'user': request.user if request.user.is_authenticated else None
+        }
+    )
+    # 如果记录已存在但不是今天创建的，更新访问时间
+    if not created and timezone.localdate(visit.visited_at) != timezone.localdate():
+        visit.visited_at = timezone.now()
+        visit.save()
+
+
+def get_visitor_counts(dates=()):
+    """返回 (全部独立访客数, {日期: 当天独立访客数})，一次查询；包含本进程尚未合并的访问"""
+    keys = {day_key(date): date for date in dates}
+    sketches = VisitorSketch.objects.filter(key__in=[KEY_ALL, *keys])
+    pending = visitor_counter.pending([KEY_ALL, *keys])
+    if pending:
+        estimates = {}
+        for key, estimate, registers in sketches.values_list('key', 'estimate', 'registers'):
+            if key in pending:
+                estimate = pending.pop(key).merge(HyperLogLog.from_bytes(registers)).count()
+            estimates[key] = estimate
+        estimates.update((key, sketch.count()) for key, sketch in pending.items())
+    else:
+        estimates = dict(sketches.values_list('key', 'estimate'))
+    return estimates.get(KEY_ALL, 0), {date: estimates.get(key, 0) for key, date in keys.items()}
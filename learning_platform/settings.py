@@ -136,6 +136,66 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# 推荐系统离线数据（近邻索引等）
+RECOMMENDER_DATA_DIR = BASE_DIR / "recommender_data"
+
+# 内容向量近似最近邻（LSH）参数：表越多召回越高，位数越多候选越少（修改表数或位数后需重新运行 build_content_ann）
+CONTENT_ANN_TABLES = 8
+CONTENT_ANN_BITS = 12
+CONTENT_ANN_PROBES = 2
+# ANN 索引构建之后的增量部分（新向量、删除和隐私变化）最长多少秒重新加载一次
+CONTENT_ANN_DELTA_TTL = 300
+
+# 按用户缓存的推荐结果：过期时间（秒）和最多缓存的条目数
+RECOMMENDATION_CACHE_TTL = 300
+RECOMMENDATION_CACHE_SIZE = 1000
+
+# 推荐策略：'hybrid'（协同过滤 + 标签 + 热门）或 'als'（矩阵分解，需先运行 train_als）
+RECOMMENDATION_STRATEGY = 'hybrid'
+
+# 进程内共享的协同过滤引擎：评分变化或超过该秒数后在后台重新加载
+COLLABORATIVE_ENGINE_TTL = 600
+
+# 在线推荐的时间预算（秒）：单阶段时限、总时限，超时阶段被放弃，空位用热门内容补足
+RECOMMENDATION_STAGE_TIMEOUTS = {'collaborative': 0.3, 'als': 0.1, 'content_based': 0.3}
+RECOMMENDATION_TOTAL_TIMEOUT = 0.5
+RECOMMENDATION_WORKER_THREADS = 4
+# 每个阶段同时在执行的任务数上限（超时的任务无法取消，达到上限时跳过该阶段）
+RECOMMENDATION_STAGE_MAX_IN_FLIGHT = 2
+# 热门内容列表的缓存时间（秒）
+RECOMMENDATION_POPULAR_TTL = 300
+
+# 浏览量写缓冲：每隔多少秒或累计多少次浏览批量写回数据库
+VIEW_COUNT_FLUSH_INTERVAL = 10
+VIEW_COUNT_FLUSH_THRESHOLD = 100
+
+# 封面衍生图是否在后台线程中生成（False 时只由 generate_cover_derivatives 命令生成）
+COVER_DERIVATIVES_ASYNC = True
+
+# 按需头像缩略图：允许的宽度（像素）和磁盘缓存目录（封面使用后台生成的衍生图）
+THUMBNAIL_WIDTHS = (64, 160)
+THUMBNAIL_CACHE_DIR = MEDIA_ROOT / "thumbnails"
+
+# 用户活动异步批量写入：队列容量、每批条数、最长间隔（秒），
+# 队列满时 'drop' 直接丢弃，'block' 最多等待 ACTIVITY_LOG_BLOCK_TIMEOUT 秒后丢弃
+ACTIVITY_LOG_ASYNC = True
+ACTIVITY_LOG_QUEUE_SIZE = 10000
+ACTIVITY_LOG_BATCH_SIZE = 200
+ACTIVITY_LOG_FLUSH_INTERVAL = 2.0
+ACTIVITY_LOG_OVERFLOW = 'drop'
+ACTIVITY_LOG_BLOCK_TIMEOUT = 0.05
+# rollup_activity 汇总后，原始活动记录保留的天数（0 表示不清理）
+ACTIVITY_RETENTION_DAYS = 90
+
+# 独立访客计数：进程内 HyperLogLog 草图合并到数据库的间隔（秒）；
+# SITE_VISIT_LOG 为 True 时另外按会话写入 SiteVisit 明细（会为匿名访客创建会话）
+VISITOR_SKETCH_FLUSH_INTERVAL = 10
+SITE_VISIT_LOG = False
+
+# 上传图片限制：文件字节数和像素数（只读文件头判断，超限直接拒绝）
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap4"
 CRISPY_TEMPLATE_PACK = "bootstrap4"